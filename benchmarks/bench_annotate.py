@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Whole-genome promoter/exonic/intronic/downstream_flank annotation time: wormtools.annotate against
+the per-gene bx BitSet masks of the original annotate_transcripts.process_gene_model (needs bx-python,
+which wormtools itself no longer does). Genes are read (and their exons sorted) once beforehand, so
+only annotation is timed, and both BED outputs are checked to be identical.
+
+$ PYTHONPATH=src python benchmarks/bench_annotate.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,time
+from benchutil import measure, report
+from wormtools import GFF, annotate
+
+def three_states_two_masks(state_a, mask_a, state_b, mask_b, state_else, size):
+    # runs of state_a where mask_a is set, state_b where only mask_b is, state_else elsewhere
+    things = []
+    pos = 0
+    while pos < size:
+        if mask_a[pos]:
+            end, state = mask_a.next_clear(pos), state_a
+        elif mask_b[pos]:
+            end, state = min(mask_b.next_clear(pos), mask_a.next_set(pos)), state_b
+        else:
+            end, state = min(mask_a.next_set(pos), mask_b.next_set(pos)), state_else
+        end = min(end, size)
+        if things and things[-1][2] == state:
+            things[-1] = (things[-1][0], end, state)
+        else:
+            things.append((pos, end, state))
+        pos = end
+    return things
+
+def bitset_bed(genes, upstream_promoter_flank=2000, promoter_inset_flank=1000, downstream_flank=1000):
+    # the original process_gene_model, a pair of BitSets per gene
+    from bx.bitset import BitSet
+    lines = []
+    flanks = upstream_promoter_flank, downstream_flank
+    for gene in genes:
+        upstream_promoter_flank, downstream_flank = flanks
+        if gene.isforward():
+            if (gene.start - upstream_promoter_flank) < 1:
+                upstream_promoter_flank = gene.start - 1
+            gene_start,gene_end = gene.start - upstream_promoter_flank - 1, gene.end + downstream_flank
+        else:
+            if (gene.start - downstream_flank) < 1:
+                downstream_flank = gene.start - 1
+            gene_start,gene_end = gene.start - downstream_flank - 1, gene.end + upstream_promoter_flank
+        base = gene_start
+        size = gene_end - gene_start
+        exon_mask = BitSet(size)
+        promoter_mask = BitSet(size)
+        for t in gene.transcripts:
+            exons = list(t.exons())
+            for ex in exons:
+                exon_mask.set_range(ex['start'] - 1 - base, ex['end'] - ex['start'] + 1)
+            p_len = min(size, upstream_promoter_flank + promoter_inset_flank)
+            if gene.isforward():
+                promoter_mask.set_range(exons[0]['start'] - 1 - base - upstream_promoter_flank, p_len)
+            else:
+                promoter_mask.set_range(max(0, exons[-1]['end'] - base - promoter_inset_flank), p_len)
+        things = three_states_two_masks('promoter', promoter_mask, 'exonic', exon_mask, 'intronic', size)
+        threeprime_i = -1 if gene.isforward() else 0
+        s,e,state = things[threeprime_i]
+        if state == 'intronic':
+            things[threeprime_i] = (s,e,'downstream_flank')
+        for s,e,state in things:
+            lines.append("chr%s\t%d\t%d\t%s.%s\t0\t%s\n" % (gene.seqname, s + base, e + base, gene.gene_id, state, gene.strand))
+    return lines
+
+def vectorized_bed(genes):
+    return [line for segments in annotate.annotate_genes(genes) for line in annotate.bed_lines(segments)]
+
+def main():
+    start = time.perf_counter()
+    genes = [gene for gene in GFF.iter_genes(sys.argv[1], features=['exon']) if gene.seqname != 'MtDNA']
+    # transcripts sort their exons on first use; do it now so neither version is charged for it
+    for gene in genes:
+        for transcript in gene.transcripts: transcript.features('exon')
+    print("read %d genes in %.2f s" % (len(genes), time.perf_counter() - start))
+
+    lines, stats = measure(vectorized_bed, genes)
+    report('wormtools.annotate', stats, len(genes), unit='gene')
+    try:
+        import bx.bitset
+    except ImportError:
+        print("bx-python isn't installed, skipping the BitSet version")
+        return
+    expected, stats = measure(bitset_bed, genes)
+    report('per-gene BitSets', stats, len(genes), unit='gene')
+    if lines != expected:
+        raise Exception("the two annotations differ")
+    print(len(lines), "identical BED lines")
+
+if __name__ == '__main__': main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of attribute parsing on every line of a GTF: a full GFFParser.parseAttr
+against GFFParser.scanAttr/parseAttr(keys=...) pulling out only the keys asked for.
+
+$ PYTHONPATH=src python benchmarks/bench_attr.py annotation.gtf [key ...]
+"""
+import sys,time
+from benchutil import measure, report
+from wormtools.GFF import GFFParser
+
+def main():
+    filename = sys.argv[1]
+    keys = sys.argv[2:] or ['gene_id']
+    with open(filename) as fh:
+        attr_strs = [GFFParser.parseLine(line)['attr_str'] for line in fh if not line.startswith('#') and line.strip()]
+    n = len(attr_strs)
+
+    def full():
+        return [[GFFParser.parseAttr(a).get(key, []) for key in keys] for a in attr_strs]
+    def selective():
+        return [[GFFParser.scanAttr(a, key) for key in keys] for a in attr_strs]
+    def all_attributes():
+        return [GFFParser.parseAttr(a) for a in attr_strs]
+
+    expected, stats = measure(full)
+    report("parseAttr()[%s]" % ",".join(keys), stats, n)
+    found, stats = measure(selective)
+    assert found == expected
+    report("scanAttr(%s)" % ",".join(keys), stats, n)
+    parsed, stats = measure(all_attributes)
+    report("parseAttr, interned values", stats, n)
+
+if __name__ == '__main__': main()
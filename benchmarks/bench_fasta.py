@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+FASTA reading throughput in MB/s of sequence, plain and gzipped: wormtools.fasta.readGZfa
+against the line-by-line string concatenation it replaced.
+A gzipped copy of a plain input (or plain copy of a gzipped one) is made in a temporary directory.
+
+$ PYTHONPATH=src python benchmarks/bench_fasta.py genome.fa[.gz]
+"""
+import sys,os,gzip,shutil,tempfile
+from benchutil import measure
+from wormtools.fasta import readGZfa
+
+def line_concatenation(filename):
+    # the original search_seq_motif.readGZfa
+    if filename.endswith('.gz'):
+        lines = (line.decode() for line in gzip.open(filename))
+    else:
+        lines = open(filename)
+    current_header, current_seq = None, None
+    for line in lines:
+        if line.startswith('>'):
+            if current_header is not None:
+                yield current_header, current_seq
+            current_header = line.strip().lstrip('>')
+            current_seq = ''
+        else:
+            current_seq += line.strip()
+    if current_header is not None:
+        yield current_header, current_seq.upper()
+
+def total_length(reader, filename):
+    return sum(len(seq) for header,seq in reader(filename))
+
+def main():
+    filename = sys.argv[1]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        if filename.endswith('.gz'):
+            gzipped, plain = filename, os.path.join(tmpdir, 'genome.fa')
+            with gzip.open(gzipped) as src, open(plain, 'wb') as dst: shutil.copyfileobj(src, dst)
+        else:
+            plain, gzipped = filename, os.path.join(tmpdir, 'genome.fa.gz')
+            with open(plain, 'rb') as src, gzip.open(gzipped, 'wb') as dst: shutil.copyfileobj(src, dst)
+
+        for label, path in (('plain', plain), ('gzip', gzipped)):
+            for name, reader in (('line concatenation', line_concatenation), ('readGZfa', readGZfa)):
+                bases, stats = measure(total_length, reader, path)
+                print("%-6s %-20s %8.3f s  %8.1f MB/s  peak %8.1f MB" % (label, name, stats['seconds'],
+                    bases / stats['seconds'] / 1e6, stats['peak_bytes'] / 1e6))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Finding genes by ID: a pass over the GTF's gene rows with get_attr for each ID, as before
+GFF.GeneIndex, against the index's dict lookups and its vectorized find_all. Also the time
+to build the index from a table, and to load it with the table from a warm GFFCache.
+
+$ PYTHONPATH=src python benchmarks/bench_gene_index.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,random,shutil,tempfile
+from benchutil import measure, report
+from wormtools import GFF
+
+N_QUERIES = 100000
+N_SCANS = 20
+
+def scan_for(table, gene_ids):
+    # the full pass per ID that an index replaces
+    found = []
+    for gene_id in gene_ids:
+        for i, gff in enumerate(table.rows(features=['gene'])):
+            if GFF.gene_id(gff) == gene_id:
+                found.append(i)
+                break
+        else:
+            found.append(-1)
+    return found
+
+def main():
+    filename = sys.argv[1]
+    cache_dir = tempfile.mkdtemp()
+    try:
+        table = GFF.read_table(filename, cache=False)
+        index, stats = measure(GFF.GeneIndex.from_table, table)
+        report("build from table", stats, len(index), unit='gene')
+        GFF.read_table(filename, cache_dir=cache_dir) # write the cache
+        cached, stats = measure(lambda: GFF.read_table(filename, cache_dir=cache_dir).gene_index())
+        report("load with cached table", stats, len(cached), unit='gene')
+
+        rng = random.Random(17)
+        ids = index.arrays()['gene_id'].tolist()
+        queries = [rng.choice(ids) if rng.random() < 0.9 else 'missing' for i in range(N_QUERIES)]
+
+        found, stats = measure(scan_for, table, queries[:N_SCANS])
+        report("get_attr pass per ID", stats, N_SCANS, unit='lookup')
+        expected = found
+
+        def finds():
+            result = []
+            for q in queries:
+                try:
+                    result.append(index.find(q))
+                except KeyError:
+                    result.append(-1)
+            return result
+        found, stats = measure(finds)
+        report("GeneIndex.find", stats, N_QUERIES, unit='lookup')
+        found_all, stats = measure(index.find_all, queries)
+        report("GeneIndex.find_all", stats, N_QUERIES, unit='lookup')
+        if found_all.tolist() != found or found[:N_SCANS] != expected:
+            raise Exception("lookups disagree")
+    finally:
+        shutil.rmtree(cache_dir)
+
+if __name__ == '__main__': main()
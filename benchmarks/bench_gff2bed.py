@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+GTF to BED throughput: GFF_as_BED6 with map(str), '\\t'.join and print per row, as scripts did
+it, against gff2bed.convert streaming the GTF, converting a warm GFFCache, and writing .gz;
+then BED12 (a line per transcript) both ways.
+
+$ PYTHONPATH=src python benchmarks/bench_gff2bed.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import os,sys,shutil,tempfile
+from benchutil import measure, report
+from wormtools import GFF, gff2bed
+from wormtools.hits import open_output
+
+def print_rows(filename, output):
+    # the per-row loop
+    n = 0
+    with open(output, 'w') as fh, GFF.GFFParser.openGFF(filename) as gff:
+        for line in gff:
+            if line.startswith('#'): continue
+            print('\t'.join(map(str, GFF.GFF_as_BED6(GFF.GFFParser.parseLine(line)))), file=fh)
+            n += 1
+    return n
+
+def convert(filename, output, **kwargs):
+    out = open_output(output)
+    try:
+        return gff2bed.convert(filename, out, prefix='', **kwargs)
+    finally:
+        out.close()
+
+def main():
+    filename = sys.argv[1]
+    workdir = tempfile.mkdtemp()
+    try:
+        plain, gz = os.path.join(workdir, 'out.bed'), os.path.join(workdir, 'out.bed.gz')
+        n, stats = measure(print_rows, filename, plain)
+        report("GFF_as_BED6 + print", stats, n, unit='line')
+        with open(plain) as fh:
+            expected = fh.read()
+        n, stats = measure(convert, filename, plain)
+        report("convert bed6, streaming", stats, n, unit='line')
+        with open(plain) as fh:
+            if fh.read() != expected:
+                raise Exception("bed6 output differs")
+        n, stats = measure(convert, filename, gz)
+        report("convert bed6 to .gz", stats, n, unit='line')
+        GFF.read_table(filename, cache_dir=workdir) # write the cache
+        n, stats = measure(convert, filename, plain, cache=True, cache_dir=workdir)
+        report("convert bed6, cached table", stats, n, unit='line')
+        n, stats = measure(convert, filename, plain, format='bed12')
+        report("convert bed12, streaming", stats, n, unit='line')
+        n, stats = measure(convert, filename, plain, format='bed12', cache=True, cache_dir=workdir)
+        report("convert bed12, cached table", stats, n, unit='line')
+        print("%.1f MB of GTF" % (os.path.getsize(filename) / 1e6))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__': main()
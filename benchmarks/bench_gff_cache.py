@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Loading a GTF cold (parsed from text, then cached) against warm (mapped from its GFFCache),
+both as a GFFTable and as assembled Gene models. Caches go in a temporary directory.
+
+$ PYTHONPATH=src python benchmarks/bench_gff_cache.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,os,shutil,tempfile
+from benchutil import measure, report
+from wormtools import GFF
+from wormtools.GFF import GFFCache
+
+def main():
+    filename = sys.argv[1]
+    cache_dir = tempfile.mkdtemp()
+    path = GFFCache.cache_path(filename, cache_dir)
+
+    def cold_table():
+        if os.path.exists(path): os.remove(path)
+        return GFF.read_table(filename, cache_dir=cache_dir)
+
+    try:
+        table, stats = measure(GFF.read_table, filename, cache=False)
+        n = len(table)
+        report("parse, no cache", stats, n, unit='row')
+        table, stats = measure(cold_table)
+        report("parse and write cache", stats, n, unit='row')
+        print("cache file %.1f MB for a %.1f MB GTF" % (os.path.getsize(path) / 1e6, os.path.getsize(filename) / 1e6))
+        table, stats = measure(GFF.read_table, filename, cache_dir=cache_dir)
+        report("load from cache", stats, n, unit='row')
+        rows, stats = measure(lambda: sum(1 for row in GFF.read_table(filename, cache_dir=cache_dir).rows()))
+        report("load from cache, all rows", stats, n, unit='row')
+        del table
+
+        genes, stats = measure(lambda: list(GFF.iter_genes(filename, cache=False)))
+        n = len(genes)
+        del genes
+        report("Gene models, parsed", stats, n, unit='gene')
+        genes, stats = measure(lambda: list(GFF.iter_genes(filename, cache_dir=cache_dir)))
+        report("Gene models, from cache", stats, n, unit='gene')
+    finally:
+        shutil.rmtree(cache_dir)
+
+if __name__ == '__main__': main()
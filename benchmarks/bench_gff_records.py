@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Memory held by whole annotations as parseLine dicts versus GFFRecord slots,
+both as flat feature lists and assembled into (slotted) Gene/Transcript objects.
+
+$ PYTHONPATH=src python benchmarks/bench_gff_records.py annotation.gtf
+"""
+import sys
+from benchutil import measure, report
+from wormtools import GFF
+from wormtools.GFF import GFFParser
+
+def load_features(filename, as_record):
+    with open(filename) as fh:
+        return [GFFParser.parseLine(line, as_record=as_record) for line in fh if not line.startswith('#') and line.strip()]
+
+def main():
+    filename = sys.argv[1]
+    for as_record in (False, True):
+        label = "GFFRecord" if as_record else "dict"
+        features, stats = measure(load_features, filename, as_record)
+        n = len(features)
+        del features
+        report("features as %s" % label, stats, n)
+
+        genes, stats = measure(lambda: list(GFF.iter_genes(filename, as_record=as_record, cache=False)))
+        del genes
+        report("Gene models of %s" % label, stats, n)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Compare loading a whole GTF as a list of GFFParser.parseLine dicts against GFF.read_table.
+
+$ PYTHONPATH=src python benchmarks/bench_gff_table.py annotation.gtf
+"""
+import sys
+from benchutil import measure, report
+from wormtools import GFF
+from wormtools.GFF import GFFParser
+
+def load_dicts(filename):
+    with open(filename) as fh:
+        return [GFFParser.parseLine(line) for line in fh if not line.startswith('#') and line.strip()]
+
+def main():
+    filename = sys.argv[1]
+    dicts, stats = measure(load_dicts, filename)
+    n = len(dicts)
+    del dicts
+    report("parseLine dicts", stats, n)
+
+    table, stats = measure(GFF.read_table, filename, cache=False)
+    assert len(table) == n
+    report("GFFTable", stats, n)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Annotating motif hits against a wormtools-annotate BED with the streaming sweep-line join, as the
+number of hits grows. The GTF is annotated once, then random sorted BED hits (6 bp, spread over
+its seqnames) are joined to it, writing to /dev/null. Peak memory should stay flat as hits grow.
+
+$ PYTHONPATH=src python benchmarks/bench_intersect.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,os,shutil,tempfile
+import numpy as np
+from benchutil import measure, report
+from wormtools import annotate, intersect
+
+SIZES = [1 << 18, 1 << 20, 1 << 22]
+
+def write_hits(path, seqnames, ends, n):
+    rng = np.random.default_rng(23)
+    with open(path, 'w') as fh:
+        for seqname, end in zip(seqnames, ends):
+            starts = np.sort(rng.integers(0, end, n // len(seqnames)))
+            for i in range(0, len(starts), 1 << 16):
+                fh.write(''.join('%s\t%d\t%d\thit\t0\t+\n' % (seqname, start, start + 6) for start in starts[i:i + (1 << 16)].tolist()))
+
+def join(hits, bed):
+    with open(os.devnull, 'wb') as out:
+        # the hits are named after the annotation's seqnames, prefix and all
+        return intersect.annotate_hits(hits, bed, out, prefix='')
+
+def main():
+    tmp = tempfile.mkdtemp()
+    try:
+        bed = os.path.join(tmp, 'annotation.bed')
+        with open(bed, 'wb') as out:
+            regions = annotate.annotate_file(sys.argv[1], out)
+        ends = {}
+        with open(bed) as fh:
+            for line in fh:
+                chrom, start, end = line.split('\t', 3)[:3]
+                ends[chrom] = max(ends.get(chrom, 0), int(end))
+        print("%d annotated regions on %d seqnames" % (regions, len(ends)))
+        for n in SIZES:
+            hits = os.path.join(tmp, 'hits.bed')
+            write_hits(hits, list(ends), list(ends.values()), n)
+            (count, overlapping), stats = measure(join, hits, bed)
+            report("%d hits" % count, stats, count, unit='hit')
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__': main()
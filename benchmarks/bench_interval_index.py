@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Overlap queries of random intervals against every gene of a GTF: a brute-force scan
+over the genes, IntervalIndex.overlap one query at a time, and one overlap_batch call.
+
+$ PYTHONPATH=src python benchmarks/bench_interval_index.py annotation.gtf [n_queries]
+"""
+import sys,random
+from benchutil import measure, report
+from wormtools import GFF
+
+def main():
+    filename = sys.argv[1]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    genes = list(GFF.iter_genes(filename, features=['exon']))
+    extents = {}
+    for gene in genes:
+        extents[gene.seqname] = max(extents.get(gene.seqname, 0), gene.end)
+
+    rng = random.Random(0)
+    seqnames = [rng.choice(sorted(extents)) for i in range(n)]
+    starts = [rng.randint(1, extents[s]) for s in seqnames]
+    ends = [s + 1000 for s in starts]
+
+    def brute_force():
+        return [[g for g in genes if g.seqname == seq and g.start <= e and g.end >= s] for seq,s,e in zip(seqnames, starts, ends)]
+    expected, stats = measure(brute_force)
+    report("brute force scan", stats, n, 'query', 'queries')
+
+    index, stats = measure(GFF.IntervalIndex.from_genes, genes)
+    report("build IntervalIndex", stats, len(genes), 'gene')
+
+    def one_at_a_time():
+        return [index.overlap(seq, s, e) for seq,s,e in zip(seqnames, starts, ends)]
+    found, stats = measure(one_at_a_time)
+    assert [[g.gene_id for g in hits] for hits in found] == [[g.gene_id for g in sorted(hits, key=lambda g: (g.start, g.end))] for hits in expected]
+    report("overlap per query", stats, n, 'query', 'queries')
+
+    pairs, stats = measure(index.overlap_batch, seqnames, starts, ends)
+    assert len(pairs[0]) == sum(len(hits) for hits in expected)
+    report("overlap_batch", stats, n, 'query', 'queries')
+
+if __name__ == '__main__': main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Input throughput in MB/s of decompressed data, plain, gzip and bgzip: wormtools.io.read_blocks
+(bgzip with 1 and 4 threads) against gzip.open, the reads readGZfa made before; readGZfa itself;
+and GTF lines through io.open_text against gzip.open(filename, 'rt').
+gzip and bgzip copies of the inputs are made in a temporary directory.
+
+$ PYTHONPATH=src python benchmarks/bench_io.py genome.fa c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,os,gzip,shutil,tempfile
+from benchutil import measure
+from wormtools import io, bgzf
+from wormtools.fasta import readGZfa
+
+def gzip_open_blocks(filename):
+    opener = gzip.open if io.detect(filename) != 'plain' else open
+    n = 0
+    with opener(filename, 'rb') as fh:
+        while True:
+            block = fh.read(io.BLOCKSIZE)
+            if not block: return n
+            n += len(block)
+
+def io_blocks(filename, threads):
+    return sum(len(block) for block in io.read_blocks(filename, threads=threads))
+
+def gzip_open_lines(filename):
+    opener = gzip.open if io.detect(filename) != 'plain' else open
+    with opener(filename, 'rt') as fh:
+        return sum(len(line) for line in fh)
+
+def io_lines(filename, threads):
+    with io.open_text(filename, threads) as fh:
+        return sum(len(line) for line in fh)
+
+def fasta_bases(filename, threads):
+    return sum(len(seq) for header, seq in readGZfa(filename, threads=threads))
+
+def copies(filename, tmpdir):
+    # plain, gzip and bgzip versions of filename
+    name = os.path.basename(filename)
+    paths = {'plain': filename, 'gzip': os.path.join(tmpdir, name + '.gz'), 'bgzip': os.path.join(tmpdir, name + '.bgz')}
+    with open(filename, 'rb') as src, gzip.open(paths['gzip'], 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    with open(filename, 'rb') as src, bgzf.BgzfWriter(open(paths['bgzip'], 'wb')) as dst:
+        shutil.copyfileobj(src, dst, io.BLOCKSIZE)
+    return paths
+
+def row(kind, label, n, stats):
+    print("%-6s %-26s %8.3f s  %8.1f MB/s  peak %8.1f MB" % (kind, label, stats['seconds'],
+        n / stats['seconds'] / 1e6, stats['peak_bytes'] / 1e6))
+
+def main():
+    fasta, gtf = sys.argv[1], sys.argv[2]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print("%d CPUs; io.THREADS is %d" % (os.cpu_count(), io.THREADS))
+        for kind, path in copies(fasta, tmpdir).items():
+            n, stats = measure(gzip_open_blocks, path)
+            row(kind, "gzip.open blocks", n, stats)
+            for threads in ((1, 4) if kind == 'bgzip' else (1,)):
+                n, stats = measure(io_blocks, path, threads)
+                row(kind, "io.read_blocks, %d thread%s" % (threads, 's' if threads > 1 else ''), n, stats)
+                n, stats = measure(fasta_bases, path, threads)
+                row(kind, "readGZfa, %d thread%s" % (threads, 's' if threads > 1 else ''), n, stats)
+        for kind, path in copies(gtf, tmpdir).items():
+            n, stats = measure(gzip_open_lines, path)
+            row(kind, "gzip.open lines", n, stats)
+            for threads in ((1, 4) if kind == 'bgzip' else (1,)):
+                n, stats = measure(io_lines, path, threads)
+                row(kind, "io.open_text lines, %d" % threads, n, stats)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Motif scanning throughput in MB/s of sequence, regex engine against numpy engine, for each motif given
+(default: a few short fixed-length motifs). The sequences are read once beforehand, so only scanning
+is timed, and the two engines' hits are checked to be identical.
+
+$ PYTHONPATH=src python benchmarks/bench_motif_engine.py genome.fa[.gz] [motif ...]
+"""
+import sys
+from benchutil import measure
+from wormtools.fasta import readGZfa
+from wormtools.motif import MotifScanner
+
+MOTIFS = ['WGATAR', 'CANNTG', 'GATC', 'TTAGGCNNNNNGCCTAA']
+
+def scan_all(scanner, sequences):
+    return [scanner.scan(seq) for header,seq in sequences]
+
+def main():
+    sequences = list(readGZfa(sys.argv[1]))
+    bases = sum(len(seq) for header,seq in sequences)
+    for iupac in sys.argv[2:] or MOTIFS:
+        results = {}
+        for engine in ('regex', 'numpy'):
+            scanner = MotifScanner(iupac, engine=engine)
+            results[engine], stats = measure(scan_all, scanner, sequences)
+            hits = sum(len(r) for r in results[engine])
+            print("%-18s %-6s %8.3f s  %8.1f MB/s  peak %8.1f MB  %d hits" % (iupac, scanner.engine, stats['seconds'],
+                bases / stats['seconds'] / 1e6, stats['peak_bytes'] / 1e6, hits))
+        if results['regex'] != results['numpy']:
+            raise Exception("engines disagree on %s" % iupac)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Peak RSS of writing motif hits as the number of hits grows: the old way, building the sorted list
+of a sequence's hits and printing them one by one, against streaming them through a hit writer.
+Each run scans a random sequence for a degenerate motif (one hit per 3 bp per strand for NNN)
+in a fresh process, writing to /dev/null. With streaming, memory should only grow with the
+sequence, not with the hits.
+
+$ PYTHONPATH=src python benchmarks/bench_motif_output.py [motif]
+"""
+import sys,os,time,resource,subprocess
+from wormtools.motif import MotifScanner
+from wormtools.hits import hit_writer
+
+SIZES = [1 << 20, 1 << 21, 1 << 22, 1 << 23]
+
+def run(mode, size, motif):
+    seq = os.urandom(size).translate(bytes(b'ACGT'[i % 4] for i in range(256)))
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scanner = MotifScanner(motif)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as out:
+        if mode == 'list':
+            result = scanner.scan(seq)
+            for s,e,matched,strand in result:
+                print('seq', s, e, strand, matched.decode(), file=out)
+            n = len(result)
+        else:
+            with hit_writer('text', os.devnull) as writer:
+                n = writer.write('seq', scanner.iter_hits(seq))
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux
+    print(n, seconds, baseline / 1e3, peak / 1e3)
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        run(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+        return
+    motif = sys.argv[1] if len(sys.argv) > 1 else 'NNN'
+    for size in SIZES:
+        for mode in ('list', 'stream'):
+            output = subprocess.check_output([sys.executable, __file__, '--child', mode, str(size), motif])
+            n, seconds, baseline, peak = output.split()
+            print("%5.1f Mb %-7s %9d hits %8.2f s  peak RSS %8.1f MB (%.1f MB before scanning)" % (size / 1e6, mode,
+                int(n), float(seconds), float(peak), float(baseline)))
+
+if __name__ == '__main__': main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Promoters of every transcript: the get_promoters loop over GFF.Gene objects, as scripts did it
+before wormtools.promoters, against promoters() from the genes, from a parsed GFFTable, and
+from a warm GFFCache (no Gene objects at all).
+
+$ PYTHONPATH=src python benchmarks/bench_promoters.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,shutil,tempfile
+from benchutil import measure, report
+from wormtools import GFF, promoters
+
+FLANK = 1000
+
+def gene_loop(filename):
+    return [promoter for gene in GFF.iter_genes(filename, cache=False) for promoter in gene.get_promoters(FLANK)]
+
+def main():
+    filename = sys.argv[1]
+    cache_dir = tempfile.mkdtemp()
+    try:
+        loop, stats = measure(gene_loop, filename)
+        report("get_promoters loop", stats, len(loop), unit='promoter')
+        genes = list(GFF.iter_genes(filename, cache=False))
+        regions, stats = measure(promoters.promoters, genes, FLANK, 0, None, False)
+        report("promoters() of genes", stats, len(regions.name), unit='promoter')
+        regions, stats = measure(lambda: promoters.promoters(GFF.read_table(filename, cache=False), FLANK, unique=False))
+        report("promoters() parsing the GTF", stats, len(regions.name), unit='promoter')
+        GFF.read_table(filename, cache_dir=cache_dir) # write the cache
+        regions, stats = measure(lambda: promoters.promoters(GFF.read_table(filename, cache_dir=cache_dir), FLANK, unique=False))
+        report("promoters() from the cache", stats, len(regions.name), unit='promoter')
+        unique, stats = measure(promoters.unique_regions, regions)
+        report("unique_regions", stats, len(unique.name), unit='region')
+        if len(regions.name) != len(loop):
+            raise Exception("promoter counts disagree")
+    finally:
+        shutil.rmtree(cache_dir)
+
+if __name__ == '__main__': main()
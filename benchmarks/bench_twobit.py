@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+A genome as .2bit against fasta: the time to read every sequence, and the peak resident memory
+(VmHWM, in a fresh process for each; Linux only) with readGZfa on gzipped and plain fasta and on .2bit;
+keeping every sequence (as bytes from readGZfa, as mapped packed views of the .2bit); and 10000
+random 1 kb fetches through IndexedFasta (bgzip) and TwoBitFile. Also the conversion time and sizes.
+
+$ PYTHONPATH=src python benchmarks/bench_twobit.py genome.fa
+"""
+import sys,os,gzip,json,random,shutil,subprocess,tempfile,time
+from wormtools import twobit, bgzf
+from wormtools.fasta import readGZfa, open_indexed
+
+N_FETCHES = 10000
+
+def child(mode, path):
+    # runs in its own process, so ru_maxrss is this mode's alone
+    start = time.perf_counter()
+    if mode == 'stream':
+        n = sum(len(seq) for header, seq in readGZfa(path))
+    elif mode == 'hold':
+        n = sum(len(seq) for seq in [seq for header, seq in readGZfa(path)])
+    elif mode == 'hold-packed':
+        genome = open_indexed(path)
+        packed = [genome.packed(name) for name in genome.names]
+        n = sum(int(view.sum() > 0) + 4 * len(view) for view in packed) # touch every page
+    elif mode == 'fetch':
+        rng = random.Random(21)
+        with open_indexed(path) as genome:
+            names = [name for name in genome.names if genome.length(name) > 1000]
+            n = 0
+            for i in range(N_FETCHES):
+                name = rng.choice(names)
+                start_pos = rng.randrange(genome.length(name) - 1000)
+                n += len(genome.fetch(name, start_pos, start_pos + 1000))
+    seconds = time.perf_counter() - start
+    with open('/proc/self/status') as fh:
+        # the peak resident size of this process since it started (ru_maxrss carries over from the parent on exec)
+        peak = [int(line.split()[1]) for line in fh if line.startswith('VmHWM:')][0]
+    print(json.dumps({'seconds': seconds, 'peak_rss_kb': peak, 'n': n}))
+
+def run(mode, path):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    out = subprocess.run([sys.executable, __file__, '--child', mode, path], capture_output=True, text=True, env=env, check=True).stdout
+    return json.loads(out)
+
+def main():
+    if sys.argv[1] == '--child':
+        return child(sys.argv[2], sys.argv[3])
+    fasta = sys.argv[1]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        gzipped, bgzipped, path = (os.path.join(tmpdir, name) for name in ('genome.fa.gz', 'genome.fa.bgz', 'genome.2bit'))
+        with open(fasta, 'rb') as src, gzip.open(gzipped, 'wb') as dst: shutil.copyfileobj(src, dst)
+        with open(fasta, 'rb') as src, bgzf.BgzfWriter(open(bgzipped, 'wb')) as dst: shutil.copyfileobj(src, dst, 1 << 20)
+        start = time.perf_counter()
+        twobit.fasta_to_twobit(fasta, path)
+        print("converted in %.2f s; fasta %.1f MB, gzip %.1f MB, .2bit %.1f MB" % (time.perf_counter() - start,
+            os.path.getsize(fasta) / 1e6, os.path.getsize(gzipped) / 1e6, os.path.getsize(path) / 1e6))
+        for label, mode, filename in (("readGZfa fasta.gz", 'stream', gzipped), ("readGZfa fasta", 'stream', fasta),
+                                      ("readGZfa .2bit", 'stream', path), ("hold all, readGZfa fasta.gz", 'hold', gzipped),
+                                      ("hold all, readGZfa .2bit", 'hold', path), ("hold all, packed views", 'hold-packed', path),
+                                      ("1 kb fetches, bgzip fasta", 'fetch', bgzipped), ("1 kb fetches, .2bit", 'fetch', path)):
+            result = run(mode, filename)
+            print("%-28s %8.3f s  max RSS %8.1f MB" % (label, result['seconds'], result['peak_rss_kb'] / 1024))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__': main()
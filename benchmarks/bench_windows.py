@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Motif density in windows: counting the hits of iter_hits one at a time into a list of windows, as
+a script would without wormtools.windows, against window_tracks over the scanners' arrays of starts.
+Both count a degenerate motif (NNN by default, two hits per 3 bp) on a random sequence, with each engine.
+
+$ PYTHONPATH=src python benchmarks/bench_windows.py [motif] [megabases]
+"""
+import sys,os
+from benchutil import measure, report
+from wormtools.motif import MotifScanner
+from wormtools.windows import window_tracks
+
+SIZE, STEP = 1000, 500
+
+def hit_loop(scanner, seq):
+    counts = [0] * -(-len(seq) // STEP)
+    for hit in scanner.iter_hits(seq):
+        # every window whose range holds the start
+        first = max(0, (hit[0] - SIZE) // STEP + 1)
+        for window in range(first, hit[0] // STEP + 1):
+            counts[window] += 1
+    return counts
+
+def windowed(scanner, seq):
+    return list(window_tracks(scanner, [('seq', seq, 0)], SIZE, STEP))[0][2]
+
+def main():
+    motif = sys.argv[1] if len(sys.argv) > 1 else 'NNN'
+    megabases = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seq = os.urandom(megabases << 20).translate(bytes(b'ACGT'[i % 4] for i in range(256)))
+    for engine in ('regex', 'numpy'):
+        scanner = MotifScanner(motif, engine=engine)
+        n = scanner.count(seq)
+        loop, stats = measure(hit_loop, scanner, seq)
+        report("%s iter_hits loop" % engine, stats, n, unit='hit')
+        counts, stats = measure(windowed, scanner, seq)
+        report("%s window_tracks" % engine, stats, n, unit='hit')
+        assert counts[0].tolist() == loop
+
+if __name__ == '__main__': main()
@@ -0,0 +1,37 @@
+"""
+Small helpers shared by the benchmark scripts in this directory.
+
+The benchmarks import wormtools, so run them against an installed copy or from the
+repository root with PYTHONPATH=src, e.g.
+$ PYTHONPATH=src python benchmarks/bench_gff_table.py c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import gc,time,tracemalloc
+
+def measure(fn, *args, **kwargs):
+    """
+    Call fn twice: once for wall-clock time, and once under tracemalloc for memory
+    (tracing slows allocation down too much to time the same call).
+    Returns the result of the traced call and a dict of seconds, retained bytes and peak bytes.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    del result
+    gc.collect()
+
+    tracemalloc.start()
+    result = fn(*args, **kwargs)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {'seconds': seconds, 'retained_bytes': retained, 'peak_bytes': peak}
+
+def report(label, stats, n=None, unit='record', plural=None):
+    """Print one line of a benchmark stats dict from measure()"""
+    line = "%-28s %8.3f s  retained %9.1f MB  peak %9.1f MB" % (label, stats['seconds'],
+        stats['retained_bytes'] / 1e6, stats['peak_bytes'] / 1e6)
+    if n:
+        line += "  %10.0f %s/s  %6.1f bytes/%s" % (n / stats['seconds'], plural or unit + 's',
+            stats['retained_bytes'] / n, unit)
+    print(line)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+The benchmark suite: each hot path of wormtools on the same synthetic genome and GTF, with its
+throughput and peak memory, printed as a table and written as JSON to compare between versions.
+
+Inputs are made by synthetic.py from --seed at --scale (1 is the size of the C. elegans genome,
+100 Mb; the default 0.1 runs in a minute or two) and kept in --data-dir, so they are only made
+once. Every component is timed --repeat times, keeping the best, and run once more under
+tracemalloc for its peak memory: Python objects and NumPy arrays, not memory-mapped files.
+
+$ PYTHONPATH=src python benchmarks/run_suite.py -o before.json
+$ git checkout my-branch
+$ PYTHONPATH=src python benchmarks/run_suite.py -o after.json --compare before.json
+
+With --compare, components more than --tolerance slower, or using that much more memory, are
+flagged and the exit status is 1. Results are only comparable for the same inputs, which the JSON
+records by their hashes. --only runs the components whose names start with the given prefixes.
+"""
+import sys,os,json,time,gzip,random,shutil,hashlib,platform,argparse,subprocess,tempfile
+import numpy as np
+from benchutil import measure
+import synthetic
+from wormtools import GFF, annotate, bgzf, gff2bed, intersect, io, promoters, twobit
+from wormtools.GFF import GFFParser
+from wormtools.fasta import readGZfa, open_indexed
+from wormtools.hits import hit_writer
+from wormtools.motif import MotifScanner
+from wormtools.pwm import PWM, PWMScanner
+from wormtools.windows import window_tracks
+
+FORMAT_VERSION = 1
+MOTIF = 'WGATAR'
+# a GATA matrix, a row of A, C, G and T counts for each position
+GATA_COUNTS = [[0, 0, 21, 0], [21, 0, 0, 0], [0, 0, 0, 21], [21, 0, 0, 0], [12, 2, 6, 1]]
+FETCHES = 2000
+FETCH_SIZE = 1000
+
+# (name, units counted, input whose (uncompressed) size gives MB/s or None, function of the Inputs returning how many units it handled)
+SUITE = []
+
+def component(name, unit, size=None):
+    """Register a function of the Inputs as a component of the suite"""
+    def register(fn):
+        SUITE.append((name, unit, size, fn))
+        return fn
+    return register
+
+class Inputs:
+    """The synthetic files of a scale and seed, made if missing, and what the components read from memory"""
+    def __init__(self, directory, scale, seed):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, 'synthetic-%g-%d' % (scale, seed))
+        self.scale, self.seed = scale, seed
+        self.fasta, self.gtf = base + '.fa', base + '.gtf'
+        if not (os.path.exists(self.fasta) and os.path.exists(self.gtf)):
+            print("writing synthetic inputs to", directory, file=sys.stderr)
+            sizes = synthetic.chromosome_sizes(scale)
+            # written under temporary names, so an interrupted run doesn't leave half a file behind
+            synthetic.write_genome(self.fasta + '.tmp', sizes, seed)
+            synthetic.write_gtf(self.gtf + '.tmp', sizes, seed)
+            os.replace(self.fasta + '.tmp', self.fasta)
+            os.replace(self.gtf + '.tmp', self.gtf)
+        self.paths = {'fasta': self.fasta, 'gtf': self.gtf, 'fasta.gz': base + '.fa.gz', 'fasta.bgz': base + '.fa.bgz',
+                      '2bit': base + '.2bit', 'annotation': base + '.annotation.bed', 'hits': base + '.hits.bed'}
+        self._derive()
+        with open(self.gtf) as fh:
+            self.lines = [line for line in fh if not line.startswith('#') and line.strip()]
+        self.attr_strs = [line.rstrip('\n').split('\t', 8)[8] for line in self.lines]
+        self.sequences = list(readGZfa(self.fasta))
+        self.cache_dir = tempfile.mkdtemp()
+        GFF.read_table(self.gtf, cache_dir=self.cache_dir)
+        self.table = GFF.read_table(self.gtf, cache=False)
+        rng = random.Random(seed)
+        lengths = [(name, len(seq)) for name, seq in self.sequences if len(seq) > FETCH_SIZE]
+        self.fetches = []
+        for i in range(FETCHES):
+            name, length = rng.choice(lengths)
+            start = rng.randrange(length - FETCH_SIZE)
+            self.fetches.append((name, start, start + FETCH_SIZE))
+
+    def _derive(self):
+        # compressed copies, the .2bit, the annotation and sorted motif hits, made once like the inputs
+        paths = self.paths
+        if not os.path.exists(paths['fasta.gz']):
+            with open(self.fasta, 'rb') as src, gzip.open(paths['fasta.gz'] + '.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst, io.BLOCKSIZE)
+            os.replace(paths['fasta.gz'] + '.tmp', paths['fasta.gz'])
+        if not os.path.exists(paths['fasta.bgz']):
+            with open(self.fasta, 'rb') as src, bgzf.BgzfWriter(open(paths['fasta.bgz'] + '.tmp', 'wb')) as dst:
+                shutil.copyfileobj(src, dst, io.BLOCKSIZE)
+            os.replace(paths['fasta.bgz'] + '.tmp', paths['fasta.bgz'])
+        if not os.path.exists(paths['2bit']):
+            twobit.fasta_to_twobit(self.fasta, paths['2bit'] + '.tmp')
+            os.replace(paths['2bit'] + '.tmp', paths['2bit'])
+        if not os.path.exists(paths['annotation']):
+            with open(paths['annotation'] + '.tmp', 'wb') as out:
+                annotate.annotate_file(self.gtf, out, prefix='')
+            os.replace(paths['annotation'] + '.tmp', paths['annotation'])
+        if not os.path.exists(paths['hits']):
+            scanner = MotifScanner(MOTIF, engine='numpy')
+            with hit_writer('bed', paths['hits'] + '.tmp') as writer:
+                for header, seq in readGZfa(self.fasta):
+                    writer.write(header, scanner.iter_hits(seq))
+            os.replace(paths['hits'] + '.tmp', paths['hits'])
+
+    def size(self, name):
+        return os.path.getsize(self.paths[name])
+
+    def description(self):
+        """The scale, seed, sizes and hashes of the inputs, for the JSON"""
+        hashes = {}
+        for name in ('fasta', 'gtf'):
+            digest = hashlib.blake2b(digest_size=12)
+            with open(self.paths[name], 'rb') as fh:
+                for block in iter(lambda: fh.read(1 << 22), b''):
+                    digest.update(block)
+            hashes[name] = digest.hexdigest()
+        return {'scale': self.scale, 'seed': self.seed, 'bases': sum(len(seq) for name, seq in self.sequences),
+                'gtf_lines': len(self.lines), 'hashes': hashes}
+
+    def close(self):
+        shutil.rmtree(self.cache_dir)
+
+@component('gff.parseLine', 'lines', 'gtf')
+def parse_lines(inputs):
+    for line in inputs.lines:
+        GFFParser.parseLine(line)
+    return len(inputs.lines)
+
+@component('gff.parseAttr', 'lines', 'gtf')
+def parse_attrs(inputs):
+    for attr_str in inputs.attr_strs:
+        GFFParser.parseAttr(attr_str)
+    return len(inputs.attr_strs)
+
+@component('gff.iter_genes', 'genes', 'gtf')
+def iter_genes(inputs):
+    # parsing and Transcript.append into Gene objects, as scripts walk a GTF
+    return sum(1 for gene in GFF.iter_genes(inputs.gtf, cache=False))
+
+@component('gff.read_table', 'rows', 'gtf')
+def read_table(inputs):
+    return len(GFF.read_table(inputs.gtf, cache=False))
+
+@component('gff.cache_load', 'rows', 'gtf')
+def cache_load(inputs):
+    table = GFF.read_table(inputs.gtf, cache_dir=inputs.cache_dir)
+    table.hierarchy()
+    return len(table)
+
+def _read_fasta(path):
+    return sum(len(seq) for header, seq in readGZfa(path))
+
+@component('fasta.readGZfa.plain', 'bases', 'fasta')
+def read_plain(inputs):
+    return _read_fasta(inputs.paths['fasta'])
+
+@component('fasta.readGZfa.gzip', 'bases', 'fasta')
+def read_gzip(inputs):
+    return _read_fasta(inputs.paths['fasta.gz'])
+
+@component('fasta.readGZfa.bgzip', 'bases', 'fasta')
+def read_bgzip(inputs):
+    return _read_fasta(inputs.paths['fasta.bgz'])
+
+def _fetch(path, fetches):
+    with open_indexed(path) as fa:
+        for name, start, end in fetches:
+            fa.fetch(name, start, end)
+    return len(fetches)
+
+@component('fasta.fetch.bgzip', 'fetches')
+def fetch_bgzip(inputs):
+    return _fetch(inputs.paths['fasta.bgz'], inputs.fetches)
+
+@component('twobit.fetch', 'fetches')
+def fetch_twobit(inputs):
+    return _fetch(inputs.paths['2bit'], inputs.fetches)
+
+def _count(scanner, sequences):
+    for name, seq in sequences:
+        scanner.count(seq)
+    return sum(len(seq) for name, seq in sequences)
+
+@component('motif.scan.regex', 'bases', 'fasta')
+def scan_regex(inputs):
+    # format_motif and compiling the patterns, then the regex scan
+    return _count(MotifScanner(MOTIF), inputs.sequences)
+
+@component('motif.scan.numpy', 'bases', 'fasta')
+def scan_numpy(inputs):
+    return _count(MotifScanner(MOTIF, engine='numpy'), inputs.sequences)
+
+@component('motif.hits.text', 'hits')
+def write_hits(inputs):
+    scanner = MotifScanner(MOTIF, engine='numpy')
+    with hit_writer('text', os.devnull) as writer:
+        return sum(writer.write(name, scanner.iter_hits(seq)) for name, seq in inputs.sequences)
+
+@component('pwm.scan', 'bases', 'fasta')
+def scan_pwm(inputs):
+    return _count(PWMScanner([PWM('GATA', GATA_COUNTS)]), inputs.sequences)
+
+@component('windows.window_tracks', 'bases', 'fasta')
+def windows(inputs):
+    scanner = MotifScanner(MOTIF, engine='numpy')
+    sequences = ((name, seq, 0) for name, seq in inputs.sequences)
+    for track in window_tracks(scanner, sequences, 1000, 500, split=True):
+        pass
+    return sum(len(seq) for name, seq in inputs.sequences)
+
+@component('annotate.annotate_file', 'regions', 'gtf')
+def annotate_genome(inputs):
+    with open(os.devnull, 'wb') as out:
+        return annotate.annotate_file(inputs.gtf, out)
+
+@component('promoters.promoters', 'regions')
+def promoter_regions(inputs):
+    return len(promoters.promoters(inputs.table, upstream=1000).name)
+
+@component('gff2bed.bed12', 'lines', 'gtf')
+def bed12(inputs):
+    with open(os.devnull, 'wb') as out:
+        return gff2bed.convert(inputs.gtf, out, 'bed12')
+
+@component('intersect.annotate_hits', 'hits', 'hits')
+def annotate_hits(inputs):
+    with open(os.devnull, 'wb') as out:
+        return intersect.annotate_hits(inputs.paths['hits'], inputs.paths['annotation'], out, prefix='')[0]
+
+def run(inputs, name, unit, size, fn, repeat):
+    """The results of one component: its timing (best of repeat), peak memory and throughput"""
+    n, stats = measure(fn, inputs)
+    for i in range(repeat - 1):
+        start = time.perf_counter()
+        fn(inputs)
+        stats['seconds'] = min(stats['seconds'], time.perf_counter() - start)
+    result = {'unit': unit, 'n': n, 'seconds': stats['seconds'], 'per_second': n / stats['seconds'],
+              'mb_per_second': inputs.size(size) / stats['seconds'] / 1e6 if size else None,
+              'peak_bytes': stats['peak_bytes'], 'retained_bytes': stats['retained_bytes']}
+    print("%-26s %8.3f s  %12.0f %s/s  %s  peak %8.1f MB" % (name, result['seconds'], result['per_second'], unit,
+          "%7.1f MB/s" % result['mb_per_second'] if size else " " * 12, result['peak_bytes'] / 1e6), flush=True)
+    return result
+
+def environment():
+    """What the results were measured with: versions, the git commit of the tree, and the machine"""
+    try:
+        commit = subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        from importlib.metadata import version
+        wormtools_version = version('wormtools')
+    except Exception:
+        wormtools_version = None
+    return {'wormtools': wormtools_version, 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+def compare(old, new, tolerance):
+    """Print how each component of new did against old, returning the number of regressions"""
+    if old['inputs']['hashes'] != new['inputs']['hashes']:
+        print("warning: the inputs differ from those of the results compared against", file=sys.stderr)
+    regressions = 0
+    print("\n%-26s %10s %10s %10s" % ("against %s" % (old['environment'].get('commit') or 'earlier results'), "time", "peak", ""))
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        time_ratio = result['seconds'] / before['seconds']
+        peak_ratio = result['peak_bytes'] / max(before['peak_bytes'], 1)
+        flags = []
+        if time_ratio > 1 + tolerance:
+            flags.append('SLOWER')
+        if peak_ratio > 1 + tolerance and result['peak_bytes'] - before['peak_bytes'] > 1 << 20:
+            flags.append('MORE MEMORY')
+        regressions += bool(flags)
+        print("%-26s %9.2fx %9.2fx %s" % (name, time_ratio, peak_ratio, ' '.join(flags)))
+    return regressions
+
+def main():
+    args = get_args()
+    components = [c for c in SUITE if not args.only or c[0].startswith(tuple(args.only))]
+    inputs = Inputs(args.data_dir, args.scale, args.seed)
+    try:
+        results = {}
+        for name, unit, size, fn in components:
+            results[name] = run(inputs, name, unit, size, fn, args.repeat)
+        report = {'format': FORMAT_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+                  'inputs': inputs.description(), 'repeat': args.repeat, 'results': results}
+    finally:
+        inputs.close()
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=1)
+    if args.compare:
+        with open(args.compare) as fh:
+            if compare(json.load(fh), report, args.tolerance):
+                sys.exit(1)
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Run the wormtools benchmark suite on synthetic inputs.")
+    parser.add_argument('-o', '--output', metavar='JSON', help="Write the results to this JSON file.")
+    parser.add_argument('--compare', metavar='JSON', help="Compare the results with those of an earlier run.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="With --compare, flag components this much slower or larger (default %(default)g).")
+    parser.add_argument('--scale', type=float, default=0.1, help="Genome size as a fraction of C. elegans' (default %(default)g).")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the inputs (default %(default)d).")
+    parser.add_argument('--repeat', type=int, default=3, help="Time each component this many times, keeping the best (default %(default)d).")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'wormtools-bench'), help="Where the inputs are made and kept (default %(default)s).")
+    parser.add_argument('--only', nargs='+', metavar='PREFIX', help="Only run components whose names start with these.")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+if __name__ == '__main__': main()
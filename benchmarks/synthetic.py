@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic inputs for the benchmarks: a genome fasta and a WormBase-shaped GTF.
+
+The genome has the chromosomes of C. elegans (WS261 lengths) times scale, MtDNA at its own size.
+Bases are uniform random, with runs of soft-masked (lower case) sequence covering masked of each
+chromosome, the way repeats are, and n_runs runs of N per chromosome, written 60 bases to a line.
+
+The GTF has genes_per_mb genes per megabase on each chromosome, placed one after another with
+random intergenic gaps (some overlapping their neighbour), on either strand. 80% are protein
+coding, with one to four transcripts made by skipping and trimming exons of a common model, each
+with exon, CDS, start_codon, stop_codon, five_prime_utr and three_prime_utr lines carrying the
+attributes WormBase writes; the rest are single-transcript ncRNA, piRNA or snoRNA genes with exons only.
+Minus-strand transcripts list their exons 3' to 5', as WormBase does.
+
+The same seed and scale always give the same files, so benchmark results can be compared across
+versions. Write them for the other benchmark scripts with
+$ python benchmarks/synthetic.py --scale 1 genome.fa genes.gtf
+"""
+import sys,random,argparse
+import numpy as np
+
+# C. elegans WS261 chromosome lengths
+CHROMOSOME_SIZES = {'I': 15072434, 'II': 15279421, 'III': 13783801, 'IV': 17493829,
+                    'V': 20924180, 'X': 17718942, 'MtDNA': 13794}
+LINE_WIDTH = 60
+BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+
+def chromosome_sizes(scale=0.1):
+    """The C. elegans chromosome lengths times scale, MtDNA left at its own length"""
+    return dict((name, size if name == 'MtDNA' else max(1000, int(size * scale))) for name, size in CHROMOSOME_SIZES.items())
+
+def random_sequence(rng, length, masked=0.5, n_runs=10):
+    """A random sequence of length as a uint8 array, with soft-masked runs covering about masked of it and n_runs runs of N"""
+    seq = BASES[rng.integers(0, 4, length)]
+    # repeat-like masked runs of a few hundred bases, as many as it takes to cover masked
+    n_masked = int(length * masked / 300)
+    starts = rng.integers(0, length, n_masked)
+    ends = np.minimum(starts + rng.geometric(1 / 300, n_masked), length)
+    edges = np.zeros(length + 1, dtype=np.int32)
+    np.add.at(edges, starts, 1)
+    np.add.at(edges, ends, -1)
+    seq[np.cumsum(edges[:-1]) > 0] |= 0x20
+    for start, size in zip(rng.integers(0, length, n_runs).tolist(), rng.geometric(1 / 2000, n_runs).tolist()):
+        seq[start:start + size] = ord('N')
+    return seq
+
+def write_genome(path, sizes, seed=0, masked=0.5, n_runs=10):
+    """Write a fasta of a random sequence for each of sizes ({name: length}) to path"""
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as fh:
+        for name, length in sizes.items():
+            seq = random_sequence(rng, length, masked, n_runs)
+            fh.write(b'>' + name.encode() + b'\n')
+            full = length // LINE_WIDTH * LINE_WIDTH
+            lines = np.empty((full // LINE_WIDTH, LINE_WIDTH + 1), dtype=np.uint8)
+            lines[:, :LINE_WIDTH] = seq[:full].reshape(-1, LINE_WIDTH)
+            lines[:, LINE_WIDTH] = ord('\n')
+            fh.write(lines.tobytes())
+            if full < length:
+                fh.write(seq[full:].tobytes() + b'\n')
+
+def _attributes(gene_id, biotype, transcript_id=None, extra=''):
+    attr = 'gene_id "%s";' % gene_id
+    if transcript_id is not None:
+        attr += ' transcript_id "%s";' % transcript_id
+    attr += extra + ' gene_source "WormBase"; gene_biotype "%s";' % biotype
+    if transcript_id is not None:
+        attr += ' transcript_source "WormBase"; transcript_biotype "%s";' % biotype
+    return attr
+
+def _exon_model(rng, start):
+    # ascending (start, end) 1-based exons of a gene model starting at start
+    exons = []
+    for i in range(rng.randint(1, 12)):
+        end = start + int(rng.lognormvariate(5, 0.6))
+        exons.append((start, end))
+        start = end + 45 + int(rng.expovariate(1 / 250))
+    return exons
+
+def _isoforms(rng, exons, n):
+    # n transcripts from the model: the first is whole, the others skip an inner exon or trim the ends
+    transcripts = [exons]
+    while len(transcripts) < n:
+        isoform = list(exons)
+        if len(isoform) > 2 and rng.random() < 0.6:
+            del isoform[rng.randint(1, len(isoform) - 2)]
+        start, end = isoform[0]
+        isoform[0] = (min(end, start + rng.randint(0, (end - start) // 2)), end)
+        start, end = isoform[-1]
+        isoform[-1] = (start, max(start, end - rng.randint(0, (end - start) // 2)))
+        transcripts.append(isoform)
+    return transcripts
+
+def _genomic(pieces, forward, offset, length):
+    # the genomic (start, end) spans of the spliced positions offset to offset+length of a
+    # transcript, one per exon they fall in, pieces being its exons 5' to 3' with their spliced starts
+    spans = []
+    for (start, end), position in pieces:
+        lo, hi = max(offset, position), min(offset + length, position + end - start + 1)
+        if lo < hi:
+            if forward:
+                spans.append((start + lo - position, start + hi - position - 1))
+            else:
+                spans.append((end - (hi - position) + 1, end - (lo - position)))
+    return spans
+
+def _transcript_lines(rng, seqname, strand, gene_id, transcript_id, exons, coding):
+    forward = strand == '+'
+    biotype = 'protein_coding' if coding else 'ncRNA'
+    ordered = exons if forward else exons[::-1]
+    length = sum(end - start + 1 for start, end in exons)
+    pieces, position = [], 0
+    for exon in ordered:
+        pieces.append((exon, position))
+        position += exon[1] - exon[0] + 1
+
+    # the coding span: a 5' UTR, whole codons, then the stop codon and a 3' UTR
+    utr5 = utr3 = 0
+    if coding:
+        utr5 = rng.randint(0, min(200, length // 4))
+        utr3 = rng.randint(0, min(300, length // 4))
+        utr3 += (length - utr5 - utr3) % 3
+        if length - utr5 - utr3 < 6:
+            coding = False
+    cds_end = length - utr3 - 3 if coding else 0
+
+    def line(feature, start, end, frame, attr):
+        return '\t'.join([seqname, 'WormBase', feature, str(start), str(end), '.', strand, frame, attr])
+
+    lines = [line('transcript', exons[0][0], exons[-1][1], '.', _attributes(gene_id, biotype, transcript_id))]
+    utrs = []
+    for number, ((start, end), position) in enumerate(pieces, 1):
+        exon_attr = ' exon_number "%d";' % number
+        lines.append(line('exon', start, end, '.', _attributes(gene_id, biotype, transcript_id, exon_attr + ' exon_id "%s.e%d";' % (transcript_id, number))))
+        if not coding:
+            continue
+        size = end - start + 1
+        # the part of this exon in the CDS, and the UTRs either side of it
+        lo, hi = max(position, utr5), min(position + size, cds_end)
+        if lo < hi:
+            cds, = _genomic(pieces, forward, lo, hi - lo)
+            frame = str((3 - (lo - utr5) % 3) % 3)
+            lines.append(line('CDS', cds[0], cds[1], frame, _attributes(gene_id, biotype, transcript_id, exon_attr + ' protein_id "%s";' % transcript_id)))
+        for feature, codon in (('start_codon', utr5), ('stop_codon', cds_end)):
+            # a codon split by an intron is written as a line for each part, with the exon_number of the first
+            if position <= codon < position + size:
+                for span in _genomic(pieces, forward, codon, 3):
+                    lines.append(line(feature, span[0], span[1], '0', _attributes(gene_id, biotype, transcript_id, exon_attr)))
+        for feature, lo, hi in (('five_prime_utr', position, min(position + size, utr5)),
+                                ('three_prime_utr', max(position, cds_end + 3), position + size)):
+            if lo < hi:
+                utrs.extend((feature, span) for span in _genomic(pieces, forward, lo, hi - lo))
+    for feature, (start, end) in utrs:
+        lines.append(line(feature, start, end, '.', _attributes(gene_id, biotype, transcript_id)))
+    return lines
+
+def gtf_lines(sizes, seed=0, genes_per_mb=200):
+    """Generate the lines (without newlines) of a WormBase-shaped GTF of genes on the chromosomes of sizes"""
+    rng = random.Random(seed)
+    number = 0
+    for seqname, length in sizes.items():
+        n_genes = max(1, int(length / 1e6 * genes_per_mb))
+        # gaps that put the genes about evenly along the chromosome
+        mean_gap = max(100, length / n_genes - 2800)
+        position = rng.randint(1, 2000)
+        for g in range(n_genes):
+            exons = _exon_model(rng, position)
+            if exons[-1][1] >= length:
+                break
+            number += 1
+            gene_id = 'WBGene%08d' % number
+            clone = 'SYN%s%d' % (seqname, g)
+            strand = rng.choice('+-')
+            coding = rng.random() < 0.8
+            if coding:
+                transcripts = _isoforms(rng, exons, min(4, 1 + int(rng.expovariate(1.5))))
+                biotype = 'protein_coding'
+            else:
+                transcripts = [exons]
+                biotype = rng.choice(['ncRNA', 'piRNA', 'snoRNA'])
+            gene_start = min(t[0][0] for t in transcripts)
+            gene_end = max(t[-1][1] for t in transcripts)
+            yield '\t'.join([seqname, 'WormBase', 'gene', str(gene_start), str(gene_end), '.', strand, '.', _attributes(gene_id, biotype)])
+            for t, exons in enumerate(transcripts):
+                transcript_id = clone + '.1' + ('abcd'[t] if len(transcripts) > 1 else '')
+                lines = _transcript_lines(rng, seqname, strand, gene_id, transcript_id, exons, coding)
+                if not coding:
+                    lines = [line.replace('"ncRNA"', '"%s"' % biotype) for line in lines]
+                yield from lines
+            # now and then the next gene overlaps this one
+            if rng.random() < 0.1:
+                position = gene_start + rng.randint(0, max(1, gene_end - gene_start))
+            else:
+                position = gene_end + 1 + int(rng.expovariate(1 / mean_gap))
+
+def write_gtf(path, sizes, seed=0, genes_per_mb=200):
+    """Write the GTF of gtf_lines to path, returning its number of lines"""
+    n = 0
+    with open(path, 'w') as fh:
+        fh.write('#!genome-build synthetic\n')
+        for line in gtf_lines(sizes, seed, genes_per_mb):
+            fh.write(line + '\n')
+            n += 1
+    return n
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic genome fasta and WormBase-shaped GTF.")
+    parser.add_argument('fasta', help="Fasta file to write.")
+    parser.add_argument('gtf', help="GTF file to write.")
+    parser.add_argument('--scale', type=float, default=0.1, help="Chromosome sizes as a fraction of C. elegans' (default %(default)g).")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default %(default)d).")
+    parser.add_argument('--masked', type=float, default=0.5, help="Fraction of each chromosome soft-masked (default %(default)g).")
+    parser.add_argument('--n-runs', type=int, default=10, help="Runs of N per chromosome (default %(default)d).")
+    parser.add_argument('--genes-per-mb', type=float, default=200, help="Gene density (default %(default)g).")
+    args = parser.parse_args()
+    sizes = chromosome_sizes(args.scale)
+    write_genome(args.fasta, sizes, args.seed, args.masked, args.n_runs)
+    n = write_gtf(args.gtf, sizes, args.seed, args.genes_per_mb)
+    print("wrote %d bases to %s and %d lines to %s" % (sum(sizes.values()), args.fasta, n, args.gtf), file=sys.stderr)
+
+if __name__ == '__main__': main()
@@ -1,60 +1,234 @@
 #!/usr/bin/env python3
 """
-Scan a (multi)fasta file for a DNA motif.
+Scan a (multi)fasta file for a DNA motif, for every motif of a motif file in one pass,
+or for the position weight matrices of a JASPAR or MEME file.
 
 Example:
-$ search_seq_motif.py chrI.fa WGATAR
+$ search_seq_motif.py WGATAR chrI.fa
 chrI 439 445 + AGATAA
 chrI 3071 3077 + AGATAG
 chrI 3683 3689 - CTATCT
 chrI 5404 5410 - TTATCT
+
+$ search_seq_motif.py -m panel.txt chrI.fa
+chrI 439 445 + AGATAA GATA
+chrI 1022 1028 + CACGTG Ebox
+chrI 1022 1028 - CACGTG Ebox
+...
+
+$ search_seq_motif.py --pwm gata.jaspar --pvalue 1e-3 sample.fa
+chrI 209 220 - TATGAATCTCT 7.530 GATA1
+chrII 3 14 - TCTCCATCTGA 8.636 GATA1
+...
+
+$ search_seq_motif.py --windows 100:50 -e numpy WGATAR sample.fa
+chrI	0	100	0
+chrI	50	150	1
+chrI	100	200	1
+...
 """
 
-import re,sys,gzip,argparse
+import sys,argparse
+from wormtools.fasta import readGZfa, open_indexed
+from wormtools.motif import MotifScanner, MultiMotifScanner, read_motifs, scan_parallel, ENGINES
+from wormtools.pwm import PWMScanner, read_matrices, DEFAULT_PVALUE
+from wormtools.hits import hit_writer, open_output, FORMATS
+from wormtools.windows import parse_windows, window_tracks, window_writer, track_names
+from wormtools import stats
+
 def main():
 
     args = get_args()
-
-    forward_pattern, reverse_pattern = format_motif( args.motif )
-    print("searching", forward_pattern, "|", reverse_pattern, file=sys.stderr)
-
-    f_compiled = re.compile(forward_pattern)
-    r_compiled = re.compile(reverse_pattern)
+    with stats.recording(args):
+        search(args)
+
+def search(args):
+    if args.pwm:
+        scanner = PWMScanner(read_matrices(args.pwm), args.threshold, args.pvalue)
+        print("searching", len(scanner.pwms), "matrices from", args.pwm, "scoring at least",
+              ", ".join("%.3f" % t for t in scanner.thresholds), file=sys.stderr)
+    elif args.motifs:
+        motif = read_motifs(args.motifs)
+        scanner = MultiMotifScanner(motif, args.engine)
+        print("searching", len(scanner.scanners), "motifs from", args.motifs, file=sys.stderr)
+    else:
+        motif = args.motif
+        scanner = MotifScanner(motif, engine=args.engine)
+        print("searching", scanner.forward_pattern, "|", scanner.reverse_pattern, "with the", scanner.engine, "engine", file=sys.stderr)
+    labelled = args.motifs is not None or args.pwm is not None
 
     print("scanning sequences:", end=' ', file=sys.stderr)
 
     inseq = args.fasta
 
-    for header,seq in readGZfa(inseq):
+    if args.regions:
+        sequences = region_sequences(inseq, args.regions)
+    else:
+        sequences = ((header, seq, 0) for header,seq in readGZfa(inseq))
+
+    if args.windows:
+        count_windows(args, scanner, sequences, labelled)
+        return
+
+    if args.jobs > 1:
+        results = scan_parallel(motif, sequences, args.jobs, count=args.count, engine=args.engine)
+    elif args.count:
+        results = ((header, seq, offset, scanner.count(seq)) for header,seq,offset in sequences)
+    else:
+        # hits are generated lazily, in position order, and go straight to the writer
+        results = ((header, seq, offset, scanner.iter_hits(seq, offset)) for header,seq,offset in sequences)
+    # while recording (see wormtools.stats), scanning is timed apart from reading the fasta and writing hits
+    results = stats.timed('motif.scan', results, 'slices', lambda result: len(result[1]), 'bases')
+
+    if args.count:
+        out = open_output(args.output)
+    else:
+        writer = hit_writer(args.format, args.output, score=args.pwm is not None, label=labelled,
+                            labels=scanner.labels if labelled else ())
+
+    def print_count(header, count):
+        if labelled:
+            lines = ["%s %s %d\n" % (header, label, n) for label,n in zip(scanner.labels, count)]
+        else:
+            lines = ["%s %d\n" % (header, count)]
+        out.write(''.join(lines).encode())
+
+    counted_header, count = None, 0
+    for header,seq,offset,result in results:
         
         if args.count:
-            count = len(f_compiled.findall(seq)) + len(r_compiled.findall(seq))
-            print(header, count)
+            # region slices of one sequence come together, and are added up
+            if header != counted_header:
+                if counted_header is not None: print_count(counted_header, count)
+                counted_header, count = header, result
+            elif labelled:
+                count = [a + b for a,b in zip(count, result)]
+            else:
+                count += result
         else:
             print(header, end=" ", file=sys.stderr, flush=True)
-            # search sequences
-            f_result = [ expand_match(m) + ('+',) for m in f_compiled.finditer(seq)]
-            r_result = [ expand_match(m) + ('-',) for m in r_compiled.finditer(seq)]
-            result = f_result + r_result
-            result.sort(key=lambda a: (a[0],a[1]))
-
-            print("(%d)" % len(result), file=sys.stderr, flush=True, end=' ')
+            with stats.timer('hits.write'):
+                n = writer.write(header, stats.timed('motif.scan', result, 'hits'))
+            stats.count('hits.write', hits=n)
+            print("(%d)" % n, file=sys.stderr, flush=True, end=' ')
+
+    if args.count:
+        if counted_header is not None:
+            print_count(counted_header, count)
+        if out is sys.stdout.buffer:
+            out.flush()
+        else:
+            out.close()
+    else:
+        writer.close()
 
-            for i,r in enumerate(result): 
-                s,e,seq,strand = r[0], r[1], r[2], r[3]
-                print(header, s,e, strand, seq)
+    print("done.", file=sys.stderr)
 
+def count_windows(args, scanner, sequences, labelled):
+    """Write the hit counts of each motif in windows along each sequence, as bedGraph or a .npz of arrays"""
+    size, step = args.windows
+    lengths = None
+    if args.regions:
+        # windows run along whole sequences, not just the regions scanned
+        with open_indexed(args.fasta) as fa:
+            lengths = dict((name, fa.length(name)) for name in fa.names)
+    tracks = track_names(scanner.labels if labelled else [scanner.label], args.split_strands)
+    with window_writer('npz' if args.format == 'npz' else 'bedgraph', args.output, size, step, tracks) as writer:
+        windows = window_tracks(scanner, sequences, size, step, args.split_strands, lengths)
+        for seqname, length, counts in stats.timed('motif.scan', windows, 'sequences', lambda track: track[1], 'bases'):
+            print(seqname, end=" ", file=sys.stderr, flush=True)
+            with stats.timer('windows.write'):
+                n = writer.write(seqname, length, counts)
+            stats.count('windows.write', windows=n)
+            print("(%d windows)" % n, file=sys.stderr, flush=True, end=' ')
     print("done.", file=sys.stderr)
 
+def read_bed_regions(bedfile):
+    """
+    Read the seqname, start, end of each line of a BED file, merging overlapping regions
+    so no part of the genome is scanned twice. Returns {seqname: [(start,end), ...]} sorted by start.
+    """
+    regions = {}
+    for line in open(bedfile):
+        if not line.strip() or line.startswith(('#', 'track', 'browser')): continue
+        fields = line.split()
+        regions.setdefault(fields[0], []).append((int(fields[1]), int(fields[2])))
+
+    for seqname, spans in regions.items():
+        spans.sort()
+        merged = [spans[0]]
+        for start,end in spans[1:]:
+            if start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+            else:
+                merged.append((start,end))
+        regions[seqname] = merged
+    return regions
+
+def region_sequences(fasta, bedfile):
+    """
+    Generate (seqname, slice, offset of the slice) for each merged BED region, fetched through a .fai index
+    (or from a .2bit file).
+    Sequences come in fasta order and regions in position order, like a whole-genome scan.
+    """
+    regions = read_bed_regions(bedfile)
+    with open_indexed(fasta) as fa:
+        missing = [seqname for seqname in regions if seqname not in fa]
+        if missing:
+            raise Exception("regions on sequences not in %s: %s" % (fasta, ", ".join(missing)))
+        for seqname in fa.names:
+            for start,end in regions.get(seqname, []):
+                start = max(0, start)
+                with stats.timer('fasta.fetch'):
+                    seq = fa.fetch(seqname, start, end)
+                stats.count('fasta.fetch', regions=1, bases=len(seq))
+                yield seqname, seq, start
+
 def get_args():
     parser = argparse.ArgumentParser(prog="search_seq_motif.py", 
         description=__doc__, 
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="Default output lines are: seqname start end strand sequence")
-    parser.add_argument('motif', help="DNA Motif in IUPAC symbols")   
-    parser.add_argument('fasta', help="Fasta file. Can be gzipped (expects .gz extension).")
+        epilog="Default output lines are: seqname start end strand sequence, followed by the motif label with -m, "
+            "or the score and matrix name with --pwm. "
+            "With --count they are: seqname count, or seqname label count with -m or --pwm. "
+            "With --windows they are bedGraph: seqname start end count, with a 'track' line before each motif's (and strand's) lines when there are several.")
+    parser.add_argument('motif', nargs='?', help="DNA Motif in IUPAC symbols. Leave out when using -m or --pwm.")
+    parser.add_argument('fasta', help="Fasta file, or a UCSC .2bit file (see wormtools-fa2twobit). A fasta can be gzip or bgzip compressed, whatever its name.")
+    parser.add_argument('-m', '--motifs', metavar='FILE', help="Scan for every motif in FILE, one per line as 'motif' or 'label motif', in a single pass over the fasta.")
+    parser.add_argument('-p', '--pwm', metavar='FILE', help="Score every window on both strands with the position weight matrices of a JASPAR or MEME file.")
+    parser.add_argument('--pvalue', type=float, default=DEFAULT_PVALUE, help="With --pwm, report windows whose score is this unlikely in random background sequence (default %(default)g).")
+    parser.add_argument('--threshold', type=float, help="With --pwm, report windows scoring at least this log2-odds score, instead of using --pvalue.")
+    parser.add_argument('-o', '--output', metavar='FILE', help="Write to FILE instead of standard output, bgzip-compressed if it ends in .gz.")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='text', help="Output as the default text lines, as BED6 (named by the motif label, or the matched sequence), or as a NumPy .npz of columns (needs -o).")
     parser.add_argument('-c', '--count', help="Output the number of matches for each sequence instead of the positions.", action='store_true')
-    return parser.parse_args()
+    parser.add_argument('-w', '--windows', metavar='SIZE[:STEP]', help="Output the number of matches starting in windows of SIZE bases every STEP bases (default SIZE) along each sequence, as bedGraph, or with -f npz one array of counts per sequence.")
+    parser.add_argument('--split-strands', action='store_true', help="With --windows, count the matches on each strand separately.")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Scan with this many worker processes, across sequences and across chunks of long sequences. Output is identical to a serial run.")
+    parser.add_argument('-e', '--engine', choices=ENGINES, default='regex', help="How motifs are matched. 'numpy' matches base bitmasks with vectorized array operations, and is much faster for short fixed-length motifs; motifs with ranges like {1,3} always use 'regex'. Output is the same either way.")
+    parser.add_argument('-r', '--regions', metavar='BED', help="Only scan these regions (e.g. promoters), fetched by random access. The fasta must be plain or bgzip-compressed (a .fai index is built if missing), or .2bit.")
+    stats.add_arguments(parser)
+    # intermixed, so options may still come between the motif and the fasta
+    args = parser.parse_intermixed_args()
+    if [args.motif, args.motifs, args.pwm].count(None) != 2:
+        parser.error("give one motif, a motif file with -m, or a matrix file with --pwm")
+    if args.format == 'npz' and not args.output:
+        parser.error("-f npz needs an output file, -o")
+    if args.count and args.format != 'text':
+        parser.error("--count output is always text")
+    if args.pwm and args.jobs > 1:
+        parser.error("--jobs is not supported with --pwm")
+    if args.windows:
+        try:
+            args.windows = parse_windows(args.windows)
+        except Exception as e:
+            parser.error(str(e))
+        if args.count or args.format == 'bed':
+            parser.error("--windows output is bedGraph, or -f npz")
+        if args.jobs > 1:
+            parser.error("--jobs is not supported with --windows")
+    elif args.split_strands:
+        parser.error("--split-strands needs --windows")
+    return args
 
 if False:
     print(sys.argv[0], "motif", "infile.fasta[.gz]")
@@ -64,107 +238,4 @@ if False:
     print("    See https://www.gnu.org/software/grep/manual/grep.html#Fundamental-Structure for exact syntax.")
     sys.exit(1)
 
-VALID_CHARS = 'ACGTKRWMYSBDHVN'
-
-CODES = { # use this to make a legal regex
-    'A':'A', 'C':'C', 'G':'G', 'T':'T',
-    'K': '[GT]', 'R': '[AG]', 'W': '[AT]',
-    'M': '[AC]', 'Y': '[CT]', 'S': '[GC]', 
-    'B': '[CGT]', 'D': '[AGT]',
-    'H': '[ACT]', 'V': '[ACG]',
-    'N': '[ACGT]' }
-
-# translation tables for complementation
-DNA_COMPLEMENT = str.maketrans('ACGT','TGCA')
-MOTIF_COMPLEMENT = str.maketrans('ACGT' + 'KRWMYS' + 'BDHVN', 'TGCA' + 'MYWKRS' + 'VHDBN')
-
-def decode(gzip_iterable):
-    for gz in gzip_iterable:
-        yield gz.decode()
-
-def readGZfa(gzfilename):
-
-    isGzip = False
-    if gzfilename.endswith('.gz'):
-        isGzip = True
-        fh = gzip.open(gzfilename)
-        
-    else:
-        fh = open(gzfilename)
-
-    with fh:
-        current_seq = None
-        current_header = None
-        if isGzip: 
-            lines = decode(fh)
-        else: 
-            lines = fh
-    
-        for line in lines:
-            if line.startswith('>'):
-
-                if current_header is not None:
-                    yield current_header,current_seq
-
-                current_header = line.strip().lstrip('>')
-                current_seq = ''
-                
-            else:
-                current_seq += line.strip()
-
-        if current_header is not None:
-            yield current_header, current_seq.upper()
-
-def expand_match(m): 
-    return m.start(), m.end(), m.string[m.start():m.end()]
-
-def format_motif(arg):
-    # copy an IUPAC-specified motif into its reverse complement
-    # and merge the two into a legal regular expression
-    usr_motif = arg.upper()
-    
-    # divide motif into a list of (symbol,range). A range is like '{0,3}'
-    motif = []
-    rangestr = ''
-
-    for c in usr_motif:
-        # add supported symbols
-        #if c in 'ACGTMKWSYRN':
-        if c in 'ACGTMKWSYRNBDHV':
-            if rangestr:
-                lc,r = motif[-1]
-                motif[-1] = (lc,rangestr)
-                rangestr = ''
-            motif.append((c,None))
-        # accumulate supported range character
-        elif c in '{},0123456789':
-            rangestr += c
-        else:
-            raise Exception("character " + c + " not a valid motif character") 
-
-    # do the last one from the above loop 
-    if rangestr:
-        lc,r = motif_noranges[-1]
-        motif_noranges[-1] = (lc,rangestr)
-    
-    # create the forward regular expression
-    regex_motif = ''
-    for char,ranges in motif:
-        regex_motif += CODES[char]
-        if ranges is not None:
-            regex_motif += ranges
-        
-    #regex_motif += '|' # 'or'
-    revcmp_motif = ''
-
-    # create and add the reverse complemented regular expression
-    motif.reverse()
-    for char,ranges in motif:
-        revcmp_motif += CODES[ char.translate(MOTIF_COMPLEMENT) ] 
-        if ranges is not None:
-            revcmp_motif += ranges
-
-    return regex_motif,revcmp_motif
-
-
 if __name__ == '__main__': main()
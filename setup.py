@@ -4,9 +4,12 @@ setup(
     version="0.1",
     package_dir={'':'src'},
     packages=find_packages('src'),
+    install_requires=['numpy'],
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     scripts=["scripts/search_seq_motif.py"],
+    entry_points={'console_scripts': ['wormtools-annotate=wormtools.annotate:main', 'wormtools-gff2bed=wormtools.gff2bed:main',
+                                      'wormtools-fa2twobit=wormtools.twobit:main', 'wormtools-annotate-hits=wormtools.intersect:main']},
     author="David King",
     author_email="David.King@colostate.edu",
     description="Python tools for bioinformatics on c. elegans.",
@@ -0,0 +1,240 @@
+"""
+A binary on-disk cache of parsed GFF/GTF files.
+============================================================================
+Parsing a whole WormBase GTF takes seconds, and the file only changes about once a release.
+The first time a GTF is loaded through read_table or iter_genes, its GFFTable is written to a
+cache file, and later loads map that file into memory instead of parsing the text again.
+
+A cache file holds, after a short JSON header:
+- every GFFTable column as a raw array (categorical columns as codes, their levels in the header)
+- the gene/transcript hierarchy: the row of each gene and transcript line, the gene of each
+  transcript, the transcript of each row, and the gene_id and transcript_id of each.
+- the table's GeneIndex of IDs, names, biotypes and sources
+Arrays are aligned so they can be used in place from a read-only mmap; nothing is copied until
+a row is asked for.
+
+The header records the size, mtime and a content hash of the GTF it was made from. A cache with
+the same size and mtime is used as is. If only the mtime changed (a copy, a touch), the file is
+hashed, and the cache is kept (with the new mtime) if the content is the same. Anything else
+means the GTF is parsed again and the cache rewritten.
+
+Caches go in cache_dir, by default $WORMTOOLS_CACHE_DIR or ~/.cache/wormtools. Pass the GTF's own
+directory to keep the cache next to it.
+"""
+import os,sys,json,mmap,hashlib,tempfile
+from collections import namedtuple
+import numpy as np
+from . import GFFParser
+
+MAGIC = b'WTGFFC\0\0'
+VERSION = 2
+ALIGNMENT = 64
+SUFFIX = '.wtcache'
+DEFAULT_CACHE_DIR = os.environ.get('WORMTOOLS_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'wormtools')
+
+# the categorical columns of a GFFTable, stored as codes with their levels in the header
+CATEGORY_COLUMNS = ('seqname', 'source', 'name', 'strand', 'frame')
+
+# Row indexes of the gene model, made by build_hierarchy.
+# gene_rows, gene_ids        - the row and gene_id of each 'gene' line
+# transcript_rows, transcript_ids, transcript_gene
+#                            - the row, transcript_id and gene (index into gene_rows) of each 'transcript' line
+# row_transcript             - the transcript of every row (-1 for gene lines, and features outside any transcript)
+Hierarchy = namedtuple('Hierarchy', ['gene_rows', 'gene_ids', 'transcript_rows', 'transcript_ids', 'transcript_gene', 'row_transcript'])
+
+def build_hierarchy(table):
+    """
+    The Hierarchy of a GFFTable whose rows are arranged as iter_genes expects them: a gene line,
+    then each of its transcript lines followed by that transcript's features. Other GFFs get a
+    Hierarchy too, with '' for missing IDs, and -1 for the gene of a transcript that comes before
+    any gene or whose gene_id isn't that gene's.
+    >>> from .GFFTable import GFFTable
+    >>> table = GFFTable()
+    >>> for name, attr in [('gene', 'gene_id "g";'), ('transcript', 'gene_id "g"; transcript_id "t1";'), ('exon', ''),
+    ...                    ('transcript', 'gene_id "g"; transcript_id "t2";'), ('exon', ''), ('exon', '')]:
+    ...     table.append_line('\\t'.join(['I', 'WB', name, '1', '10', '.', '+', '.', attr or 'gene_id "g";']))
+    >>> h = build_hierarchy(table)
+    >>> h.transcript_ids.tolist(), h.transcript_gene.tolist(), h.row_transcript.tolist()
+    (['t1', 't2'], [0, 0], [-1, 0, 0, 1, 1, 1])
+    """
+    names = np.asarray(table.name.codes)
+    is_gene = names == table.name.code('gene')
+    is_transcript = names == table.name.code('transcript')
+    row_gene = np.cumsum(is_gene) - 1
+    row_transcript = np.cumsum(is_transcript) - 1
+
+    gene_rows = np.flatnonzero(is_gene)
+    transcript_rows = np.flatnonzero(is_transcript)
+    transcript_gene = row_gene[transcript_rows]
+
+    gene_ids = np.array([_scalar_attr(table, i, 'gene_id') for i in gene_rows.tolist()], dtype=str)
+    transcript_ids = np.array([_scalar_attr(table, i, 'transcript_id') for i in transcript_rows.tolist()], dtype=str)
+    transcript_gene_ids = np.array([_scalar_attr(table, i, 'gene_id') for i in transcript_rows.tolist()], dtype=str)
+    placed = transcript_gene >= 0
+    placed[placed] = gene_ids[transcript_gene[placed]] == transcript_gene_ids[placed]
+    transcript_gene = np.where(placed, transcript_gene, -1)
+
+    # a row only belongs to the last transcript if that transcript is of the row's gene
+    valid = row_transcript >= 0
+    valid[valid] &= (transcript_gene[row_transcript[valid]] == row_gene[valid]) & (row_gene[valid] >= 0)
+    valid &= ~is_gene
+    row_transcript = np.where(valid, row_transcript, -1)
+    # row numbers fit in 32 bits, halving the size of these in the cache
+    gene_rows, transcript_rows, transcript_gene, row_transcript = (a.astype(np.int32) for a in
+        (gene_rows, transcript_rows, transcript_gene, row_transcript))
+    return Hierarchy(gene_rows, gene_ids, transcript_rows, transcript_ids, transcript_gene, row_transcript)
+
+def _scalar_attr(table, row, key):
+    values = GFFParser.scanAttr(table.attr_str(row), key)
+    return values[0] if values else ''
+
+def cache_path(filename, cache_dir=None):
+    """
+    Where the cache of filename is kept in cache_dir: its base name plus a hash of its full path,
+    so GTFs with the same name in different directories don't share a cache.
+    """
+    path = os.path.abspath(filename)
+    tag = hashlib.blake2b(path.encode(), digest_size=6).hexdigest()
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, "%s.%s%s" % (os.path.basename(path), tag, SUFFIX))
+
+def file_hash(filename):
+    """Hex digest of the content of filename, read in large blocks"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as fh:
+        while True:
+            block = fh.read(1 << 22)
+            if not block: break
+            digest.update(block)
+    return digest.hexdigest()
+
+def _source_stat(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _table_arrays(table):
+    arrays = {}
+    for column in CATEGORY_COLUMNS:
+        arrays[column] = np.asarray(getattr(table, column).codes)
+    for column in ('start', 'end', 'score', 'attr_offsets'):
+        arrays[column] = np.asarray(getattr(table, column))
+    arrays['attr_buffer'] = np.frombuffer(table.attr_buffer, dtype=np.uint8)
+    for field, values in zip(Hierarchy._fields, table.hierarchy()):
+        arrays['hierarchy.' + field] = values
+    for name, values in table.gene_index().arrays().items():
+        arrays['index.' + name] = values
+    return arrays
+
+def write_cache(path, table, source):
+    """
+    Write table, its hierarchy and its gene index to the cache file path, recording source, the dict
+    of size, mtime_ns and hash of the GTF. The file is written under a temporary name and renamed
+    into place, so a reader never sees half of one.
+    """
+    arrays = _table_arrays(table)
+    index = table.gene_index()
+    levels = dict((column, getattr(table, column).levels) for column in CATEGORY_COLUMNS)
+    levels['index.biotype'] = index.biotype.levels
+    levels['index.source'] = index.source.levels
+    header = {'version': VERSION, 'source': source, 'length': len(table), 'levels': levels, 'arrays': {}}
+    # array offsets are relative to the end of the header, which is padded to ALIGNMENT
+    offset = 0
+    for name, values in arrays.items():
+        header['arrays'][name] = [values.dtype.str, values.shape[0], offset]
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(MAGIC)
+            fh.write(len(header_bytes).to_bytes(8, 'little'))
+            fh.write(header_bytes)
+            fh.write(b'\0' * (data_start - fh.tell()))
+            for name, values in arrays.items():
+                fh.write(values.tobytes())
+                fh.write(b'\0' * (-values.nbytes % ALIGNMENT))
+        os.replace(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+
+def read_header(path):
+    """The JSON header of a cache file, or None if path isn't a cache of this version"""
+    try:
+        with open(path, 'rb') as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                return None
+            header = json.loads(fh.read(int.from_bytes(fh.read(8), 'little')))
+    except (OSError, ValueError):
+        return None
+    return header if header.get('version') == VERSION else None
+
+def read_cache(path):
+    """
+    Map the cache file path into memory, returning its GFFTable (with its hierarchy and gene index)
+    and header. The table's columns are read-only views of the file.
+    """
+    from .GFFTable import GFFTable, Categories
+    from .GeneIndex import GeneIndex
+    header = read_header(path)
+    if header is None:
+        raise Exception("%s is not a wormtools GFF cache (version %d)" % (path, VERSION))
+    with open(path, 'rb') as fh:
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    header_length = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], 'little')
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for name, (dtype, length, offset) in header['arrays'].items():
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=length, offset=data_start + offset)
+
+    table = GFFTable()
+    for column in CATEGORY_COLUMNS:
+        setattr(table, column, Categories.from_codes(arrays[column], header['levels'][column]))
+    for column in ('start', 'end', 'score', 'attr_offsets'):
+        setattr(table, column, arrays[column])
+    table.attr_buffer = memoryview(arrays['attr_buffer'])
+    table._hierarchy = Hierarchy(*(arrays['hierarchy.' + field] for field in Hierarchy._fields))
+    index_arrays = dict((name[len('index.'):], values) for name, values in arrays.items() if name.startswith('index.'))
+    levels = header['levels']
+    table._gene_index = GeneIndex.from_arrays(index_arrays, levels['index.biotype'], levels['index.source'])
+    return table, header
+
+def _parse(filename):
+    # the table of a GTF, read as in GFFTable.read_table but without caching
+    from .GFFTable import _parse_table
+    return _parse_table(filename, [])
+
+def load(filename, cache_dir=None):
+    """
+    The GFFTable of the GTF filename, with its hierarchy and gene index, from its cache when that is up to date,
+    otherwise parsed and cached for next time. If the cache can't be written (a read-only
+    directory, say), the parsed table is returned anyway, with a warning.
+    """
+    path = cache_path(filename, cache_dir)
+    stat = _source_stat(filename)
+    header = read_header(path)
+    if header is not None:
+        source = header['source']
+        if source['size'] == stat['size']:
+            if source['mtime_ns'] == stat['mtime_ns']:
+                return read_cache(path)[0]
+            if source['hash'] == file_hash(filename):
+                # same content with a new mtime: keep the arrays, record the mtime
+                table = read_cache(path)[0]
+                _try_write(path, table, dict(source, mtime_ns=stat['mtime_ns']))
+                return table
+
+    table = _parse(filename)
+    stat['hash'] = file_hash(filename)
+    _try_write(path, table, stat)
+    return table
+
+def _try_write(path, table, source):
+    try:
+        write_cache(path, table, source)
+    except OSError as e:
+        print("couldn't write the GFF cache %s: %s" % (path, e), file=sys.stderr)
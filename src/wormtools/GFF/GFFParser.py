@@ -1,4 +1,5 @@
-import sys
+import sys,re
+from .. import io
 """
 Static methods for parsing a line in GFF format.
 ============================================================================
@@ -22,36 +23,160 @@ attribute - A semicolon-separated list of tag-value pairs, providing additional
 # static data for tests
 test_line_0 = 'IV	WormBase	gene	695	14926	.	+	.	gene_id "WBGene00021406"; gene_source "WormBase"; gene_biotype "protein_coding";\n'
 
+class GFFRecord:
+    """
+    A GFF feature held in __slots__ rather than a per-line dict, for keeping whole annotations in memory.
+    Supports the dict-style access used on parseLine's dicts: gff['start'], 'attr' in gff, gff['attr'] = ..., dict(gff).
+    >>> gff = parseLine(test_line_0, as_record=True)
+    >>> gff['start'], gff.end, 'attr' in gff, 'attr_str' in gff
+    (695, 14926, False, True)
+    >>> gff == parseLine(test_line_0)
+    True
+    """
+    __slots__ = ('seqname', 'source', 'name', 'start', 'end', 'score', 'strand', 'frame', 'attr_str', 'attr')
+
+    def __init__(self, seqname, source, name, start, end, score, strand, frame, attr_str=None, attr=None):
+        self.seqname = seqname
+        self.source = source
+        self.name = name
+        self.start = start
+        self.end = end
+        self.score = score
+        self.strand = strand
+        self.frame = frame
+        # like the dicts, a record has 'attr_str', or 'attr' once parsed
+        if attr_str is not None: self.attr_str = attr_str
+        if attr is not None: self.attr = attr
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other):
+        if not hasattr(other, 'keys'):
+            return NotImplemented
+        return dict(self) == dict(other)
+
+    def __repr__(self):
+        return "GFFRecord(%r)" % dict(self)
+
+# Attributes with only a handful of distinct values across a whole annotation. Their values are
+# interned, so that every record shares one string object for e.g. "protein_coding".
+# Keys are always interned. IDs are not, as nearly all of them are unique.
+INTERNED_ATTRS = set(['gene_source', 'gene_biotype', 'transcript_source', 'transcript_biotype', 'exon_number'])
+_interned_values = {}
+
+def internAttr(key, val):
+    """
+    Return the shared copy of key and, for a key in INTERNED_ATTRS, of val.
+    """
+    key = sys.intern(key)
+    if key in INTERNED_ATTRS:
+        val = _interned_values.setdefault(val, val)
+    return key, val
+
 # Return a dict keyed on attribute name. Values are always arrays.
-def parseAttr(attr_str):
+def parseAttr(attr_str, keys=None):
     """
     Parse an attribute field as read in GFF format. 
     This is relatively expensive, so be wary of calling by default.
-    >>> parseLine(test_line_0)
-    {'seqname': 'IV', 'end': 14926, 'name': 'gene', 'start': 695, 'frame': '.', 'source': 'WormBase', 'score': None, 'attr_str': 'gene_id "WBGene00021406"; gene_source "WormBase"; gene_biotype "protein_coding";', 'strand': '+'}
+    If keys are given, only those attributes are extracted (see scanAttr), which is much cheaper.
+    >>> parseAttr(parseLine(test_line_0)['attr_str'])
+    {'gene_id': ['WBGene00021406'], 'gene_source': ['WormBase'], 'gene_biotype': ['protein_coding']}
+    >>> parseAttr(parseLine(test_line_0)['attr_str'], keys=['gene_biotype', 'transcript_id'])
+    {'gene_biotype': ['protein_coding']}
     """
     d = {}
+    if keys is not None:
+        for key in keys:
+            vals = scanAttr(attr_str, key)
+            if vals: d[key] = vals
+        return d
+
     fields = [s.strip() for s in attr_str.split(';')]
     for i,f in enumerate(fields):
         if not f: continue # sometimes trailing semicolons can cause empty fields
         try:
-            key,val = [s.strip('"') for s in f.strip().split()]
+            # a quoted value can have spaces in it
+            key,val = [s.strip('"') for s in f.split(None, 1)]
         except:
-            print >>sys.stderr, "failed to parse field %d `%s' in fields [%s]" % (i,f,attr_str)
+            print("failed to parse field %d `%s' in fields [%s]" % (i,f,attr_str), file=sys.stderr)
             raise
+        key,val = internAttr(key,val)
         if key not in d: d[key] = []
         d[key].append(val)
     
     return d
 
+# one compiled pattern per attribute name asked for
+_attr_scanners = {}
+
+def scanAttr(attr_str, key):
+    """
+    Return the list of values of a single attribute, without tokenizing the rest of the field.
+    The list is empty if the attribute is not present.
+    >>> scanAttr(parseLine(test_line_0)['attr_str'], 'gene_id')
+    ['WBGene00021406']
+    >>> scanAttr('gene_id "x"; gene_id_alias "y";', 'gene_id_alias')
+    ['y']
+    >>> scanAttr('note "two words"; note bare;', 'note')
+    ['two words', 'bare']
+    >>> scanAttr('gene_id "A"; note "old transcript_id X1"; transcript_id "T1";', 'transcript_id')
+    ['T1']
+    """
+    scanner = _attr_scanners.get(key)
+    if scanner is None:
+        # starting the pattern with the literal key lets re skip ahead to candidates quickly;
+        # requiring whitespace after it means gene_id doesn't match gene_id_alias;
+        # a quoted value runs to the closing quote, spaces and all, a bare one to a space or ';'
+        scanner = _attr_scanners[key] = re.compile(re.escape(key) + r'\s+(?:"([^"]*)"|([^";\s]*))')
+
+    vals = []
+    m = scanner.search(attr_str)
+    while m:
+        i = m.start()
+        # the key has to start a field: at the start or after a ';', and outside any quoted value
+        if attr_str[:i].rstrip()[-1:] in ('', ';') and attr_str.count('"', 0, i) % 2 == 0:
+            quoted, bare = m.groups()
+            vals.append(bare if quoted is None else quoted)
+            m = scanner.search(attr_str, m.end())
+        else:
+            # a candidate inside a value may have run past the next field, so look again from just after it
+            m = scanner.search(attr_str, i + 1)
+    if key in INTERNED_ATTRS:
+        vals = [_interned_values.setdefault(val, val) for val in vals]
+    return vals
+
 # Parse a qualified GFF line into a dict, optionally returning parsed dict of attributes.
-def parseLine(gff_line, parse_attributes=False, exclude_features=[]):
+def parseLine(gff_line, parse_attributes=False, exclude_features=[], include_features=None, as_record=False):
     """
-    Create a GFF dict from a line of GFF format.
+    Create a GFF dict from a line of GFF format, or a GFFRecord with the same keys if as_record is True.
     By default, {'attr_str': '...'} is returned instead of parsed {'attr':{...}} for performance reasons. 
-    GFF.get_attr will call GFFParser.parseAttr if needed.
+    GFF.get_attr scans single attributes out of 'attr_str' with GFFParser.scanAttr.
+    False is returned for a feature in exclude_features, or not in include_features when that is given.
     >>> parseLine(test_line_0)
-    {'seqname': 'IV', 'end': 14926, 'name': 'gene', 'start': 695, 'frame': '.', 'source': 'WormBase', 'score': None, 'attr_str': 'gene_id "WBGene00021406"; gene_source "WormBase"; gene_biotype "protein_coding";', 'strand': '+'}
+    {'seqname': 'IV', 'source': 'WormBase', 'name': 'gene', 'start': 695, 'end': 14926, 'score': None, 'strand': '+', 'frame': '.', 'attr_str': 'gene_id "WBGene00021406"; gene_source "WormBase"; gene_biotype "protein_coding";'}
     """
     gff = {}
     fields = gff_line.strip().split("\t")
@@ -61,10 +186,12 @@ def parseLine(gff_line, parse_attributes=False, exclude_features=[]):
         gff['source']  = fields[1] # name of the program the generated this record
         gff['name']    = fields[2] # feature type name, e.g. Gene, Variation, Similarity
     except IndexError:
-        print >>sys.stderr, "not enough fields(%d) in line `%s'" % (len(fields),gff_line)
+        print("not enough fields(%d) in line `%s'" % (len(fields),gff_line), file=sys.stderr)
         raise
     if exclude_features and gff['name'] in exclude_features:
         return False
+    if include_features is not None and gff['name'] not in include_features:
+        return False
     # position in sequence
     gff['start']  = int(fields[3]) # Start position of the feature, with sequence numbering starting at 1.
     gff['end']    = int(fields[4]) # End position of the feature, with sequence numbering starting at 1.
@@ -75,12 +202,18 @@ def parseLine(gff_line, parse_attributes=False, exclude_features=[]):
     gff['frame']  = fields[7] # One of '0', '1' or '2'. '0' indicates that the first base of the feature is the first base of a codon, '1' that the second base is the first base of a codon, and so on..
     # attribute - A semicolon-separated list of tag-value pairs, providing additional information about each feature.
     if parse_attributes: # TODO: As this is the most expensive routine, make this false by default, and have the @staticmethod parse when necessary
-        gff['attr'] = GFFParser.parseAttr(fields[8])
+        gff['attr'] = parseAttr(fields[8])
     else:
         gff['attr_str'] = fields[8]
 
+    if as_record:
+        return GFFRecord(**gff)
     return gff
 
+# Open a GFF file for reading lines of text, decompressing it if it is gzip or bgzip compressed (see wormtools.io).
+def openGFF(filename):
+    return io.open_text(filename)
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
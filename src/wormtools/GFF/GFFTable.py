@@ -0,0 +1,294 @@
+"""
+Columnar, array-backed storage for a whole GFF/GTF file.
+============================================================================
+GFFParser.parseLine makes a dict per line, which is convenient for streaming but very
+heavy when a whole annotation has to be held in memory. A GFFTable keeps one column per
+GFF field instead:
+
+start, end  - array('I') of 1-based, inclusive coordinates
+score       - array('d'), NaN where the score was '.'
+seqname, source, name (feature), strand, frame
+            - Categories: an array of integer codes plus the list of distinct values
+attribute   - one bytearray holding every raw attribute string, sliced by attr_offsets
+
+Rows can still be pulled out as the same dict that parseLine returns, so everything that
+consumes GFF dicts (Gene, Transcript, GFF_as_BED6, get_attr) works on table rows.
+
+read_table keeps a binary cache of each table it parses (see GFFCache), so a GTF is only parsed
+once per change. A table loaded from the cache has read-only NumPy columns mapped from the file.
+"""
+import sys
+from array import array
+from itertools import accumulate
+import numpy as np
+from . import GFFParser, GFFCache
+from .. import stats
+
+class Categories:
+    """
+    An interned categorical column: integer codes indexing a list of distinct levels.
+    >>> c = Categories()
+    >>> for v in ['exon', 'CDS', 'exon']: c.append(v)
+    >>> list(c.codes), c.levels, c[2]
+    ([0, 1, 0], ['exon', 'CDS'], 'exon')
+    """
+    def __init__(self, typecode='H'):
+        self.codes = array(typecode)
+        self.levels = []
+        self._lookup = {}
+
+    @classmethod
+    def from_codes(cls, codes, levels):
+        """A column of existing codes (any integer sequence, such as a NumPy array) and their levels"""
+        column = cls()
+        column.codes = codes
+        column.levels = list(levels)
+        column._lookup = dict((level, i) for i, level in enumerate(column.levels))
+        return column
+
+    def code(self, value):
+        """Integer code for value, or None if value never occurs in the column"""
+        return self._lookup.get(value)
+
+    def append(self, value):
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.levels)
+            self.levels.append(value)
+        self.codes.append(code)
+
+    def extend(self, values):
+        """Append each of values, with new levels in the order append would have added them"""
+        lookup = self._lookup
+        for value in dict.fromkeys(values):
+            if value not in lookup:
+                lookup[value] = len(self.levels)
+                self.levels.append(value)
+        self.codes.extend(map(lookup.__getitem__, values))
+
+    def __getitem__(self, i):
+        return self.levels[self.codes[i]]
+
+    def __len__(self):
+        return len(self.codes)
+
+class GFFTable:
+    """
+    A whole GFF file stored by column. Use read_table() to load one from disk.
+    >>> table = GFFTable()
+    >>> table.append_line(GFFParser.test_line_0)
+    >>> len(table), table.start[0], table.name[0]
+    (1, 695, 'gene')
+    >>> table[0] == GFFParser.parseLine(GFFParser.test_line_0)
+    True
+    """
+    def __init__(self):
+        self.seqname = Categories('I') # assemblies can have many thousands of scaffolds
+        self.source = Categories()
+        self.name = Categories()
+        self.start = array('I')
+        self.end = array('I')
+        self.score = array('d')
+        self.strand = Categories('B')
+        self.frame = Categories('B')
+        self.attr_buffer = bytearray()
+        self.attr_offsets = array('Q', [0])
+        self._hierarchy = None
+        self._gene_index = None
+
+    def append_line(self, gff_line, exclude_features=[]):
+        """
+        Add a line of GFF format as a new row. Returns False if the feature was excluded, like GFFParser.parseLine.
+        """
+        fields = gff_line.strip().split("\t")
+        if len(fields) < 9:
+            raise Exception("not enough fields(%d) in line `%s'" % (len(fields),gff_line))
+        if exclude_features and fields[2] in exclude_features:
+            return False
+
+        # convert everything before appending anything, so a bad line can't leave ragged columns
+        start = int(fields[3])
+        end = int(fields[4])
+        score = float('nan') if fields[5] == '.' else float(fields[5])
+        attr = fields[8].encode()
+
+        self.seqname.append(fields[0])
+        self.source.append(fields[1])
+        self.name.append(fields[2])
+        self.start.append(start)
+        self.end.append(end)
+        self.score.append(score)
+        self.strand.append(fields[6])
+        self.frame.append(fields[7])
+        self.attr_buffer += attr
+        self.attr_offsets.append(len(self.attr_buffer))
+        self._hierarchy = None
+        self._gene_index = None
+
+    def extend_lines(self, gff_lines, exclude_features=[]):
+        """
+        Add many lines of GFF format as rows, as append_line does for each, but column by column,
+        which is several times faster. If any line is bad, nothing is added.
+        >>> table = GFFTable()
+        >>> table.extend_lines([GFFParser.test_line_0, GFFParser.test_line_0.replace('gene', 'exon', 1)], ['exon'])
+        >>> len(table), table[0] == GFFParser.parseLine(GFFParser.test_line_0)
+        (1, True)
+        """
+        lines = [line.strip() for line in gff_lines]
+        if all(line.count("\t") == 8 for line in lines):
+            # every line has nine fields, so they can all be split at once
+            fields = "\t".join(lines).split("\t")
+            columns = [fields[i::9] for i in range(9)]
+        else:
+            rows = [line.split("\t") for line in lines]
+            for row, line in zip(rows, gff_lines):
+                if len(row) < 9:
+                    raise Exception("not enough fields(%d) in line `%s'" % (len(row),line))
+            columns = [[row[i] for row in rows] for i in range(9)]
+        if exclude_features:
+            keep = [name not in exclude_features for name in columns[2]]
+            columns = [[value for value, kept in zip(column, keep) if kept] for column in columns]
+        if not columns[0]:
+            return
+        seqnames, sources, names, starts, ends, scores, strands, frames, attrs = columns
+
+        starts = array('I', map(int, starts))
+        ends = array('I', map(int, ends))
+        scores = array('d', [float('nan') if score == '.' else float(score) for score in scores])
+        attrs = [attr.encode() for attr in attrs]
+        offsets = array('Q', accumulate(map(len, attrs), initial=self.attr_offsets[-1]))
+
+        self.seqname.extend(seqnames)
+        self.source.extend(sources)
+        self.name.extend(names)
+        self.start.extend(starts)
+        self.end.extend(ends)
+        self.score.extend(scores)
+        self.strand.extend(strands)
+        self.frame.extend(frames)
+        self.attr_buffer += b''.join(attrs)
+        self.attr_offsets.extend(offsets[1:])
+        self._hierarchy = None
+        self._gene_index = None
+
+    def attr_str(self, i):
+        """The raw attribute string of row i"""
+        return str(self.attr_buffer[self.attr_offsets[i]:self.attr_offsets[i+1]], 'utf-8')
+
+    def hierarchy(self):
+        """The GFFCache.Hierarchy of the gene model, built on first use unless it came from the cache"""
+        if self._hierarchy is None:
+            self._hierarchy = GFFCache.build_hierarchy(self)
+        return self._hierarchy
+
+    def gene_index(self):
+        """The GeneIndex of the genes, built on first use unless it came from the cache"""
+        if self._gene_index is None:
+            from .GeneIndex import GeneIndex
+            self._gene_index = GeneIndex.from_table(self)
+        return self._gene_index
+
+    def row(self, i, parse_attributes=False):
+        """
+        Row i as a GFF dict, exactly as GFFParser.parseLine would have returned it.
+        """
+        if i < 0: i += len(self)
+        score = self.score[i]
+        gff = {}
+        gff['seqname'] = self.seqname[i]
+        gff['source'] = self.source[i]
+        gff['name'] = self.name[i]
+        gff['start'] = int(self.start[i])
+        gff['end'] = int(self.end[i])
+        gff['score'] = None if score != score else float(score) # NaN marks '.'
+        gff['strand'] = self.strand[i]
+        gff['frame'] = self.frame[i]
+        if parse_attributes:
+            gff['attr'] = GFFParser.parseAttr(self.attr_str(i))
+        else:
+            gff['attr_str'] = self.attr_str(i)
+
+        return gff
+
+    def rows(self, features=None, parse_attributes=False):
+        """
+        Generate the GFF dict of every row, optionally only those whose feature name is in features.
+        Filtering is done on the integer codes, so excluded rows are never converted.
+        """
+        if features is None:
+            indexes = range(len(self))
+        else:
+            wanted = set(self.name.code(f) for f in features)
+            indexes = [i for i,code in enumerate(self.name.codes) if code in wanted]
+        return self.rows_at(indexes, parse_attributes)
+
+    def rows_at(self, indexes, parse_attributes=False):
+        """
+        Generate the GFF dicts of the rows in indexes, in that order. Columns are converted to
+        Python values a block of rows at a time, which is much faster than row() for many rows.
+        """
+        categories = [getattr(self, key) for key in ('seqname', 'source', 'name', 'strand', 'frame')]
+        attr_key = 'attr' if parse_attributes else 'attr_str'
+        buffer = self.attr_buffer
+        for block in range(0, len(indexes), ROWS_BLOCK):
+            rows = np.asarray(indexes[block:block + ROWS_BLOCK], dtype=np.intp)
+            seqnames, sources, names, strands, frames = ([column.levels[code] for code in _take(column.codes, rows)]
+                                                         for column in categories)
+            starts, ends, scores = (_take(getattr(self, key), rows) for key in ('start', 'end', 'score'))
+            attr_starts = _take(self.attr_offsets, rows)
+            attr_ends = _take(self.attr_offsets, rows + 1)
+            attrs = [str(buffer[a:b], 'utf-8') for a, b in zip(attr_starts, attr_ends)]
+            if parse_attributes:
+                attrs = [GFFParser.parseAttr(attr) for attr in attrs]
+            for seqname, source, name, start, end, score, strand, frame, attr in zip(
+                    seqnames, sources, names, starts, ends, scores, strands, frames, attrs):
+                yield {'seqname': seqname, 'source': source, 'name': name, 'start': start, 'end': end,
+                       'score': None if score != score else score, 'strand': strand, 'frame': frame, attr_key: attr}
+
+    def __getitem__(self, i):
+        return self.row(i)
+
+    def __iter__(self):
+        return self.rows()
+
+    def __len__(self):
+        return len(self.start)
+
+# rows converted at a time by GFFTable.rows_at
+ROWS_BLOCK = 1 << 14
+
+def _take(column, rows):
+    # the Python values of column (an array.array or NumPy array) at the NumPy array rows
+    return np.asarray(column)[rows].tolist()
+
+def read_table(filename, exclude_features=[], cache=True, cache_dir=None):
+    """
+    Load a whole GFF/GTF file, plain, gzipped or bgzipped, into a GFFTable. Comment lines ('#') and blank lines are skipped.
+    Unless cache is False, the table comes from (or goes to) the GFFCache in cache_dir.
+    Tables with exclude_features are always parsed, as the cache holds every row.
+    """
+    with stats.timer('gff.read_table'):
+        if cache and not exclude_features:
+            table = GFFCache.load(filename, cache_dir)
+        else:
+            table = _parse_table(filename, exclude_features)
+    stats.count('gff.read_table', rows=len(table))
+    return table
+
+def _parse_table(filename, exclude_features):
+    # while recording, parsing is timed apart from loading and writing the cache
+    table = GFFTable()
+    with stats.timer('gff.parse_table'), GFFParser.openGFF(filename) as fh:
+        for i,line in enumerate(fh):
+            if line.startswith('#') or not line.strip(): continue
+            try:
+                table.append_line(line, exclude_features)
+            except:
+                print("failed on line %d:%s" % (i,line), file=sys.stderr)
+                raise
+    stats.count('gff.parse_table', rows=len(table))
+    return table
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,23 +1,33 @@
 """
 Accumulates GFF.Transcript objects and a GFF dict whose feature is 'gene', supporting direct access for seqname, start, end, gene_id, strand, and others.
 """
+from . import gene_id as get_gene_id
+
 class Gene:
-    def __init__(self,genegff):
+    __slots__ = ('_gff', '_seqname', '_start', '_end', '_gene_id', '_strand', '_transcripts')
+
+    def __init__(self,genegff,gene_id=None):
         """
-        Initialize on a GFF dict from GFF.GFFParseline whose name == 'gene'
+        Initialize on a GFF dict from GFF.GFFParseline whose name == 'gene'.
+        gene_id, if already known (as from a GFFCache), saves scanning the attributes for it.
         """
         if genegff['name'] != 'gene':
             raise Exception("constructor requires gff with name == 'gene'.")
 
         # things I care about at the moment
+        self._gff = genegff
         self._seqname = genegff['seqname']
         self._start = genegff['start']
         self._end = genegff['end']
-        self._gene_id = gene_id(genegff)
+        self._gene_id = gene_id if gene_id is not None else get_gene_id(genegff)
         self._strand =  genegff['strand']
         self._transcripts = [] 
 
     @property
+    def gff(self):
+        """The GFF dict (or GFFRecord) of the 'gene' line, for its other attributes"""
+        return self._gff
+    @property
     def transcripts(self):
         """List of transcripts vetted by add_transcript() """
         return self._transcripts
@@ -56,12 +66,13 @@ class Gene:
     def get_promoters(self, bp_offset):
         """
         Determine the 5' exon for each transcript and extend its start or end by bp_offset, 
-        for '+' and '-' strand transcripts respectively.
+        for '+' and '-' strand transcripts respectively. Starts stop at 1, the start of the chromosome.
+        See wormtools.promoters for every transcript of a genome at once.
         """
         for transcript in self.transcripts:
             exon = transcript.get_5prime_exon()
             if self.strand == '+':
-                yield exon['seqname'], exon['start'] - bp_offset, exon['start'], "+promoter", self.gene_id + "|" + transcript.transcript_id
+                yield exon['seqname'], max(1, exon['start'] - bp_offset), exon['start'], "+promoter", self.gene_id + "|" + transcript.transcript_id
             else:
                 yield exon['seqname'], exon['end'], exon['end'] + bp_offset, "-promoter", self.gene_id + "|" + transcript.transcript_id
             
@@ -0,0 +1,207 @@
+"""
+Lookups of genes by gene_id, gene_name or transcript_id, and lists of genes by biotype or source.
+
+Genes are numbered in the order they are added. IDs and names are held as NumPy string arrays,
+with dicts for single lookups and a sorted copy of each for batch lookups: a whole list of IDs
+(say, the rows of an expression table) is found with one searchsorted. Biotypes and sources
+are categorical columns, whose posting lists are the gene numbers of each level.
+
+An index is built as genes are assembled (GeneIndex.track), or from a GFFTable's hierarchy,
+and goes into the GFFCache with the table, so a cached GTF loads with its index.
+"""
+import numpy as np
+from . import GFFParser
+from .GFFTable import Categories
+
+KEYS = ('gene_id', 'gene_name', 'transcript_id')
+
+class GeneIndex:
+    """
+    Gene numbers by ID, name and transcript, and by biotype and source.
+    self.genes holds the GFF.Gene objects when the index was built from them.
+    >>> from . import iter_genes
+    >>> gtf = ['I WB gene 1 90 . + . gene_id "g1"; gene_name "abc-1"; gene_biotype "protein_coding";',
+    ...        'I WB transcript 1 90 . + . gene_id "g1"; transcript_id "t1";',
+    ...        'I WB gene 200 300 . - . gene_id "g2"; gene_name "mir-2"; gene_biotype "miRNA";',
+    ...        'I WB transcript 200 300 . - . gene_id "g2"; transcript_id "t2";']
+    >>> index = GeneIndex()
+    >>> genes = list(index.track(iter_genes(line.replace(' ', '\\t', 8) for line in gtf)))
+    >>> index.find('mir-2', 'gene_name'), index.find('t1', 'transcript_id'), index.genes[1].gene_id
+    (1, 0, 'g2')
+    >>> index.find_all(['g2', 'nope', 'g1']).tolist(), index.with_biotype('miRNA').tolist()
+    ([1, -1, 0], [1])
+    """
+    def __init__(self):
+        self.genes = []
+        self._ids = {'gene_id': [], 'gene_name': [], 'transcript_id': []}
+        self._transcript_gene = []
+        self.biotype = Categories()
+        self.source = Categories()
+        self._arrays = None
+        self._dicts = {}
+        self._sorted = {}
+        self._postings = {}
+
+    def add(self, gene):
+        """Add a GFF.Gene, returning its number"""
+        self.genes.append(gene)
+        return self._add(gene.gene_id, _attr(gene.gff, 'gene_name'), _attr(gene.gff, 'gene_biotype'), gene.gff['source'],
+                         [transcript.transcript_id for transcript in gene.transcripts])
+
+    def _add(self, gene_id, gene_name, biotype, source, transcript_ids):
+        i = len(self._ids['gene_id'])
+        self._ids['gene_id'].append(gene_id)
+        self._ids['gene_name'].append(gene_name)
+        self.biotype.append(biotype)
+        self.source.append(source)
+        self._ids['transcript_id'].extend(transcript_ids)
+        self._transcript_gene.extend([i] * len(transcript_ids))
+        self._arrays = None
+        self._dicts = {}
+        self._sorted = {}
+        self._postings = {}
+        return i
+
+    def track(self, genes):
+        """Add each of genes (such as from iter_genes) as it passes through, generating it on"""
+        for gene in genes:
+            self.add(gene)
+            yield gene
+
+    @classmethod
+    def from_genes(cls, genes):
+        index = cls()
+        for gene in genes:
+            index.add(gene)
+        return index
+
+    @classmethod
+    def from_table(cls, table):
+        """The index of the genes of a GFFTable, through its hierarchy. self.genes is left empty."""
+        hierarchy = table.hierarchy()
+        index = cls()
+        transcript_ids = hierarchy.transcript_ids.tolist()
+        by_gene = [[] for i in range(len(hierarchy.gene_rows))]
+        for transcript_id, gene in zip(transcript_ids, hierarchy.transcript_gene.tolist()):
+            if gene >= 0: by_gene[gene].append(transcript_id)
+        for row, gene_id, transcripts in zip(hierarchy.gene_rows.tolist(), hierarchy.gene_ids.tolist(), by_gene):
+            attr_str = table.attr_str(row)
+            index._add(gene_id, _scan(attr_str, 'gene_name'), _scan(attr_str, 'gene_biotype'), table.source[row], transcripts)
+        return index
+
+    def arrays(self):
+        """
+        The index as a dict of NumPy arrays (for GFFCache), with the biotype and source levels
+        in biotype.levels and source.levels. from_arrays turns them back into an index.
+        """
+        if self._arrays is None:
+            arrays = {}
+            for key in KEYS:
+                values = np.array(self._ids[key], dtype=str)
+                arrays[key] = values
+                arrays[key + '.order'] = np.argsort(values, kind='stable').astype(np.int32)
+            arrays['transcript_gene'] = np.array(self._transcript_gene, dtype=np.int32)
+            arrays['biotype'] = np.asarray(self.biotype.codes, dtype=np.uint16)
+            arrays['source'] = np.asarray(self.source.codes, dtype=np.uint16)
+            self._arrays = arrays
+        return self._arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, biotypes, sources):
+        """
+        An index of the arrays of GeneIndex.arrays and the levels of its biotype and source columns.
+        Nothing can be added to it.
+        """
+        index = cls()
+        index._arrays = dict(arrays)
+        index._ids = None # only in the arrays now
+        index.biotype = Categories.from_codes(arrays['biotype'], biotypes)
+        index.source = Categories.from_codes(arrays['source'], sources)
+        return index
+
+    def __len__(self):
+        return len(self.arrays()['gene_id'])
+
+    def gene_id(self, i):
+        return str(self.arrays()['gene_id'][i])
+
+    def gene_name(self, i):
+        return str(self.arrays()['gene_name'][i])
+
+    def transcript_ids(self, i):
+        """The transcript_ids of gene i"""
+        arrays = self.arrays()
+        return arrays['transcript_id'][arrays['transcript_gene'] == i].tolist()
+
+    def find(self, value, key='gene_id'):
+        """The number of the gene with this gene_id, gene_name or transcript_id (key). Raises KeyError if there is none."""
+        lookup = self._dicts.get(key)
+        if lookup is None:
+            arrays = self.arrays()
+            values = arrays[_check_key(key)].tolist()
+            genes = arrays['transcript_gene'].tolist() if key == 'transcript_id' else range(len(values))
+            # reversed, so the first of genes sharing a name is the one kept
+            lookup = dict(zip(reversed(values), reversed(genes)))
+            lookup.pop('', None) # a missing name isn't a name
+            self._dicts[key] = lookup
+        return lookup[value]
+
+    def find_all(self, values, key='gene_id'):
+        """
+        The gene number of each of values, looked up by key as in find, as a NumPy array with -1
+        where there is no such gene. Vectorized, for thousands of IDs at once.
+        """
+        arrays = self.arrays()
+        ids = arrays[_check_key(key)]
+        order = arrays[key + '.order']
+        values = np.asarray(values, dtype=str)
+        if not len(ids):
+            return np.full(len(values), -1, dtype=np.int64)
+        sorted_ids = self._sorted.get(key)
+        if sorted_ids is None:
+            sorted_ids = self._sorted[key] = ids[order]
+        # the first position of each value, which is the first gene with it as order is stable
+        positions = np.minimum(np.searchsorted(sorted_ids, values, 'left'), len(ids) - 1)
+        found = (sorted_ids[positions] == values) & (values != '')
+        genes = order[positions].astype(np.int64)
+        if key == 'transcript_id':
+            genes = arrays['transcript_gene'][genes].astype(np.int64)
+        return np.where(found, genes, -1)
+
+    def with_biotype(self, biotype):
+        """Numbers of the genes of a gene_biotype, in order"""
+        return self._posting('biotype', biotype)
+
+    def with_source(self, source):
+        """Numbers of the genes from a source (the GTF's second column), in order"""
+        return self._posting('source', source)
+
+    def _posting(self, name, level):
+        column = getattr(self, name)
+        postings = self._postings.get(name)
+        if postings is None:
+            # one stable argsort of the codes holds every posting list, in gene order
+            codes = np.asarray(column.codes)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(column.levels) + 1))
+            postings = self._postings[name] = (order, bounds)
+        order, bounds = postings
+        code = column.code(level)
+        if code is None:
+            return np.zeros(0, dtype=order.dtype)
+        return order[bounds[code]:bounds[code + 1]]
+
+def _check_key(key):
+    if key not in KEYS:
+        raise Exception("key must be one of %s, not %s" % (", ".join(KEYS), key))
+    return key
+
+def _scan(attr_str, key):
+    values = GFFParser.scanAttr(attr_str, key)
+    return values[0] if values else ''
+
+def _attr(gff, key):
+    # a scalar attribute of a gff dict or record, '' if it has none
+    if 'attr' in gff:
+        return gff['attr'].get(key, [''])[0]
+    return _scan(gff['attr_str'], key)
@@ -0,0 +1,112 @@
+"""
+Assemble GFF.Gene objects from a GTF in a single streaming pass.
+
+The file is expected to be arranged by gene|transcript1[,transcript2,...], as the WormBase
+and Ensembl GTFs are: a 'gene' line, then each of its 'transcript' lines followed by that
+transcript's exons, CDS, codons and UTRs. Only one gene is held in memory at a time.
+
+With cache=True, a GTF named by its file is read through read_table's cache instead, so after the
+first time its genes are assembled from the cached columns rather than parsed from text. That loads
+the whole table into memory, so it is not the default.
+"""
+import sys
+import numpy as np
+from . import GFFParser
+from .GFFTable import read_table
+from .Gene import Gene
+from .Transcript import Transcript
+from .. import stats
+
+# features that define the gene model and can never be filtered out
+STRUCTURAL_FEATURES = ('gene', 'transcript')
+
+def iter_genes(infile, features=None, exclude_features=[], as_record=False, cache=False, cache_dir=None):
+    """
+    Generate a fully assembled GFF.Gene for each gene in infile, a file name (plain, gzip or bgzip) or an iterable of lines.
+    features, if given, is the set of feature names to keep; features in exclude_features are dropped.
+    Both filters are applied before any attribute parsing. 'gene' and 'transcript' lines are always used.
+    With as_record, features are held as compact GFFParser.GFFRecord objects instead of dicts.
+    A file is streamed a line at a time, or with cache, loaded through the GFFCache in cache_dir.
+    """
+    # while recording (see wormtools.stats), assembling genes is timed apart from reading and parsing lines
+    yield from stats.timed('gff.iter_genes', _iter_genes(infile, features, exclude_features, as_record, cache, cache_dir), 'genes')
+
+def _iter_genes(infile, features, exclude_features, as_record, cache, cache_dir):
+    if features is not None:
+        features = set(features).union(STRUCTURAL_FEATURES)
+    exclude_features = [f for f in exclude_features if f not in STRUCTURAL_FEATURES]
+
+    if isinstance(infile, str) and cache:
+        yield from _assemble(_table_records(read_table(infile, cache_dir=cache_dir), features, exclude_features, as_record), 'row')
+    elif isinstance(infile, str):
+        with GFFParser.openGFF(infile) as fh:
+            yield from _assemble(_parse_records(fh, features, exclude_features, as_record), 'line')
+    else:
+        yield from _assemble(_parse_records(infile, features, exclude_features, as_record), 'line')
+
+def iter_table_genes(table, features=None, exclude_features=[], as_record=False):
+    """The GFF.Gene objects of the rows of a GFFTable, as iter_genes would make them from its file"""
+    if features is not None:
+        features = set(features).union(STRUCTURAL_FEATURES)
+    exclude_features = [f for f in exclude_features if f not in STRUCTURAL_FEATURES]
+    return _assemble(_table_records(table, features, exclude_features, as_record), 'row')
+
+def _parse_records(lines, features, exclude_features, as_record):
+    # (line number, gff, None) of the lines that pass the filters
+    for i,line in enumerate(lines):
+        if line.startswith('#') or not line.strip(): continue
+
+        # refer to line if parsing fails
+        try:
+            gff = GFFParser.parseLine(line, exclude_features=exclude_features, include_features=features, as_record=as_record)
+        except:
+            print("failed on line %d:%s" % (i,line), file=sys.stderr)
+            raise
+        if not gff: # False when feature is filtered out (this allows the bypassing of parseAttr, which is expensive)
+            continue
+        yield i, gff, None
+
+def _table_records(table, features, exclude_features, as_record):
+    # (row, gff, ids) of the table rows that pass the filters, chosen by their feature codes.
+    # ids are the gene_id of a gene, and (transcript_id, gene_id) of a transcript, from the table's hierarchy
+    names = table.name.levels
+    wanted = [code for code, name in enumerate(names)
+              if (features is None or name in features) and name not in exclude_features]
+    rows = np.flatnonzero(np.isin(np.asarray(table.name.codes), wanted))
+
+    # missing ids ('') and transcripts the hierarchy couldn't place (-1) are left to the attribute scans
+    hierarchy = table.hierarchy()
+    gene_ids = [gene_id or None for gene_id in hierarchy.gene_ids.tolist()]
+    ids = dict(zip(hierarchy.gene_rows.tolist(), gene_ids))
+    for row, transcript_id, gene in zip(hierarchy.transcript_rows.tolist(), hierarchy.transcript_ids.tolist(),
+                                        hierarchy.transcript_gene.tolist()):
+        if transcript_id and gene >= 0 and gene_ids[gene]:
+            ids[row] = (transcript_id, gene_ids[gene])
+
+    for i, gff in zip(rows.tolist(), table.rows_at(rows)):
+        yield i, GFFParser.GFFRecord(**gff) if as_record else gff, ids.get(i)
+
+def _assemble(records, where):
+    current_gene = None
+    current_transcript = None
+    for i,gff,ids in records:
+        if gff['name'] == 'gene':
+            if current_gene is not None:
+                yield current_gene
+            current_gene = Gene(gff, ids)
+            current_transcript = None
+
+        elif gff['name'] == 'transcript':
+            if current_gene is None:
+                raise Exception("transcript on %s %d appears before any gene" % (where, i))
+            current_transcript = Transcript(gff, *ids) if ids else Transcript(gff)
+            current_gene.add_transcript(current_transcript)
+
+        else: # add any other gff type (exon,CDS,etc) to current transcript
+            if current_transcript is None:
+                raise Exception("%s on %s %d appears before any transcript" % (gff['name'], where, i))
+            current_transcript.append(gff)
+
+    # the last gene has no following 'gene' line to flush it
+    if current_gene is not None:
+        yield current_gene
@@ -0,0 +1,206 @@
+"""
+Overlap, containment and nearest-TSS queries over assembled genes, transcripts or exons.
+
+Intervals are kept per seqname as NumPy arrays sorted by start, augmented with the running
+maximum of the ends. Everything that can overlap [start,end] then lies in one contiguous
+slice: it starts at the first interval whose running max end reaches start, and stops after
+the last interval that starts at or before end. Both bounds are a searchsorted away, so a
+whole batch of queries is answered with a handful of vectorized array operations.
+
+Coordinates are GFF-style, 1-based and inclusive, for both the indexed intervals and the queries.
+"""
+import numpy as np
+
+STRAND_CODES = {'+': 1, '-': -1, '.': 0}
+
+class _SeqIntervals:
+    """The intervals of one seqname, sorted by start"""
+    def __init__(self, starts, ends, strands, ids):
+        order = np.lexsort((ends, starts))
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.max_ends = np.maximum.accumulate(self.ends)
+        self.strands = strands[order]
+        self.ids = ids[order]
+
+        # 5' ends per strand, sorted, for nearest TSS queries
+        self.tss = {}
+        for code in (1, -1):
+            on_strand = np.nonzero(self.strands == code)[0]
+            tss = self.ends[on_strand] if code == -1 else self.starts[on_strand]
+            tss_order = np.argsort(tss, kind='stable')
+            self.tss[code] = (tss[tss_order], self.ids[on_strand][tss_order])
+
+    def overlap(self, qstarts, qends):
+        """(query offset, position in this object's arrays) of every overlapping pair"""
+        lo = np.searchsorted(self.max_ends, qstarts, 'left')
+        hi = np.searchsorted(self.starts, qends, 'right')
+        counts = np.maximum(hi - lo, 0)
+        total = counts.sum()
+        queries = np.repeat(np.arange(len(qstarts)), counts)
+        # positions lo[q], lo[q]+1, ..., hi[q]-1 for every query q
+        first = np.cumsum(counts) - counts
+        positions = np.repeat(lo, counts) + (np.arange(total) - np.repeat(first, counts))
+        # nested short intervals inside the slice may still end before the query starts
+        keep = self.ends[positions] >= qstarts[queries]
+        return queries[keep], positions[keep]
+
+class IntervalIndex:
+    """
+    Index of (seqname, start, end, strand, item) intervals. Query results are items, or
+    for the batch methods, positions in self.items.
+    >>> index = IntervalIndex([('I', 100, 200, '+', 'a'), ('I', 150, 400, '-', 'b'), ('II', 1, 50, '+', 'c')])
+    >>> index.overlap('I', 180, 190)
+    ['a', 'b']
+    >>> index.overlap('I', 180, 190, strand='-')
+    ['b']
+    >>> index.containing('I', 160, 300), index.within('I', 1, 300)
+    (['b'], ['a'])
+    >>> index.nearest_tss('I', 50), index.nearest_tss('I', 450, direction='upstream')
+    (('a', 50), ('b', 50))
+    """
+    def __init__(self, intervals):
+        self.items = []
+        self.bounds = [] # (start, end) of each item
+        columns = {} # seqname -> (starts, ends, strands, ids)
+        for seqname, start, end, strand, item in intervals:
+            starts, ends, strands, ids = columns.setdefault(seqname, ([], [], [], []))
+            starts.append(start)
+            ends.append(end)
+            strands.append(STRAND_CODES[strand])
+            ids.append(len(self.items))
+            self.items.append(item)
+            self.bounds.append((start, end))
+
+        self._seqs = {}
+        for seqname, (starts, ends, strands, ids) in columns.items():
+            self._seqs[seqname] = _SeqIntervals(np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64),
+                np.array(strands, dtype=np.int8), np.array(ids, dtype=np.int64))
+
+    @classmethod
+    def from_genes(cls, genes, feature='gene'):
+        """
+        Index GFF.Gene objects by feature: 'gene', 'transcript' (items are GFF.Transcript)
+        or any transcript feature such as 'exon' or 'CDS' (items are the GFF dicts).
+        """
+        def intervals():
+            for gene in genes:
+                if feature == 'gene':
+                    yield gene.seqname, gene.start, gene.end, gene.strand, gene
+                    continue
+                for transcript in gene.transcripts:
+                    if feature == 'transcript':
+                        yield gene.seqname, transcript.start, transcript.end, transcript.strand, transcript
+                        continue
+                    for gff in transcript.features(feature):
+                        yield gff['seqname'], gff['start'], gff['end'], gff['strand'], gff
+
+        return cls(intervals())
+
+    def seqnames(self):
+        return list(self._seqs)
+
+    def __len__(self):
+        return len(self.items)
+
+    def overlap_batch(self, seqnames, starts, ends, strands=None):
+        """
+        Every overlapping (query, interval) pair for many queries at once.
+        Returns two arrays: positions in the query lists and positions in self.items,
+        ordered by query and then interval start.
+        """
+        seqnames = np.asarray(seqnames)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if strands is not None:
+            strands = np.array([STRAND_CODES[s] for s in strands], dtype=np.int8)
+
+        query_parts, item_parts = [], []
+        for seqname in np.unique(seqnames):
+            seq = self._seqs.get(str(seqname))
+            if seq is None: continue
+            on_seq = np.nonzero(seqnames == seqname)[0]
+            queries, positions = seq.overlap(starts[on_seq], ends[on_seq])
+            if strands is not None:
+                keep = seq.strands[positions] == strands[on_seq][queries]
+                queries, positions = queries[keep], positions[keep]
+            query_parts.append(on_seq[queries])
+            item_parts.append(seq.ids[positions])
+
+        if not query_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        queries = np.concatenate(query_parts)
+        items = np.concatenate(item_parts)
+        order = np.argsort(queries, kind='stable')
+        return queries[order], items[order]
+
+    def overlap(self, seqname, start, end, strand=None):
+        """Items overlapping seqname:start-end, on strand if given, ordered by start"""
+        return [self.items[i] for i in self._overlap_ids(seqname, start, end, strand)]
+
+    def containing(self, seqname, start, end, strand=None):
+        """Items that entirely contain seqname:start-end"""
+        return [self.items[i] for i in self._overlap_ids(seqname, start, end, strand)
+                if self.bounds[i][0] <= start and self.bounds[i][1] >= end]
+
+    def within(self, seqname, start, end, strand=None):
+        """Items lying entirely within seqname:start-end"""
+        return [self.items[i] for i in self._overlap_ids(seqname, start, end, strand)
+                if self.bounds[i][0] >= start and self.bounds[i][1] <= end]
+
+    def _overlap_ids(self, seqname, start, end, strand):
+        strands = None if strand is None else [strand]
+        queries, items = self.overlap_batch([seqname], [start], [end], strands)
+        return items.tolist()
+
+    def nearest_tss_batch(self, seqnames, positions, direction='any', strand=None):
+        """
+        The interval whose 5' end is nearest to each position, for many positions at once.
+        direction 'upstream' only considers intervals the position lies upstream of (or at the 5' end of),
+        taking each interval's own strand into account, 'downstream' only those it lies downstream of,
+        and 'any' both. strand restricts the search to '+' or '-' intervals.
+        Returns positions in self.items and distances in bp, both -1 where nothing was found.
+        """
+        if direction not in ('any', 'upstream', 'downstream'):
+            raise Exception("direction must be 'any', 'upstream' or 'downstream', not %s" % direction)
+        seqnames = np.asarray(seqnames)
+        positions = np.asarray(positions, dtype=np.int64)
+        best = np.full(len(positions), -1, dtype=np.int64)
+        best_distance = np.full(len(positions), -1, dtype=np.int64)
+
+        codes = (1, -1) if strand is None else (STRAND_CODES[strand],)
+        for seqname in np.unique(seqnames):
+            seq = self._seqs.get(str(seqname))
+            if seq is None: continue
+            on_seq = np.nonzero(seqnames == seqname)[0]
+            pos = positions[on_seq]
+            for code in codes:
+                tss, ids = seq.tss[code]
+                if not len(tss): continue
+                # on '+' a position is upstream of TSSs at or after it; on '-' of TSSs at or before it
+                searches = []
+                if direction in ('any', 'upstream'):
+                    searches.append(code == 1)
+                if direction in ('any', 'downstream'):
+                    searches.append(code == -1)
+                for after in searches:
+                    if after:
+                        i = np.searchsorted(tss, pos, 'left')
+                        found = i < len(tss)
+                    else:
+                        i = np.searchsorted(tss, pos, 'right') - 1
+                        found = i >= 0
+                    i = np.clip(i, 0, len(tss) - 1)
+                    distance = np.abs(tss[i] - pos)
+                    better = found & ((best_distance[on_seq] < 0) | (distance < best_distance[on_seq]))
+                    best[on_seq[better]] = ids[i[better]]
+                    best_distance[on_seq[better]] = distance[better]
+
+        return best, best_distance
+
+    def nearest_tss(self, seqname, position, direction='any', strand=None):
+        """(item, distance) of the interval with the nearest 5' end, or (None, -1). See nearest_tss_batch."""
+        best, distance = self.nearest_tss_batch([seqname], [position], direction, strand)
+        if best[0] < 0:
+            return None, -1
+        return self.items[best[0]], int(distance[0])
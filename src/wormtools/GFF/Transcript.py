@@ -1,23 +1,45 @@
 import sys
+from . import gene_id, get_scalar_attr
+from .GFFParser import GFFRecord
+
 class Transcript:
     ALLOWED_FEATURES = ['CDS','exon','start_codon', 'stop_codon','five_prime_utr','three_prime_utr','transcript']
+    __slots__ = ('_features', '_by_feature', '_sorted', '_exon_ends', 'transcript', 'gene_id', 'transcript_id', 'strand', 'start', 'end')
 
-    def __init__(self,gffdata):
-        self.gffdata = [] 
+    def __init__(self,gffdata,transcript_id=None,gene_id=None):
+        # features are only appended while the transcript is built, and sorted by start once, on first read
+        self._features = []
+        self._by_feature = {} # feature name -> list of gff, indexing the same dicts as _features
+        self._sorted = True
+        self._exon_ends = None # (lowest start exon, highest end exon), found when the exons are sorted
         self.gene_id = None
         self.transcript_id = None
         self.strand = None
-        if type(gffdata) == type({}): # should be a single gff dict, as returned by a single call to GFFParser.parseLine
-            self.append(gffdata)
-        elif type(gffdata) == type([]): # should be a list of gff dicts
+        if isinstance(gffdata, (dict, GFFRecord)): # should be a single gff dict, as returned by a single call to GFFParser.parseLine
+            self.append(gffdata, transcript_id, gene_id)
+        elif isinstance(gffdata, list): # should be a list of gff dicts
             self.extend(gffdata)
         else:
             raise Exception("Transcript was initialized by an unexpected type of data %s" % str(gffdata))
 
+    @property
+    def gffdata(self):
+        """All features except the 'transcript' line itself, sorted by start"""
+        self._sort()
+        return self._features
+
+    def features(self, name):
+        """List of the features of type name ('exon', 'CDS', 'five_prime_utr' ...), sorted by start"""
+        self._sort()
+        return self._by_feature.get(name, [])
+
     def exons(self):
-        for gff in self.gffdata:
-            if gff['name'] == 'exon':
-                yield gff
+        for gff in self.features('exon'):
+            yield gff
+
+    def cds(self):
+        for gff in self.features('CDS'):
+            yield gff
 
     def get_5prime_exon(self):
         return self.__get_exon_end(True)
@@ -28,44 +50,52 @@ class Transcript:
         if self.strand is None:
             raise Exception("call to get_5prime_end() was made before being given a transcript gff or strand")
 
-        exons = [e for e in self.exons()]
-        
-        if is_5prime:
-            exons.sort(lambda a,b: cmp(a['start'],b['start']))
-        else:
-            exons.sort(lambda a,b: cmp(a['end'],b['end']))
-
-        if self.strand == "+" and is_5prime:
-            exons.sort(lambda a,b: cmp(a['start'],b['start']))
-            return exons[0]
-        elif self.strand == "+" and is_3prime:
-            exons.sort(lambda a,b: cmp(a['end'],b['end']))
-            return exons[-1]
-        elif self.strand == "-" and is_5prime:
-            exons.sort(lambda a,b: cmp(a['end'],b['end']))
-            return exons[-1]
+        self._sort()
+        if self._exon_ends is None:
+            raise Exception("transcript %s has no exons" % self.transcript_id)
+        leftmost, rightmost = self._exon_ends
+
+        if self.strand == "+":
+            return leftmost if is_5prime else rightmost
         else:
-            exons.sort(lambda a,b: cmp(a['start'],b['start']))
-            return exons[0]
+            return rightmost if is_5prime else leftmost
+
+    def _sort(self):
+        if self._sorted: return
 
-    def append(self, gffdatum):
+        # sort is stable, so features with equal starts stay in the order they were given
+        self._features.sort(key=lambda a: a['start'])
+        for group in self._by_feature.values():
+            group.sort(key=lambda a: a['start'])
+
+        exons = self._by_feature.get('exon')
+        if exons:
+            rightmost = exons[0]
+            for exon in exons: # last of the highest ends
+                if exon['end'] >= rightmost['end']: rightmost = exon
+            self._exon_ends = (exons[0], rightmost)
+
+        self._sorted = True
+
+    def append(self, gffdatum, transcript_id=None, transcript_gene_id=None):
+        """Add a feature. For the 'transcript' line, ids already known (as from a GFFCache) save scanning its attributes."""
         if gffdatum['name'] == "transcript":
             self.transcript = gffdatum
             #self.gene_id = get_attr(self.transcript['attr']['gene_id'][0]
-            self.gene_id = gene_id(self.transcript)
+            self.gene_id = transcript_gene_id if transcript_gene_id is not None else gene_id(self.transcript)
 
             #self.transcript_id = self.transcript['attr']['transcript_id'][0]
-            self.transcript_id = get_scalar_attr(self.transcript, 'transcript_id') 
+            self.transcript_id = transcript_id if transcript_id is not None else get_scalar_attr(self.transcript, 'transcript_id')
             self.strand = self.transcript['strand']
             self.start = self.transcript['start']
             self.end = self.transcript['end']
         elif gffdatum['name'] in self.ALLOWED_FEATURES:
-            self.gffdata.append(gffdatum)
+            self._features.append(gffdatum)
+            self._by_feature.setdefault(gffdatum['name'], []).append(gffdatum)
+            self._sorted = False
         else:
             raise Exception("feature type %s not allowed in transcript" % gffdatum['name'])
 
-        self.gffdata.sort(lambda a,b: cmp(a['start'], b['start']))
-
     def extend(self, data):
         for datum in data: self.append(datum)
 
@@ -75,6 +105,3 @@ class Transcript:
             s += "%s:%s %d %d %s\n" % (gff['seqname'], gff['name'].ljust(11), gff['start'], gff['end'], gff['strand'])
 
         return s
-
-
-
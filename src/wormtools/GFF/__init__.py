@@ -1,6 +1,5 @@
-from Gene import Gene 
-from Transcript import Transcript
-import GFFParser
+from . import GFFParser
+from .GFFParser import GFFRecord
 def to0baseEx(start1base, end1baseIncl):
     """
     For converting 1-based, inclusive such as GFF to 0-base exclusive, such as BED
@@ -45,17 +44,31 @@ def get_scalar_attr(gff, attr_name): # gff is normal dict
 
 def get_attr(gff, attr_name):
     """
-    Convenience method to return an attribute list from a GFF returned by GFF.GFFParser, or parse the 'attr_str' if it hasn't happened yet.
+    Convenience method to return an attribute list from a GFF returned by GFF.GFFParser.
+    If the 'attr_str' hasn't been parsed, only attr_name is scanned out of it by GFFParser.scanAttr,
+    and nothing is stored. A missing attribute raises KeyError either way.
     >>> get_attr({'attr':{'sample_attr_name':['sample_attr_value']}}, 'sample_attr_name')
     ['sample_attr_value']
+    >>> get_attr(GFFParser.parseLine(test_line_0), 'gene_biotype')
+    ['protein_coding']
     """
-    if not gff.has_key('attr'):
-        if gff.has_key('attr_str'):
-            gff['attr'] = GFFParser.parseAttr( gff['attr_str'] )
-        else:
-            raise Exception("gff has no 'attr' or 'attr_str' key. Was it produced via GFFParser?")
+    if 'attr' in gff:
+        return gff['attr'][attr_name]
+    if 'attr_str' not in gff:
+        raise Exception("gff has no 'attr' or 'attr_str' key. Was it produced via GFFParser?")
 
-    return gff['attr'][attr_name]
+    vals = GFFParser.scanAttr(gff['attr_str'], attr_name)
+    if not vals:
+        raise KeyError(attr_name)
+    return vals
+
+# the record classes use the helpers above, so import them last
+from .Gene import Gene
+from .Transcript import Transcript
+from .GFFTable import GFFTable, read_table
+from .GeneReader import iter_genes, iter_table_genes
+from .IntervalIndex import IntervalIndex
+from .GeneIndex import GeneIndex
 
 # static data for tests
 test_line_0 = 'IV	WormBase	gene	695	14926	.	+	.	gene_id "WBGene00021406"; gene_source "WormBase"; gene_biotype "protein_coding";\n'
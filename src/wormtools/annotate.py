@@ -0,0 +1,282 @@
+"""
+Annotating the genome around genes as promoter, exonic, intronic and downstream flank.
+
+Each gene gets a window from upstream_promoter_flank upstream of it to downstream_flank downstream
+of it (the flank is shortened where it would run off the start of the chromosome), cut into runs of
+- promoter: from upstream_promoter_flank upstream of any transcript's 5' end to promoter_inset_flank past it
+- exonic: in an exon of any transcript, and not promoter
+- intronic: everything else, except that
+- downstream_flank: the 3'-most run of the window is called this instead when it would be intronic.
+
+All the genes of a chromosome are annotated at once, without a mask per gene. Windows, exons and
+promoters become (gene, position) breakpoints, where promoter or exon coverage goes up or down by
+one. A single lexsort puts them in order, cumulative sums give the coverage between consecutive
+breakpoints, and runs of the same label are merged with array comparisons.
+
+Segments are 0-based and half-open, like BED.
+
+annotate_file writes a GTF's annotation as a sorted BED, optionally annotating chromosomes in
+parallel worker processes; it is also the wormtools-annotate command:
+$ wormtools-annotate -j 4 -o genome.annotation.bed.gz c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,argparse
+from collections import namedtuple, deque
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import GFF, stats
+from .GFF import GFFParser
+from .hits import open_output
+
+PROMOTER = "promoter"
+EXONIC = "exonic"
+INTRONIC = "intronic"
+DOWNSTREAM_FLANK = "downstream_flank"
+# label codes are positions in LABELS
+LABELS = (PROMOTER, EXONIC, INTRONIC, DOWNSTREAM_FLANK)
+
+UPSTREAM_PROMOTER_FLANK = 2000
+PROMOTER_INSET_FLANK = 1000
+DOWNSTREAM_FLANK_SIZE = 1000
+
+# the annotation of the genes of one seqname. gene_ids and strands are per gene, and gene, start,
+# end and label are per segment, ordered by gene (in input order) and position; gene indexes gene_ids.
+Segments = namedtuple('Segments', ['seqname', 'gene_ids', 'strands', 'gene', 'start', 'end', 'label'])
+
+class _Columns:
+    """Gene, exon and 5' end coordinates of the genes of one seqname, collected for annotate_columns"""
+    def __init__(self, seqname):
+        self.seqname = seqname
+        self.gene_ids, self.strands, self.starts, self.ends = [], [], [], []
+        self.exon_gene, self.exon_starts, self.exon_ends = [], [], []
+        self.tss_gene, self.tss = [], []
+
+    def add(self, gene):
+        i = len(self.gene_ids)
+        forward = gene.isforward()
+        self.gene_ids.append(gene.gene_id)
+        self.strands.append(gene.strand)
+        self.starts.append(gene.start)
+        self.ends.append(gene.end)
+        for transcript in gene.transcripts:
+            exons = transcript.features('exon')
+            if not exons: continue
+            for exon in exons:
+                self.exon_gene.append(i)
+                self.exon_starts.append(exon['start'])
+                self.exon_ends.append(exon['end'])
+            # the 5' end is the start of the first exon on +, the end of the last exon on -
+            self.tss_gene.append(i)
+            self.tss.append(exons[0]['start'] if forward else exons[-1]['end'])
+
+def annotate_columns(columns, upstream_promoter_flank=UPSTREAM_PROMOTER_FLANK,
+                     promoter_inset_flank=PROMOTER_INSET_FLANK, downstream_flank=DOWNSTREAM_FLANK_SIZE):
+    """The Segments of the genes collected in a _Columns"""
+    # only '+' is forward, as in Gene.isforward, so a '.' gene is laid out the way _Columns.add took its 5' ends
+    forward = np.array([strand == '+' for strand in columns.strands], dtype=bool)
+    starts = np.array(columns.starts, dtype=np.int64)
+    ends = np.array(columns.ends, dtype=np.int64)
+
+    # the flank on the chromosome-start side can't reach past position 1
+    upstream = np.where(forward, np.minimum(upstream_promoter_flank, starts - 1), upstream_promoter_flank)
+    downstream = np.where(forward, downstream_flank, np.minimum(downstream_flank, starts - 1))
+    window_start = np.where(forward, starts - upstream, starts - downstream) - 1
+    window_end = np.where(forward, ends + downstream, ends + upstream)
+
+    # promoters, one per transcript, cut to their gene's window
+    tss_gene = np.array(columns.tss_gene, dtype=np.int64)
+    tss = np.array(columns.tss, dtype=np.int64)
+    tss_forward = forward[tss_gene]
+    length = np.minimum(window_end - window_start, upstream + promoter_inset_flank)[tss_gene]
+    promoter_start = np.where(tss_forward, tss - 1 - upstream[tss_gene],
+                              np.maximum(window_start[tss_gene], tss - promoter_inset_flank))
+    promoter_end = np.minimum(promoter_start + length, window_end[tss_gene])
+    promoter_start = np.maximum(promoter_start, window_start[tss_gene])
+
+    exon_gene = np.array(columns.exon_gene, dtype=np.int64)
+    exon_start = np.array(columns.exon_starts, dtype=np.int64) - 1
+    exon_end = np.array(columns.exon_ends, dtype=np.int64)
+
+    # breakpoints: window ends change nothing but make sure every window is covered
+    n = len(starts)
+    gene_index = np.arange(n)
+    zeros = lambda k: np.zeros(k, dtype=np.int64)
+    ones = lambda k: np.ones(k, dtype=np.int64)
+    gene = np.concatenate([gene_index, gene_index, tss_gene, tss_gene, exon_gene, exon_gene])
+    position = np.concatenate([window_start, window_end, promoter_start, promoter_end, exon_start, exon_end])
+    promoter_step = np.concatenate([zeros(2*n), ones(len(tss)), -ones(len(tss)), zeros(2*len(exon_gene))])
+    exon_step = np.concatenate([zeros(2*n + 2*len(tss)), ones(len(exon_gene)), -ones(len(exon_gene))])
+
+    order = np.lexsort((position, gene))
+    gene, position = gene[order], position[order]
+    # each gene's steps add up to 0, so running sums over all genes give each gene's own coverage
+    promoter_cover = np.cumsum(promoter_step[order])
+    exon_cover = np.cumsum(exon_step[order])
+
+    # the stretch from each breakpoint to the next one of the same gene
+    keep = (gene[:-1] == gene[1:]) & (position[:-1] < position[1:])
+    seg_gene = gene[:-1][keep]
+    seg_start = position[:-1][keep]
+    seg_end = position[1:][keep]
+    seg_label = np.where(promoter_cover[:-1][keep] > 0, 0, np.where(exon_cover[:-1][keep] > 0, 1, 2))
+
+    # merge neighbouring stretches of a gene with the same label
+    first = np.ones(len(seg_gene), dtype=bool)
+    first[1:] = (seg_gene[1:] != seg_gene[:-1]) | (seg_label[1:] != seg_label[:-1])
+    last = np.ones(len(seg_gene), dtype=bool)
+    last[:-1] = first[1:]
+    run_gene, run_start, run_end, run_label = seg_gene[first], seg_start[first], seg_end[last], seg_label[first]
+
+    # the 3'-most run of each gene: its last on +, its first on -
+    gene_first = np.ones(len(run_gene), dtype=bool)
+    gene_first[1:] = run_gene[1:] != run_gene[:-1]
+    gene_last = np.ones(len(run_gene), dtype=bool)
+    gene_last[:-1] = gene_first[1:]
+    three_prime = np.where(forward[run_gene], gene_last, gene_first)
+    run_label = np.where(three_prime & (run_label == 2), 3, run_label)
+
+    return Segments(columns.seqname, columns.gene_ids, columns.strands, run_gene, run_start, run_end, run_label)
+
+def annotate_genes(genes, upstream_promoter_flank=UPSTREAM_PROMOTER_FLANK,
+                   promoter_inset_flank=PROMOTER_INSET_FLANK, downstream_flank=DOWNSTREAM_FLANK_SIZE):
+    """
+    Generate the Segments of each seqname of GFF.Gene objects, such as from GFF.iter_genes(gtf, features=['exon']).
+    Genes of one seqname are expected together, as in a GTF; each run of them is annotated as it ends,
+    so only one chromosome's coordinates are held at a time.
+    >>> from wormtools import GFF
+    >>> gtf = ['II WB gene 100 900 . + . gene_id "g";', 'II WB transcript 100 900 . + . gene_id "g"; transcript_id "t";',
+    ...        'II WB exon 100 300 . + . gene_id "g"; transcript_id "t";', 'II WB exon 500 900 . + . gene_id "g"; transcript_id "t";']
+    >>> genes = GFF.iter_genes(line.replace(' ', '\\t', 8) for line in gtf)
+    >>> for segments in annotate_genes(genes, promoter_inset_flank=100):
+    ...     for line in bed_lines(segments): print(line.split())
+    ['chrII', '0', '199', 'g.promoter', '0', '+']
+    ['chrII', '199', '300', 'g.exonic', '0', '+']
+    ['chrII', '300', '499', 'g.intronic', '0', '+']
+    ['chrII', '499', '900', 'g.exonic', '0', '+']
+    ['chrII', '900', '1900', 'g.downstream_flank', '0', '+']
+    """
+    flanks = (upstream_promoter_flank, promoter_inset_flank, downstream_flank)
+    columns = None
+    for gene in genes:
+        if columns is None or gene.seqname != columns.seqname:
+            if columns is not None:
+                yield annotate_columns(columns, *flanks)
+            columns = _Columns(gene.seqname)
+        columns.add(gene)
+    if columns is not None:
+        yield annotate_columns(columns, *flanks)
+
+def sort_segments(segments):
+    """Segments reordered by start, then end, then gene, as a sorted BED has them"""
+    order = np.lexsort((segments.gene, segments.end, segments.start))
+    return segments._replace(gene=segments.gene[order], start=segments.start[order],
+                             end=segments.end[order], label=segments.label[order])
+
+def bed_lines(segments, prefix='chr'):
+    """BED6 lines of Segments: prefix+seqname, start, end, gene_id.label, 0, strand"""
+    chrom = prefix + segments.seqname
+    gene_ids, strands = segments.gene_ids, segments.strands
+    return ["%s\t%d\t%d\t%s.%s\t0\t%s\n" % (chrom, start, end, gene_ids[g], LABELS[label], strands[g])
+            for g, start, end, label in zip(segments.gene.tolist(), segments.start.tolist(),
+                                             segments.end.tolist(), segments.label.tolist())]
+
+def write_bed(segments_iter, fh, prefix='chr'):
+    """Write the BED6 lines of every Segments to the text file fh, returning the number of lines"""
+    n = 0
+    for segments in segments_iter:
+        lines = bed_lines(segments, prefix)
+        fh.write(''.join(lines))
+        n += len(lines)
+    return n
+
+def _sorted_bed(segments_iter, prefix):
+    # the sorted BED6 of each Segments, encoded, and its number of lines
+    lines = [line for segments in segments_iter for line in bed_lines(sort_segments(segments), prefix)]
+    return ''.join(lines).encode(), len(lines)
+
+def _annotate_lines(lines, flanks, prefix):
+    # a worker's job: the GTF lines of one seqname to its sorted BED
+    genes = GFF.iter_genes(lines, features=['exon'])
+    return _sorted_bed(annotate_genes(genes, *flanks), prefix)
+
+def _seqname_blocks(infile):
+    # runs of consecutive GTF lines with the same seqname
+    with GFFParser.openGFF(infile) as fh:
+        lines = (line for line in fh if not line.startswith('#') and line.strip())
+        for seqname, block in groupby(lines, lambda line: line.split('\t', 1)[0]):
+            yield seqname, list(block)
+
+def _annotate_parallel(infile, flanks, jobs, exclude, prefix):
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for seqname, lines in _seqname_blocks(infile):
+            if seqname in exclude: continue
+            pending.append(pool.submit(_annotate_lines, lines, flanks, prefix))
+            # keep the pool busy with the next chromosomes while the oldest finishes
+            while len(pending) > jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def annotate_file(infile, out, upstream_promoter_flank=UPSTREAM_PROMOTER_FLANK, promoter_inset_flank=PROMOTER_INSET_FLANK,
+                  downstream_flank=DOWNSTREAM_FLANK_SIZE, jobs=1, exclude=(), prefix='chr', cache=False, cache_dir=None):
+    """
+    Write the BED6 annotation of the genes of the GTF infile (plain, gzip or bgzip) to the binary file out,
+    returning the number of lines. Seqnames come in GTF order, each sorted by start, and those in
+    exclude are left out. With jobs > 1, seqnames are annotated by that many worker processes,
+    with the same output. With cache, a serial run reads the GTF through its GFFCache in cache_dir
+    (see GFF.iter_genes) instead of streaming it.
+    """
+    flanks = (upstream_promoter_flank, promoter_inset_flank, downstream_flank)
+    if jobs > 1:
+        results = _annotate_parallel(infile, flanks, jobs, exclude, prefix)
+    else:
+        genes = (gene for gene in GFF.iter_genes(infile, features=['exon'], cache=cache, cache_dir=cache_dir) if gene.seqname not in exclude)
+        results = (_sorted_bed([segments], prefix) for segments in annotate_genes(genes, *flanks))
+    n = 0
+    # while recording (see wormtools.stats), annotating seqnames (or waiting for the workers that do) is timed apart from writing
+    for data, lines in stats.timed('annotate.seqnames', results, 'seqnames'):
+        with stats.timer('annotate.write'):
+            out.write(data)
+        stats.count('annotate.write', regions=lines, bytes=len(data))
+        n += lines
+    return n
+
+def main(argv=None):
+    args = get_args(argv)
+    with stats.recording(args):
+        out = open_output(args.output)
+        n = annotate_file(args.gtf, out, args.upstream_promoter_flank, args.promoter_inset_flank, args.downstream_flank,
+                          jobs=args.jobs, exclude=set(args.exclude), prefix=args.prefix, cache=args.cache)
+        if out is sys.stdout.buffer:
+            out.flush()
+        else:
+            out.close()
+        print("wrote", n, "regions to", args.output or "standard output", file=sys.stderr)
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(prog="wormtools-annotate",
+        description="Annotate the genome around every gene of a GTF as promoter, exonic, intronic and downstream_flank, "
+            "written as BED6 lines named gene_id.label, sorted by start within each seqname.")
+    parser.add_argument('gtf', help="GTF file. Can be gzip or bgzip compressed, whatever its name.")
+    parser.add_argument('-o', '--output', metavar='FILE', help="Write to FILE instead of standard output, bgzip-compressed if it ends in .gz.")
+    parser.add_argument('-u', '--upstream-promoter-flank', type=int, default=UPSTREAM_PROMOTER_FLANK, metavar='BP',
+        help="Promoters start this far upstream of each transcript's 5' end, and gene windows too (default %(default)d).")
+    parser.add_argument('-i', '--promoter-inset-flank', type=int, default=PROMOTER_INSET_FLANK, metavar='BP',
+        help="Promoters reach this far past each transcript's 5' end (default %(default)d).")
+    parser.add_argument('-d', '--downstream-flank', type=int, default=DOWNSTREAM_FLANK_SIZE, metavar='BP',
+        help="Gene windows reach this far past the 3' end (default %(default)d).")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Annotate seqnames in this many worker processes. Output is identical to a serial run.")
+    parser.add_argument('-x', '--exclude', action='append', default=[], metavar='SEQNAME', help="Leave out the genes of SEQNAME, e.g. MtDNA. Can be repeated.")
+    parser.add_argument('--prefix', default='chr', help="Prepended to seqnames in the BED (default %(default)s).")
+    parser.add_argument('--cache', action='store_true', help="Load the GTF through its cache (see wormtools.GFF.GFFCache) instead of streaming it. Not used with --jobs.")
+    stats.add_arguments(parser)
+    args = parser.parse_args(argv)
+    for flank in ('upstream_promoter_flank', 'promoter_inset_flank', 'downstream_flank'):
+        if getattr(args, flank) < 0:
+            parser.error("--%s can't be negative" % flank.replace('_', '-'))
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+if __name__ == '__main__': main()
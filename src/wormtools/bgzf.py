@@ -0,0 +1,142 @@
+"""
+The BGZF (bgzip) block format: gzip members of at most 64 KB of data, each carrying its own
+compressed size in a 'BC' extra subfield, so a file can be split into blocks without inflating it.
+See the SAM specification, section 4.1.
+
+A .gzi index lists (compressed offset, uncompressed offset) for the start of every block after
+the first; with it any uncompressed range can be read by inflating just the blocks it falls in.
+"""
+import os,struct,zlib
+from bisect import bisect_right
+
+# uncompressed bytes per block written by bgzip
+MAX_BLOCK_DATA = 0xff00
+# the empty block bgzip writes at the end of every file
+EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+def is_bgzip(filename):
+    """True if the file starts with a BGZF block: a gzip member with a 'BC' extra subfield"""
+    with open(filename, 'rb') as fh:
+        header = fh.read(16)
+    return len(header) == 16 and header[:4] == b'\x1f\x8b\x08\x04' and header[12:14] == b'BC'
+
+def block_size(data, pos):
+    """Total size of the BGZF block starting at data[pos]"""
+    if data[pos:pos+4] != b'\x1f\x8b\x08\x04' or data[pos+12:pos+14] != b'BC':
+        raise Exception("not a bgzip block at offset %d" % pos)
+    return struct.unpack('<H', data[pos+16:pos+18])[0] + 1
+
+def inflate_block(data, pos, bsize):
+    """The uncompressed contents of the BGZF block data[pos:pos+bsize]"""
+    xlen = struct.unpack('<H', data[pos+10:pos+12])[0]
+    # raw deflate payload between the header (12 bytes + extra field) and the CRC32/ISIZE trailer
+    return zlib.decompress(data[pos+12+xlen:pos+bsize-8], -15)
+
+def compress_block(data, level=6):
+    """One BGZF block holding data, which must be at most MAX_BLOCK_DATA bytes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    bsize = 12 + 6 + len(payload) + 8
+    # ID1 ID2 CM FLG MTIME XFL OS XLEN, then the BC subfield: SI1 SI2 SLEN BSIZE-1
+    header = struct.pack('<4BIBBHBBHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, bsize - 1)
+    return header + payload + struct.pack('<II', zlib.crc32(data), len(data))
+
+class BgzfWriter:
+    """
+    A binary file-like object writing BGZF blocks, readable by gzip as well as by bgzip-aware tools.
+    >>> import gzip, io
+    >>> out = io.BytesIO()
+    >>> writer = BgzfWriter(out)
+    >>> writer.write(b'ACGT' * 50000)
+    200000
+    >>> writer.flush()
+    >>> gzip.decompress(out.getvalue()) == b'ACGT' * 50000
+    True
+    """
+    def __init__(self, fileobj, level=6):
+        self._fh = fileobj
+        self._level = level
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= MAX_BLOCK_DATA:
+            self._fh.write(compress_block(bytes(self._buffer[:MAX_BLOCK_DATA]), self._level))
+            del self._buffer[:MAX_BLOCK_DATA]
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._fh.write(compress_block(bytes(self._buffer), self._level))
+            self._buffer = bytearray()
+        self._fh.flush()
+
+    def close(self):
+        self.flush()
+        self._fh.write(EOF_BLOCK)
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def build_gzi(filename):
+    """
+    Walk the blocks of a bgzip file and return (compressed offset, uncompressed offset) of each block
+    start after the first, as stored in a .gzi index. Only the block headers and sizes are read.
+    """
+    entries = []
+    coffset = uoffset = 0
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as fh:
+        while coffset < size:
+            fh.seek(coffset)
+            bsize = block_size(fh.read(18), 0)
+            fh.seek(coffset + bsize - 4)
+            isize = struct.unpack('<I', fh.read(4))[0]
+            coffset += bsize
+            uoffset += isize
+            if coffset < size:
+                entries.append((coffset, uoffset))
+    return entries
+
+def write_gzi(entries, filename):
+    with open(filename, 'wb') as fh:
+        fh.write(struct.pack('<Q', len(entries)))
+        for coffset, uoffset in entries:
+            fh.write(struct.pack('<QQ', coffset, uoffset))
+
+def read_gzi(filename):
+    with open(filename, 'rb') as fh:
+        data = fh.read()
+    n = struct.unpack('<Q', data[:8])[0]
+    values = struct.unpack('<%dQ' % (2*n), data[8:8 + 16*n])
+    return list(zip(values[0::2], values[1::2]))
+
+class UncompressedView:
+    """
+    Slices of the uncompressed contents of bgzip data (bytes or an mmap), given its .gzi entries.
+    view[start:end] inflates only the blocks overlapping that range.
+    """
+    def __init__(self, data, gzi):
+        self._data = data
+        blocks = [(0, 0)] + list(gzi)
+        self._coffsets = [c for c,u in blocks]
+        self._uoffsets = [u for c,u in blocks]
+
+    def __getitem__(self, key):
+        start, end = key.start, key.stop
+        i = bisect_right(self._uoffsets, start) - 1
+        pos = self._coffsets[i]
+        first = self._uoffsets[i]
+        out = []
+        have = 0
+        while first + have < end and pos < len(self._data):
+            bsize = block_size(self._data, pos)
+            block = inflate_block(self._data, pos, bsize)
+            out.append(block)
+            have += len(block)
+            pos += bsize
+        return b''.join(out)[start-first:end-first]
@@ -0,0 +1,251 @@
+"""
+Reading (multi)fasta files, plain, gzipped or bgzipped (see wormtools.io).
+
+Sequences are handled as bytes from end to end: the file is read in large blocks, line
+breaks are removed from each block with bytes.translate, and the blocks of a record are
+joined once at its end, so reading a chromosome costs time linear in its length.
+
+IndexedFasta gives random access to slices of a plain or bgzip-compressed fasta through a
+samtools-compatible .fai index (and .gzi block index for bgzip), built on first use.
+
+A UCSC .2bit genome (see wormtools.twobit) can stand in for a fasta: readGZfa reads its
+sequences, and open_indexed opens it for random access as a TwoBitFile.
+"""
+import os,mmap
+from collections import namedtuple
+from itertools import chain
+from . import bgzf, io, stats
+
+BLOCKSIZE = 1 << 20
+WHITESPACE = b' \t\r\n'
+
+def open_fasta(filename):
+    """Open a fasta file for reading bytes, decompressing it if it is gzip or bgzip compressed."""
+    return io.open_binary(filename)
+
+def readGZfa(gzfilename, upper=True, blocksize=BLOCKSIZE, threads=None):
+    """
+    Generate (header, sequence) for every record of a fasta file. The header is a str without the '>',
+    the sequence is bytes, upper-cased unless upper is False (so soft-masked sequence is kept).
+    A bgzip-compressed fasta is inflated by threads threads (see wormtools.io), and a .2bit
+    file is read through twobit.TwoBitFile.
+    """
+    from . import twobit
+    if twobit.is_twobit(gzfilename):
+        with twobit.TwoBitFile(gzfilename) as genome:
+            yield from stats.timed('fasta.records', genome.records(upper), 'records', _record_length, 'bases')
+        return
+
+    # while recording (see wormtools.stats), reading and inflating blocks is timed apart from parsing them
+    blocks = stats.timed('fasta.read_blocks', io.read_blocks(gzfilename, blocksize, threads), 'blocks', len, 'bytes')
+    yield from stats.timed('fasta.records', _records(blocks, upper), 'records', _record_length, 'bases')
+
+def _record_length(record):
+    return len(record[1])
+
+def _records(blocks, upper):
+    # the (header, sequence) records of the decompressed blocks of a fasta
+    header = None
+    chunks = []
+    rest = b'' # an incomplete header line carried over to the next block
+    # an empty block marks the end
+    for block in chain(blocks, [b'']):
+        data = rest + block
+        rest = b''
+        if block:
+            # sequence can be split anywhere, but a header has to be read whole
+            last = data.rfind(b'>')
+            if last >= 0 and data.find(b'\n', last) < 0:
+                data, rest = data[:last], data[last:]
+
+        pos = 0
+        while True:
+            gt = data.find(b'>', pos)
+            if gt < 0:
+                chunks.append(_clean(data[pos:], upper))
+                break
+            chunks.append(_clean(data[pos:gt], upper))
+            if header is not None:
+                yield header, b''.join(chunks)
+            chunks = []
+
+            nl = data.find(b'\n', gt)
+            if nl < 0: nl = len(data)
+            header = data[gt+1:nl].strip().decode()
+            pos = nl + 1
+
+    if header is not None:
+        yield header, b''.join(chunks)
+
+# IUPAC complements, upper and lower case, for bytes.translate
+COMPLEMENT = bytes.maketrans(b'ACGTKRWMYSBDHVNacgtkrwmysbdhvn', b'TGCAMYWKRSVHDBNtgcamywkrsvhdbn')
+
+def reverse_complement(seq):
+    """
+    The reverse complement of a bytes sequence, keeping case and IUPAC codes.
+    >>> reverse_complement(b'GATAAgn')
+    b'ncTTATC'
+    """
+    return seq.translate(COMPLEMENT)[::-1]
+
+# cleaning each block as it is read keeps the peak memory of a record near twice its length
+def _clean(block, upper):
+    block = block.translate(None, WHITESPACE)
+    if upper:
+        block = block.upper()
+    return block
+
+# one line of a .fai index. offset is where the sequence starts in the (uncompressed) file,
+# linebases/linewidth are the bases per line and bytes per line including the line break.
+FaiEntry = namedtuple('FaiEntry', ['name', 'length', 'offset', 'linebases', 'linewidth'])
+
+def build_fai(filename):
+    """
+    Scan a fasta file (plain or gzipped) and return its FaiEntry list.
+    All lines of a record but the last must have the same length, as samtools faidx requires.
+    """
+    entries = []
+    offset = 0
+    name = None
+    with open_fasta(filename) as fh:
+        for line in fh:
+            if line.startswith(b'>'):
+                if name is not None:
+                    entries.append(FaiEntry(name, length, seq_offset, linebases or 0, linewidth or 0))
+                name = line[1:].split()[0].decode()
+                seq_offset = offset + len(line)
+                length = 0
+                linebases = linewidth = None
+                short_line = False
+            elif name is not None:
+                bases = len(line.rstrip(b'\r\n'))
+                if linebases is None:
+                    linebases, linewidth = bases, len(line)
+                elif (short_line and bases) or bases > linebases:
+                    raise Exception("%s: record %s has lines of different lengths, can't be indexed" % (filename, name))
+                if bases < linebases: short_line = True
+                length += bases
+            offset += len(line)
+
+    if name is not None:
+        entries.append(FaiEntry(name, length, seq_offset, linebases or 0, linewidth or 0))
+    return entries
+
+def write_fai(entries, filename):
+    with open(filename, 'w') as fh:
+        for entry in entries:
+            fh.write("\t".join(map(str, entry)) + "\n")
+
+def read_fai(filename):
+    entries = []
+    with open(filename) as fh:
+        for line in fh:
+            name, length, offset, linebases, linewidth = line.rstrip('\n').split('\t')[:5]
+            entries.append(FaiEntry(name, int(length), int(offset), int(linebases), int(linewidth)))
+    return entries
+
+def is_gzip(filename):
+    return io.detect(filename) != 'plain'
+
+def _load_or_build(index_filename, build, read, write):
+    # an index that can't be written next to the data is kept in memory only
+    if os.path.exists(index_filename):
+        return read(index_filename)
+    entries = build()
+    try:
+        write(entries, index_filename)
+    except OSError:
+        pass
+    return entries
+
+def parse_region(region):
+    """
+    Parse a samtools-style region, 1-based and inclusive, into a 0-based half-open (seqname, start, end).
+    end is None when the region runs to the end of the sequence.
+    >>> parse_region('chrIV:1,200,000-1,210,000')
+    ('chrIV', 1199999, 1210000)
+    >>> parse_region('chrIV'), parse_region('chrIV:500')
+    (('chrIV', 0, None), ('chrIV', 499, None))
+    """
+    if ':' not in region:
+        return region, 0, None
+    seqname, span = region.rsplit(':', 1)
+    span = span.replace(',', '')
+    if '-' in span:
+        start, end = span.split('-')
+        return seqname, int(start) - 1, int(end)
+    return seqname, int(span) - 1, None
+
+class IndexedFasta:
+    """
+    Random access to the sequences of a plain or bgzip-compressed fasta file.
+    The .fai (and for bgzip, .gzi) index next to the file is used, or built and written there if missing.
+    The file is memory-mapped, so only the requested slices are ever read.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        # checked first, so a file that can't be used is left without index files
+        compressed = is_gzip(filename)
+        if compressed and not bgzf.is_bgzip(filename):
+            raise Exception("%s is gzipped but not with bgzip, so it can't be randomly accessed. Recompress it with bgzip." % filename)
+        entries = _load_or_build(filename + '.fai', lambda: build_fai(filename), read_fai, write_fai)
+        self.index = dict((entry.name, entry) for entry in entries)
+        self.names = [entry.name for entry in entries]
+
+        self._fh = open(filename, 'rb')
+        self._data = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if compressed:
+            gzi = _load_or_build(filename + '.gzi', lambda: bgzf.build_gzi(filename), bgzf.read_gzi, bgzf.write_gzi)
+            self._raw = bgzf.UncompressedView(self._data, gzi)
+        else:
+            self._raw = self._data
+
+    def length(self, seqname):
+        return self.index[seqname].length
+
+    def fetch(self, seqname, start=0, end=None, upper=True):
+        """
+        The sequence of seqname from 0-based start up to, not including, end, as bytes.
+        The range is clipped to the sequence, and upper-cased unless upper is False.
+        """
+        entry = self.index[seqname]
+        if end is None or end > entry.length: end = entry.length
+        start = max(0, start)
+        if start >= end:
+            return b''
+
+        # byte positions of the first base and one past the last base
+        first = entry.offset + (start // entry.linebases) * entry.linewidth + start % entry.linebases
+        last = entry.offset + ((end - 1) // entry.linebases) * entry.linewidth + (end - 1) % entry.linebases + 1
+        seq = self._raw[first:last].translate(None, WHITESPACE)
+        if upper:
+            seq = seq.upper()
+        return seq
+
+    def fetch_region(self, region, upper=True):
+        """Fetch a samtools-style region such as 'chrIV:1,200,000-1,210,000'"""
+        seqname, start, end = parse_region(region)
+        return self.fetch(seqname, start, end, upper)
+
+    def __contains__(self, seqname):
+        return seqname in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        self._data.close()
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_indexed(filename):
+    """Random access to the sequences of filename: a twobit.TwoBitFile for a .2bit file, an IndexedFasta otherwise"""
+    from . import twobit
+    if twobit.is_twobit(filename):
+        return twobit.TwoBitFile(filename)
+    return IndexedFasta(filename)
@@ -0,0 +1,283 @@
+"""
+Converting whole GFF/GTF annotations to BED, a batch of rows at a time.
+
+- bed6: a line per GFF row (or per row of some features), as GFF.GFF_as_BED6 has it: seqname,
+  start-1, end, the feature (or an attribute, such as gene_id), the score (0 for '.') and strand.
+- bed12: a line per transcript from its chromStart to chromEnd, with a block per exon, and
+  thickStart/thickEnd around its CDS, start_codon and stop_codon rows (both at chromStart for
+  noncoding transcripts). A transcript without exons is a single block of its own extent.
+  Features are tied to their transcript through the gene model (see GFFCache.build_hierarchy),
+  or, in GFFs without gene lines (as StringTie and Cufflinks write them), by transcript_id.
+
+A GTF is read into a small GFFTable at a time, cut only where a new gene starts (or a new
+transcript, without gene lines) so every transcript is whole in one. Each table is converted
+column by column with NumPy, formatted into a single string and written with one write, so
+memory stays flat however long the annotation.
+A GFFTable (such as from the GFFCache) is converted in the same batches without parsing at all.
+
+convert is also the wormtools-gff2bed command:
+$ wormtools-gff2bed --format bed12 -o transcripts.bed.gz c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,argparse
+from itertools import islice
+import numpy as np
+from . import GFF, stats
+from .GFF import GFFParser
+from .hits import open_output
+
+FORMATS = ('bed6', 'bed12')
+
+# rows per batch, give or take the rest of a gene
+CHUNK_ROWS = 1 << 15
+
+# the rows of a transcript that thickStart and thickEnd span
+CODING_FEATURES = ('CDS', 'start_codon', 'stop_codon')
+
+def _is_feature(table, rows, features):
+    # which of rows are one of features
+    codes = [table.name.code(feature) for feature in features]
+    return np.isin(np.asarray(table.name.codes)[rows], [code for code in codes if code is not None])
+
+def _strings(column, rows, prefix=''):
+    # the values of the Categories column at rows, as a list
+    levels = np.array([prefix + level for level in column.levels], dtype=object)
+    return levels[np.asarray(column.codes)[rows]].tolist()
+
+def _attr_strings(table, rows, key):
+    # the first value of the attribute key of each row, '.' for rows without it
+    values = []
+    for row in rows.tolist():
+        found = GFFParser.scanAttr(table.attr_str(row), key)
+        values.append(found[0] if found else '.')
+    return values
+
+def _scores(table, rows):
+    # as GFF_as_BED6 has them: the score, or 0 for '.'
+    scores = np.asarray(table.score)[rows]
+    missing = np.isnan(scores)
+    if missing.all():
+        return ['0'] * len(scores)
+    return ['0' if m else str(score) for m, score in zip(missing.tolist(), scores.tolist())]
+
+def bed6_lines(table, lo=0, hi=None, features=None, name=None, prefix='chr'):
+    """
+    BED6 lines of rows lo to hi of a GFFTable, only those of features if given. Lines are named by
+    the feature, or by the attribute name ('.' for rows without it), and prefix goes before seqnames.
+    >>> table = GFF.GFFTable()
+    >>> table.append_line(GFF.test_line_0)
+    >>> print(bed6_lines(table, name='gene_id')[0].split())
+    ['chrIV', '694', '14926', 'WBGene00021406', '0', '+']
+    """
+    rows = np.arange(lo, len(table) if hi is None else hi)
+    if features is not None:
+        rows = rows[_is_feature(table, rows, features)]
+    chroms = _strings(table.seqname, rows, prefix)
+    starts = (np.asarray(table.start)[rows].astype(np.int64) - 1).tolist()
+    ends = np.asarray(table.end)[rows].tolist()
+    names = _strings(table.name, rows) if name is None else _attr_strings(table, rows, name)
+    return ["%s\t%d\t%d\t%s\t%s\t%s\n" % line for line in
+            zip(chroms, starts, ends, names, _scores(table, rows), _strings(table.strand, rows))]
+
+def bed12_lines(table, lo=0, hi=None, name=None, prefix='chr'):
+    """
+    BED12 lines of the transcripts whose transcript lines are in rows lo to hi of a GFFTable, in
+    that order. Their features have to be in those rows too, as they are between gene lines.
+    Features the gene model doesn't place, as when there are no gene lines, go by their transcript_id.
+    Lines are named by transcript_id, or by the attribute name of the transcript line.
+    >>> table = GFF.GFFTable()
+    >>> for name, start, end in [('gene', 11, 90), ('transcript', 11, 90), ('exon', 61, 90), ('exon', 11, 30), ('CDS', 21, 30)]:
+    ...     table.append_line('\\t'.join(['I', 'WB', name, str(start), str(end), '.', '-', '.', 'gene_id "g"; transcript_id "t";']))
+    >>> print(bed12_lines(table)[0].split())
+    ['chrI', '10', '90', 't', '0', '-', '20', '30', '0', '2', '20,30,', '0,50,']
+    """
+    hi = len(table) if hi is None else hi
+    hierarchy = table.hierarchy()
+    first, last = np.searchsorted(hierarchy.transcript_rows, [lo, hi]).tolist()
+    n = last - first
+    if not n:
+        return []
+    transcript_rows = hierarchy.transcript_rows[first:last]
+    rows = np.arange(lo, hi)
+    row_transcript = hierarchy.row_transcript[lo:hi].astype(np.int64) - first
+    unplaced = np.flatnonzero((row_transcript < -first) & ~_is_feature(table, rows, ('gene', 'transcript')))
+    if len(unplaced):
+        index = dict((transcript_id, i) for i, transcript_id in enumerate(hierarchy.transcript_ids[first:last].tolist()) if transcript_id)
+        row_transcript[unplaced] = [index.get(transcript_id, -1) for transcript_id in _attr_strings(table, rows[unplaced], 'transcript_id')]
+    starts = np.asarray(table.start)[lo:hi].astype(np.int64) - 1
+    ends = np.asarray(table.end)[lo:hi].astype(np.int64)
+    inside = (row_transcript >= 0) & (row_transcript < n)
+
+    # blocks: the exons, and the transcript itself for those without any
+    exons = np.flatnonzero(inside & _is_feature(table, rows, ['exon']))
+    exon_transcript = row_transcript[exons]
+    lone = np.flatnonzero(np.bincount(exon_transcript, minlength=n) == 0)
+    block_transcript = np.concatenate([exon_transcript, lone])
+    block_start = np.concatenate([starts[exons], np.asarray(table.start)[transcript_rows[lone]].astype(np.int64) - 1])
+    block_end = np.concatenate([ends[exons], np.asarray(table.end)[transcript_rows[lone]].astype(np.int64)])
+    order = np.lexsort((block_start, block_transcript))
+    block_transcript, block_start, block_end = block_transcript[order], block_start[order], block_end[order]
+    bounds = np.searchsorted(block_transcript, np.arange(n + 1))
+    chrom_start = block_start[bounds[:-1]]
+    chrom_end = np.maximum.reduceat(block_end, bounds[:-1])
+
+    coding = np.flatnonzero(inside & _is_feature(table, rows, CODING_FEATURES))
+    thick_start = np.full(n, np.iinfo(np.int64).max)
+    thick_end = np.full(n, -1)
+    np.minimum.at(thick_start, row_transcript[coding], starts[coding])
+    np.maximum.at(thick_end, row_transcript[coding], ends[coding])
+    noncoding = thick_end < 0
+    thick_start = np.where(noncoding, chrom_start, np.maximum(thick_start, chrom_start))
+    thick_end = np.where(noncoding, chrom_start, np.minimum(thick_end, chrom_end))
+
+    sizes = [str(size) + ',' for size in (block_end - block_start).tolist()]
+    offsets = [str(offset) + ',' for offset in (block_start - chrom_start[block_transcript]).tolist()]
+    bounds = bounds.tolist()
+    block_sizes = [''.join(sizes[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    block_starts = [''.join(offsets[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    counts = np.diff(bounds).tolist()
+
+    names = hierarchy.transcript_ids[first:last].tolist() if name is None else _attr_strings(table, transcript_rows, name)
+    return ["%s\t%d\t%d\t%s\t%s\t%s\t%d\t%d\t0\t%d\t%s\t%s\n" % line for line in
+            zip(_strings(table.seqname, transcript_rows, prefix), chrom_start.tolist(), chrom_end.tolist(), names,
+                _scores(table, transcript_rows), _strings(table.strand, transcript_rows), thick_start.tolist(),
+                thick_end.tolist(), counts, block_sizes, block_starts)]
+
+def _blocks(infile, size):
+    # lists of the feature lines of up to size lines of a file name or of an iterable of lines
+    if isinstance(infile, str):
+        with GFFParser.openGFF(infile) as fh:
+            yield from _blocks(fh, size)
+        return
+    lines = iter(infile)
+    while True:
+        block = list(islice(lines, size))
+        if not block:
+            return
+        yield [line for line in block if line[:1] != '#' and not line.isspace()]
+
+def iter_tables(infile, chunk_rows=CHUNK_ROWS):
+    """
+    GFFTables of consecutive lines of infile, a GFF/GTF file name (plain, gzip or bgzip) or lines of one.
+    Every chunk_rows lines or so, a table is cut before the last gene line read, so genes are whole
+    in one; GFFs without gene lines are cut before the last transcript line, or anywhere without those.
+    """
+    pending = []
+    for block in _blocks(infile, chunk_rows):
+        pending.extend(block)
+        if len(pending) < chunk_rows:
+            continue
+        cut = _last_line(pending, 'gene')
+        if cut is None:
+            cut = _last_line(pending, 'transcript')
+        if cut is None:
+            cut = len(pending)
+        if cut:
+            yield _table(pending[:cut])
+            pending = pending[cut:]
+    if pending:
+        yield _table(pending)
+
+def _last_line(lines, feature):
+    # the index of the last line of feature in lines, None if there isn't one
+    for i in range(len(lines) - 1, -1, -1):
+        fields = lines[i].split('\t', 3)
+        if len(fields) > 2 and fields[2] == feature:
+            return i
+    return None
+
+def _table(lines):
+    table = GFF.GFFTable()
+    try:
+        table.extend_lines(lines)
+    except:
+        # find the line that failed
+        for line in lines:
+            try:
+                GFF.GFFTable().append_line(line)
+            except:
+                print("failed on line:%s" % line, file=sys.stderr)
+                break
+        raise
+    return table
+
+def _row_ranges(table, chunk_rows, whole_genes):
+    # (lo, hi) of batches of rows of table, cut as iter_tables cuts a file
+    length = len(table)
+    cuts = []
+    if whole_genes:
+        # before gene rows, or transcript rows when there are no genes
+        hierarchy = table.hierarchy()
+        cuts = hierarchy.gene_rows if len(hierarchy.gene_rows) else hierarchy.transcript_rows
+    lo = 0
+    while lo < length:
+        hi = lo + chunk_rows
+        if len(cuts) and cuts[0] < hi:
+            # the first cut at or after hi, if rows before it have one
+            i = np.searchsorted(cuts, hi)
+            hi = int(cuts[i]) if i < len(cuts) else length
+        hi = min(hi, length)
+        yield lo, hi
+        lo = hi
+
+def convert(source, out, format='bed6', features=None, name=None, prefix='chr', chunk_rows=CHUNK_ROWS, cache=False, cache_dir=None):
+    """
+    Write the BED lines of source to the binary file out, a batch at a time, returning the number
+    of lines. source is a GFF/GTF file name (plain, gzip or bgzip), read chunk_rows at a time, lines of
+    one, or a GFFTable; with cache, a file name is loaded through its GFFCache instead. format is
+    'bed6' or 'bed12', and features, name and prefix are as in bed6_lines and bed12_lines
+    (features only applies to bed6).
+    """
+    if format not in FORMATS:
+        raise Exception("format must be one of %s, not %s" % (", ".join(FORMATS), format))
+    if cache and isinstance(source, str):
+        source = GFF.read_table(source, cache_dir=cache_dir)
+    if isinstance(source, GFF.GFFTable):
+        batches = ((source, lo, hi) for lo, hi in _row_ranges(source, chunk_rows, format == 'bed12'))
+    else:
+        batches = ((table, 0, len(table)) for table in iter_tables(source, chunk_rows))
+    n = 0
+    # while recording (see wormtools.stats), reading batches, converting them and writing are timed apart
+    for table, lo, hi in stats.timed('gff2bed.read', batches, 'batches'):
+        with stats.timer('gff2bed.convert'):
+            if format == 'bed6':
+                lines = bed6_lines(table, lo, hi, features, name, prefix)
+            else:
+                lines = bed12_lines(table, lo, hi, name, prefix)
+            data = ''.join(lines).encode()
+        stats.count('gff2bed.convert', rows=hi - lo)
+        with stats.timer('gff2bed.write'):
+            out.write(data)
+        stats.count('gff2bed.write', lines=len(lines), bytes=len(data))
+        n += len(lines)
+    return n
+
+def main(argv=None):
+    args = get_args(argv)
+    with stats.recording(args):
+        out = open_output(args.output)
+        n = convert(args.gff, out, args.format, args.feature or None, args.name, args.prefix, cache=args.cache)
+        if out is sys.stdout.buffer:
+            out.flush()
+        else:
+            out.close()
+        print("wrote", n, "lines to", args.output or "standard output", file=sys.stderr)
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(prog="wormtools-gff2bed",
+        description="Convert a GFF/GTF to BED6 (a line per row) or BED12 (a line per transcript, a block per exon).")
+    parser.add_argument('gff', help="GFF/GTF file. Can be gzip or bgzip compressed, whatever its name.")
+    parser.add_argument('-o', '--output', metavar='FILE', help="Write to FILE instead of standard output, bgzip-compressed if it ends in .gz.")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='bed6', help="BED flavor (default %(default)s).")
+    parser.add_argument('-t', '--feature', action='append', default=[], metavar='FEATURE',
+        help="Only convert rows of FEATURE, such as gene. Can be repeated. bed6 only.")
+    parser.add_argument('-n', '--name', metavar='ATTRIBUTE',
+        help="Name lines by this attribute, such as gene_id (default: the feature for bed6, transcript_id for bed12).")
+    parser.add_argument('--prefix', default='chr', help="Prepended to seqnames in the BED (default %(default)s).")
+    parser.add_argument('--cache', action='store_true', help="Load the GFF through its cache (see wormtools.GFF.GFFCache) instead of streaming it.")
+    stats.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.feature and args.format != 'bed6':
+        parser.error("--feature only applies to bed6")
+    return args
+
+if __name__ == '__main__': main()
@@ -0,0 +1,173 @@
+"""
+Writing motif hits as they are generated, without holding them in memory.
+
+Hits are the tuples of motif.MotifScanner.iter_hits and friends: (start, end, sequence, strand),
+followed by a label for motif panels, or a score and a label for PWMs. Every writer takes the hits
+of one sequence at a time with write(seqname, hits) and returns how many it wrote.
+
+- 'text': the 'seqname start end strand sequence [score] [label]' lines of search_seq_motif.py
+- 'bed': BED6 lines of seqname, start, end, label (or the matched sequence), score (or 0), strand
+- 'npz': a NumPy .npz of one array per column, written by ColumnarHitWriter
+
+Text and BED lines are formatted a batch at a time and written to a binary file, compressed with
+bgzip (so it's also plain gzip) when the file name ends in .gz. The columnar writer streams each
+column to a temporary file, and only assembles the .npz when it is closed, so its memory stays flat too.
+"""
+import sys,os,tempfile,zipfile
+from itertools import islice
+import numpy as np
+from .bgzf import BgzfWriter
+
+FORMATS = ('text', 'bed', 'npz')
+
+# lines formatted before each write
+BATCH_SIZE = 1 << 14
+
+def open_output(filename):
+    """A binary file for writing: standard output for None or '-', bgzip-compressed for a .gz name"""
+    if filename is None or filename == '-':
+        return sys.stdout.buffer
+    if filename.endswith('.gz'):
+        return BgzfWriter(open(filename, 'wb'))
+    return open(filename, 'wb')
+
+def format_text(seqname, hit, score=False, label=False):
+    """
+    The space-separated line search_seq_motif.py has always printed, with the score (to 3 decimals) and label after.
+    >>> format_text('chrI', (9, 20, b'AGATAAGGAAT', '-', 7.5301, 'GATA1'), score=True, label=True)
+    'chrI 9 20 - AGATAAGGAAT 7.530 GATA1\\n'
+    """
+    fields = [seqname, str(hit[0]), str(hit[1]), hit[3], hit[2].decode()]
+    if score:
+        fields.append("%.3f" % hit[4])
+    if label:
+        fields.append(hit[-1])
+    return ' '.join(fields) + '\n'
+
+def format_bed(seqname, hit, score=False, label=False):
+    """
+    A BED6 line, named by the label if there is one and by the matched sequence otherwise.
+    A fasta header's description after the sequence name is left out.
+    >>> format_bed('chrI desc', (102, 108, b'AGATAA', '+'))
+    'chrI\\t102\\t108\\tAGATAA\\t0\\t+\\n'
+    """
+    name = hit[-1] if label else hit[2].decode()
+    return '%s\t%d\t%d\t%s\t%s\t%s\n' % (seqname.split(None, 1)[0], hit[0], hit[1], name, "%.3f" % hit[4] if score else '0', hit[3])
+
+class LineHitWriter:
+    """Hits as lines made by format (format_text or format_bed), written a batch at a time"""
+    def __init__(self, format, filename=None, score=False, label=False):
+        self.format = format
+        self.filename = filename
+        self.score = score
+        self.label = label
+        self._fh = open_output(filename)
+
+    def write(self, seqname, hits):
+        n = 0
+        hits = iter(hits)
+        while True:
+            lines = [self.format(seqname, hit, self.score, self.label) for hit in islice(hits, BATCH_SIZE)]
+            if not lines:
+                return n
+            self._fh.write(''.join(lines).encode())
+            n += len(lines)
+
+    def close(self):
+        if self._fh is sys.stdout.buffer:
+            self._fh.flush()
+        else:
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ColumnarHitWriter:
+    """
+    A .npz with the arrays seqname (index into the seqnames array), start, end, strand (1 or -1),
+    and label (index into labels) and score when the hits have them. Load it with numpy.load.
+    Matched sequences are left out; they are the reference sequence from start to end.
+    """
+    def __init__(self, filename, score=False, label=False, labels=()):
+        if filename is None or filename == '-':
+            raise Exception("the npz format has to be written to a file")
+        self.filename = filename
+        self.score = score
+        self.label = label
+        self.seqnames = []
+        self.labels = list(labels)
+        self._label_codes = dict((label, i) for i,label in enumerate(self.labels))
+        self._tmpdir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(filename)))
+        self.columns = [('seqname', np.uint32), ('start', np.int64), ('end', np.int64), ('strand', np.int8)]
+        if label:
+            self.columns.append(('label', np.uint32))
+        if score:
+            self.columns.append(('score', np.float64))
+        self._files = dict((name, open(os.path.join(self._tmpdir, name), 'wb')) for name,dtype in self.columns)
+        self._length = 0
+
+    def write(self, seqname, hits):
+        seq_code = len(self.seqnames)
+        self.seqnames.append(seqname)
+        n = 0
+        hits = iter(hits)
+        while True:
+            batch = list(islice(hits, BATCH_SIZE))
+            if not batch:
+                return n
+            columns = {'seqname': [seq_code] * len(batch),
+                       'start': [hit[0] for hit in batch],
+                       'end': [hit[1] for hit in batch],
+                       'strand': [1 if hit[3] == '+' else -1 for hit in batch]}
+            if self.label:
+                columns['label'] = [self._label_code(hit[-1]) for hit in batch]
+            if self.score:
+                columns['score'] = [hit[4] for hit in batch]
+            for name, dtype in self.columns:
+                np.array(columns[name], dtype=dtype).tofile(self._files[name])
+            n += len(batch)
+            self._length += len(batch)
+
+    def _label_code(self, label):
+        code = self._label_codes.get(label)
+        if code is None:
+            code = self._label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def close(self):
+        with zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_STORED, allowZip64=True) as npz:
+            for name, dtype in self.columns:
+                self._files[name].close()
+                path = os.path.join(self._tmpdir, name)
+                with npz.open(name + '.npy', 'w', force_zip64=True) as member, open(path, 'rb') as fh:
+                    np.lib.format.write_array_header_1_0(member, {'descr': np.dtype(dtype).str, 'fortran_order': False,
+                                                                   'shape': (self._length,)})
+                    while True:
+                        block = fh.read(1 << 20)
+                        if not block: break
+                        member.write(block)
+                os.remove(path)
+            for name, values in (('seqnames', self.seqnames), ('labels', self.labels)):
+                with npz.open(name + '.npy', 'w') as member:
+                    np.lib.format.write_array(member, np.array(values, dtype=str))
+        os.rmdir(self._tmpdir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def hit_writer(format, filename=None, score=False, label=False, labels=()):
+    """The writer of format ('text', 'bed' or 'npz') to filename, standard output by default"""
+    if format == 'text':
+        return LineHitWriter(format_text, filename, score, label)
+    if format == 'bed':
+        return LineHitWriter(format_bed, filename, score, label)
+    if format == 'npz':
+        return ColumnarHitWriter(filename, score, label, labels)
+    raise Exception("format must be one of %s, not %s" % (", ".join(FORMATS), format))
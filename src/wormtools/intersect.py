@@ -0,0 +1,246 @@
+"""
+Annotating motif hits with the regions and genes they fall in, streaming both inputs.
+
+The hits are the text or BED output of search_seq_motif.py, and the annotation the BED of
+wormtools-annotate, whose lines are named gene_id.label. Both are sorted by start within each
+seqname, so they are joined with a sweep line: walking down the hits of a seqname, the annotation
+is read just far enough to have every interval starting before the current hit ends, and intervals
+that end before the current hit starts are dropped, since no later hit can reach them. Only the
+intervals around the sweep line (as many as overlap there) are ever in memory, however many hits
+or intervals there are.
+
+Seqnames may come in a different order in the two files: when the hits move on to a seqname the
+annotation has already gone past, the annotation is opened again and read forward to it. Once it
+has been read to the end, the seqnames it has are known, and hits on any other are passed over
+without reading it again; they are reported when the join is done.
+
+The annotation's seqnames have the prefix wormtools-annotate gave them ('chr' by default), and
+fasta (or .2bit) seqnames such as WormBase's I, II, ... usually don't, so hit seqnames are looked
+up with the same prefix (which never appears in the output).
+
+Each hit line is written back with two more columns: the labels of the intervals it overlaps
+(comma-separated, in the order of annotate.LABELS) and the gene IDs (in order of position), or '.'
+for none. It is also the wormtools-annotate-hits command:
+$ search_seq_motif.py -f bed WGATAR c_elegans.2bit | wormtools-annotate-hits - genome.annotation.bed.gz
+"""
+import sys,argparse
+from . import io, stats
+from .annotate import LABELS
+from .hits import open_output, BATCH_SIZE
+
+# labels come out in annotation order, then any other names in alphabetical order
+_LABEL_ORDER = dict((label, i) for i, label in enumerate(LABELS))
+
+def _data_lines(fh):
+    # lines that aren't blank, comments or browser/track lines
+    for line in fh:
+        if line.startswith(('#', 'track', 'browser')) or line.isspace():
+            continue
+        yield line
+
+def read_hits(filename):
+    """
+    Generate (seqname, start, end, line) for each hit line of filename (standard output of another
+    command for '-'): search_seq_motif.py text lines, BED, or anything else starting with those three fields.
+    """
+    fh = sys.stdin if filename == '-' else io.open_text(filename)
+    try:
+        for line in _data_lines(fh):
+            fields = line.split(None, 3)
+            try:
+                start, end = int(fields[1]), int(fields[2])
+            except (ValueError, IndexError):
+                # text output keeps a fasta header's description, which -f bed leaves out
+                raise Exception("%s: expected seqname, start and end first, got: %s (search_seq_motif.py -f bed may help)"
+                                % (filename, line.strip()))
+            yield fields[0], start, end, line
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+class BedStream:
+    """
+    The intervals of a BED file (plain, gzip or bgzip) sorted by start within each seqname, read a
+    seqname at a time. Asking for a seqname the file has already gone past opens it again, so the
+    seqnames don't have to come in the same order as whatever is joined with it.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        # the seqnames read so far, all of them once the file has been read to the end
+        self.seqnames = set()
+        self.complete = False
+        self._fh = None
+        self._lines = iter(())
+        self._next = None
+        self._started = False
+
+    def _reopen(self):
+        self.close()
+        self._fh = io.open_text(self.filename)
+        self._lines = _data_lines(self._fh)
+        self._started = True
+        self._advance()
+
+    def _advance(self):
+        line = next(self._lines, None)
+        if line is None:
+            # every pass reads from the start, so this one has seen every seqname
+            self._next = None
+            self.complete = True
+            return
+        self._next = line.split('\t', 4)
+        self.seqnames.add(self._next[0])
+
+    def _skip_to(self, seqname):
+        # read forward to the first line of seqname, or to the end of the file
+        while self._next is not None and self._next[0] != seqname:
+            self._advance()
+        return self._next is not None
+
+    def intervals(self, seqname):
+        """Generate (start, end, name) for the lines of seqname, in file order, checking they are sorted by start"""
+        if self.complete and seqname not in self.seqnames:
+            return
+        if not self._started or not self._skip_to(seqname):
+            if self.complete and seqname not in self.seqnames:
+                return
+            self._reopen()
+            if not self._skip_to(seqname):
+                return
+        previous = 0
+        while self._next is not None and self._next[0] == seqname:
+            fields = self._next
+            start = int(fields[1])
+            if start < previous:
+                raise Exception("%s is not sorted by start: %s %d comes after %d" % (self.filename, seqname, start, previous))
+            previous = start
+            yield start, int(fields[2]), fields[3].rstrip('\n') if len(fields) > 3 else ''
+            self._advance()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def sweep_join(hits, bed, prefix=''):
+    """
+    Generate (hit, names) for each hit of hits, tuples starting with seqname, start and end, sorted
+    by start within each seqname. names are the names of the intervals of the BedStream bed that
+    share at least a base with the hit, in the order of their starts, prefix+seqname being its seqname.
+    """
+    seen = set()
+    seqname = None
+    for hit in hits:
+        start, end = hit[1], hit[2]
+        if hit[0] != seqname:
+            seqname = hit[0]
+            if seqname in seen:
+                raise Exception("the hits of %s don't all come together; sort hits by seqname and start" % seqname)
+            seen.add(seqname)
+            intervals = bed.intervals(prefix + seqname)
+            upcoming = next(intervals, None)
+            active = []
+            previous = start
+        if start < previous:
+            raise Exception("hits are not sorted by start: %s %d comes after %d" % (seqname, start, previous))
+        previous = start
+        if active:
+            # later hits start here or after, so what ends before this hit is done with
+            active = [interval for interval in active if interval[1] > start]
+        while upcoming is not None and upcoming[0] < end:
+            if upcoming[1] > start:
+                active.append(upcoming)
+            upcoming = next(intervals, None)
+        # a hit can end before one that started earlier
+        yield hit, [interval[2] for interval in active if interval[0] < end]
+
+def label_columns(names):
+    """
+    The labels and gene IDs columns of the gene_id.label names of the intervals a hit overlaps
+    >>> label_columns(['WBGene1.promoter', 'WBGene2.exonic', 'WBGene1.exonic'])
+    ('promoter,exonic', 'WBGene1,WBGene2')
+    >>> label_columns([])
+    ('.', '.')
+    """
+    if not names:
+        return '.', '.'
+    labels, genes = {}, {}
+    for name in names:
+        gene_id, dot, label = name.rpartition('.')
+        labels[label] = None
+        if gene_id:
+            genes[gene_id] = None
+    labels = sorted(labels, key=lambda label: (_LABEL_ORDER.get(label, len(LABELS)), label))
+    return ','.join(labels), ','.join(genes) or '.'
+
+def annotate_hits(hits_file, annotation_file, out, prefix='chr'):
+    """
+    Write each hit line of hits_file with the labels and gene IDs of the intervals of annotation_file
+    it overlaps to the binary file out, returning the number of hits and how many overlapped any.
+    Hit seqnames are looked up in the annotation with prefix in front, and those it doesn't have
+    are reported on standard error. Both files have to be sorted by start within each seqname.
+    """
+    n = overlapping = 0
+    lines = []
+    hit_seqnames = {}
+    # neighbouring hits mostly fall in the same regions
+    last_names, columns = None, None
+    with BedStream(annotation_file) as bed:
+        # while recording (see wormtools.stats), reading and joining is timed apart from writing
+        for hit, names in stats.timed('intersect.join', sweep_join(read_hits(hits_file), bed, prefix), 'hits'):
+            hit_seqnames[hit[0]] = None
+            if names != last_names:
+                last_names, columns = names, label_columns(names)
+            line = hit[3].rstrip('\n')
+            separator = '\t' if '\t' in line else ' '
+            lines.append(line + separator + separator.join(columns) + '\n')
+            n += 1
+            if names:
+                overlapping += 1
+            if len(lines) == BATCH_SIZE:
+                _write(out, lines)
+                lines = []
+        _write(out, lines)
+        missing = [seqname for seqname in hit_seqnames if bed.complete and prefix + seqname not in bed.seqnames]
+    if missing:
+        print("%s has no %s; no hits on %s were annotated (see --prefix)"
+              % (annotation_file, ", ".join(prefix + seqname for seqname in missing), ", ".join(missing)), file=sys.stderr)
+    return n, overlapping
+
+def _write(out, lines):
+    with stats.timer('intersect.write'):
+        data = ''.join(lines).encode()
+        out.write(data)
+    stats.count('intersect.write', lines=len(lines), bytes=len(data))
+
+def main(argv=None):
+    args = get_args(argv)
+    with stats.recording(args):
+        out = open_output(args.output)
+        n, overlapping = annotate_hits(args.hits, args.annotation, out, args.prefix)
+        if out is sys.stdout.buffer:
+            out.flush()
+        else:
+            out.close()
+        print("wrote", n, "hits,", overlapping, "in annotated regions, to", args.output or "standard output", file=sys.stderr)
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(prog="wormtools-annotate-hits",
+        description="Add the labels (promoter, exonic, intronic, downstream_flank) and gene IDs of the annotated regions "
+            "each motif hit overlaps as two more columns, '.' for none. Both inputs are streamed, and have to be "
+            "sorted by start within each seqname, as search_seq_motif.py and wormtools-annotate write them.")
+    parser.add_argument('hits', help="Hits from search_seq_motif.py, as text or BED lines, or '-' for standard input. Can be gzip or bgzip compressed, whatever its name.")
+    parser.add_argument('annotation', help="BED of regions named gene_id.label, as written by wormtools-annotate. Can be gzip or bgzip compressed, whatever its name.")
+    parser.add_argument('-o', '--output', metavar='FILE', help="Write to FILE instead of standard output, bgzip-compressed if it ends in .gz.")
+    parser.add_argument('--prefix', default='chr', help="Prepended to hit seqnames to find them in the annotation, as wormtools-annotate --prefix put it there (default %(default)s). "
+        "Use --prefix '' for hits already named like the annotation.")
+    stats.add_arguments(parser)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__': main()
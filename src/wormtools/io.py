@@ -0,0 +1,165 @@
+"""
+Opening plain, gzip and bgzip input, whatever the file is called.
+
+The compression of a file is told by its first bytes, not its extension: gzip members start with
+1f 8b, and bgzip ones also carry a 'BC' extra subfield (see bgzf). Every reader in wormtools
+opens its input here, so a fasta or GTF can be gzipped or bgzipped under any name.
+
+read_blocks generates the decompressed contents in blocks of about blocksize bytes, which is what
+the fasta reader consumes; open_binary and open_text wrap the same blocks as file objects for
+readers that go line by line. Plain gzip is inflated as one stream, in large reads. bgzip blocks
+are independent, so they are inflated in groups by a pool of threads (zlib releases the GIL while
+it inflates), with only a few groups ahead of the reader at any time.
+"""
+import io,os,zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import bgzf
+
+BLOCKSIZE = 1 << 20
+# compressed bytes read at a time
+READ_SIZE = 1 << 20
+# threads inflating bgzip blocks by default
+THREADS = min(4, os.cpu_count() or 1)
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+def detect(filename):
+    """
+    'bgzip', 'gzip' or 'plain', from the first bytes of filename
+    >>> import tempfile, gzip
+    >>> path = os.path.join(tempfile.mkdtemp(), 'reads.txt')
+    >>> with open(path, 'wb') as fh: n = fh.write(gzip.compress(b'ACGT'))
+    >>> detect(path)
+    'gzip'
+    """
+    with open(filename, 'rb') as fh:
+        header = fh.read(16)
+    if header[:2] != GZIP_MAGIC:
+        return 'plain'
+    if len(header) == 16 and header[2:4] == b'\x08\x04' and header[12:14] == b'BC':
+        return 'bgzip'
+    return 'gzip'
+
+def read_blocks(filename, blocksize=BLOCKSIZE, threads=None):
+    """
+    Generate the decompressed contents of filename (plain, gzip or bgzip) as bytes, in blocks of
+    at most blocksize. bgzip is inflated by threads threads (THREADS by default).
+    """
+    kind = detect(filename)
+    with open(filename, 'rb') as fh:
+        if kind == 'plain':
+            while True:
+                block = fh.read(blocksize)
+                if not block: return
+                yield block
+        chunks = _gzip_chunks(fh, blocksize) if kind == 'gzip' else _bgzip_chunks(fh, blocksize, threads or THREADS)
+        for chunk in chunks:
+            if len(chunk) <= blocksize:
+                if chunk: yield chunk
+                continue
+            # bgzip groups can come out a little larger than blocksize
+            for i in range(0, len(chunk), blocksize):
+                yield chunk[i:i + blocksize]
+
+def _gzip_chunks(fh, blocksize):
+    decompressor = zlib.decompressobj(31)
+    started = False
+    while True:
+        data = fh.read(READ_SIZE)
+        if not data: break
+        while data:
+            started = True
+            chunk = decompressor.decompress(data, blocksize)
+            if chunk:
+                yield chunk
+            if decompressor.eof:
+                # another member may follow, as in concatenated gzip files
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+                started = False
+            else:
+                data = decompressor.unconsumed_tail
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+    if started and not decompressor.eof:
+        raise Exception("%s ends in the middle of a gzip member" % fh.name)
+
+def _block_groups(fh, n):
+    # lists of n whole BGZF blocks (fewer at the end) of the file fh
+    rest = b''
+    group = []
+    while True:
+        data = fh.read(READ_SIZE)
+        buffer = rest + data
+        pos = 0
+        while pos + 18 <= len(buffer):
+            size = bgzf.block_size(buffer, pos)
+            if pos + size > len(buffer): break
+            group.append(buffer[pos:pos + size])
+            pos += size
+            if len(group) == n:
+                yield group
+                group = []
+        rest = buffer[pos:]
+        if not data:
+            if rest:
+                raise Exception("%s ends in the middle of a bgzip block" % fh.name)
+            if group:
+                yield group
+            return
+
+def _inflate_group(blocks):
+    return b''.join([bgzf.inflate_block(block, 0, len(block)) for block in blocks])
+
+def _bgzip_chunks(fh, blocksize, threads):
+    groups = _block_groups(fh, max(1, blocksize // bgzf.MAX_BLOCK_DATA))
+    if threads <= 1:
+        yield from map(_inflate_group, groups)
+        return
+    with ThreadPoolExecutor(threads) as pool:
+        pending = deque()
+        for group in groups:
+            pending.append(pool.submit(_inflate_group, group))
+            # a couple of groups per thread in flight, so memory stays flat
+            if len(pending) > 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class _BlockReader(io.RawIOBase):
+    # a raw binary stream over read_blocks
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self._block = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._block):
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._block = memoryview(block)
+        n = min(len(buffer), len(self._block))
+        buffer[:n] = self._block[:n]
+        self._block = self._block[n:]
+        return n
+
+    def close(self):
+        self._blocks.close()
+        super().close()
+
+def open_binary(filename, threads=None):
+    """A binary file object reading the decompressed contents of filename (plain, gzip or bgzip)"""
+    if detect(filename) == 'plain':
+        return open(filename, 'rb', buffering=BLOCKSIZE)
+    return io.BufferedReader(_BlockReader(read_blocks(filename, BLOCKSIZE, threads)), BLOCKSIZE)
+
+def open_text(filename, threads=None, encoding='utf-8'):
+    """A text file object reading the decompressed lines of filename (plain, gzip or bgzip)"""
+    if detect(filename) == 'plain':
+        return open(filename, encoding=encoding, buffering=BLOCKSIZE)
+    return io.TextIOWrapper(open_binary(filename, threads), encoding=encoding)
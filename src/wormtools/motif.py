@@ -0,0 +1,508 @@
+"""
+Scanning DNA sequences for IUPAC motifs on both strands.
+
+A motif is turned into a pair of regular expressions, for the motif and its reverse complement,
+and each is run over the sequence. Sequences are bytes, as read by wormtools.fasta.
+
+scan_parallel spreads the work over a process pool: across sequences, and inside long sequences
+across chunks that overlap by the motif's maximum match length. Matches found by different
+chunks are stitched together so the result is exactly the serial scan's, non-overlapping
+matches included.
+
+A panel of motifs, read with read_motifs, is scanned by MultiMotifScanner: each sequence is read
+once and every motif's own pattern is run over it in memory. The patterns are deliberately not
+merged into one regex of named groups: an alternation stops at the first motif that matches at a
+position, so getting every motif's hits back takes a zero-width lookahead tried at each position
+and further matches wherever several motifs hit, and re then loses the literal prefix search it
+does for each pattern alone. Such a combined scan gave the same hits but took 12 times as long on
+a panel of 5 motifs, and 7.6 times on 50 8-mers (2 Mb). What a panel saves is the reading and
+decompressing, which happens once per sequence; kept separate, each motif's hits are exactly
+those of a scan for that motif alone.
+
+The 'numpy' engine matches fixed-length motifs without regular expressions. The sequence is
+encoded once as an array of one-bit-per-base masks (A=1, C=2, G=4, T=8, anything else 0) and
+each motif position as the mask of the bases it allows; a position matches where the two share
+a bit. The shifted views of the sequence are tested one motif position at a time, most specific
+first, narrowing down an array of candidate starts, for the motif and its reverse complement
+alike. Overlapping matches are then dropped the way re.finditer would skip them, so both engines
+give the same hits. Motifs with ranges such as '{1,3}' always use the regex engine.
+"""
+import re,heapq
+from collections import deque
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+VALID_CHARS = 'ACGTKRWMYSBDHVN'
+
+CODES = { # use this to make a legal regex
+    'A':'A', 'C':'C', 'G':'G', 'T':'T',
+    'K': '[GT]', 'R': '[AG]', 'W': '[AT]',
+    'M': '[AC]', 'Y': '[CT]', 'S': '[GC]',
+    'B': '[CGT]', 'D': '[AGT]',
+    'H': '[ACT]', 'V': '[ACG]',
+    'N': '[ACGT]' }
+
+# translation tables for complementation
+DNA_COMPLEMENT = str.maketrans('ACGT','TGCA')
+MOTIF_COMPLEMENT = str.maketrans('ACGT' + 'KRWMYS' + 'BDHVN', 'TGCA' + 'MYWKRS' + 'VHDBN')
+
+# sequences shorter than this are never split into chunks
+MIN_CHUNK_SIZE = 1 << 20
+
+ENGINES = ('regex', 'numpy')
+
+# allowed bases of each IUPAC symbol as a bitmask, and the sequence encoding that goes with it
+BASE_MASKS = {'A': 1, 'C': 2, 'G': 4, 'T': 8}
+IUPAC_MASKS = dict((symbol, sum(BASE_MASKS[base] for base in CODES[symbol].strip('[]'))) for symbol in CODES)
+SEQUENCE_MASKS = np.zeros(256, dtype=np.uint8)
+for base, mask in BASE_MASKS.items():
+    SEQUENCE_MASKS[ord(base)] = mask
+# complementing swaps A with T and C with G, which reverses the four bits
+COMPLEMENT_MASKS = [int('{:04b}'.format(mask)[::-1], 2) for mask in range(16)]
+
+SINGLE_BASE_MASKS = set(BASE_MASKS.values())
+# positions tested against the whole sequence before switching to a list of candidate starts
+FULL_PASSES = 4
+
+def parse_motif(arg):
+    """
+    Divide an IUPAC motif into a list of (symbol,range). A range is like '{0,3}', or None.
+    >>> parse_motif('WGATA{1,2}R')
+    [('W', None), ('G', None), ('A', None), ('T', None), ('A', '{1,2}'), ('R', None)]
+    """
+    usr_motif = arg.upper()
+    motif = []
+    rangestr = ''
+
+    for c in usr_motif:
+        # add supported symbols
+        if c in VALID_CHARS:
+            if rangestr:
+                lc,r = motif[-1]
+                motif[-1] = (lc,rangestr)
+                rangestr = ''
+            motif.append((c,None))
+        # accumulate supported range character
+        elif c in '{},0123456789':
+            if not motif:
+                raise Exception("motif can't start with a range")
+            rangestr += c
+        else:
+            raise Exception("character " + c + " not a valid motif character")
+
+    # do the last one from the above loop
+    if rangestr:
+        lc,r = motif[-1]
+        motif[-1] = (lc,rangestr)
+
+    return motif
+
+def format_motif(arg):
+    """
+    Copy an IUPAC-specified motif into its reverse complement
+    and turn the two into legal regular expressions.
+    >>> format_motif('WGATAR')
+    ('[AT]GATA[AG]', '[CT]TATC[AT]')
+    >>> format_motif('GAT{2,3}')
+    ('GAT{2,3}', 'A{2,3}TC')
+    """
+    motif = parse_motif(arg)
+
+    # create the forward regular expression
+    regex_motif = ''
+    for char,ranges in motif:
+        regex_motif += CODES[char]
+        if ranges is not None:
+            regex_motif += ranges
+
+    revcmp_motif = ''
+
+    # create and add the reverse complemented regular expression
+    motif.reverse()
+    for char,ranges in motif:
+        revcmp_motif += CODES[ char.translate(MOTIF_COMPLEMENT) ]
+        if ranges is not None:
+            revcmp_motif += ranges
+
+    return regex_motif,revcmp_motif
+
+def motif_max_length(arg):
+    """
+    The longest match a motif can make, or None if a range like '{2,}' leaves it unbounded.
+    >>> motif_max_length('WGATAR'), motif_max_length('GAT{2,3}N{4}'), motif_max_length('GAT{2,}')
+    (6, 9, None)
+    """
+    length = 0
+    for char,ranges in parse_motif(arg):
+        if ranges is None:
+            length += 1
+            continue
+        bounds = ranges.strip('{}').split(',')
+        if not bounds[-1]:
+            return None
+        length += int(bounds[-1])
+    return length
+
+def motif_masks(arg):
+    """
+    The allowed-base mask of each position of a fixed-length motif, or None if a range like '{1,3}'
+    makes its length vary. Exact repeats like 'N{4}' are expanded.
+    >>> motif_masks('WGATAR'), motif_masks('GAN{2}'), motif_masks('GAT{1,3}')
+    ([9, 4, 1, 8, 1, 5], [4, 1, 15, 15], None)
+    """
+    masks = []
+    for char,ranges in parse_motif(arg):
+        repeat = 1
+        if ranges is not None:
+            bounds = ranges.strip('{}').split(',')
+            if len(bounds) > 1:
+                return None
+            repeat = int(bounds[0])
+        masks.extend([IUPAC_MASKS[char]] * repeat)
+    return masks
+
+def encode_sequence(seq):
+    """A bytes sequence as a uint8 array of base masks, for the numpy engine. Lower case and N encode as 0."""
+    return SEQUENCE_MASKS[np.frombuffer(seq, dtype=np.uint8)]
+
+def mask_match_starts(codes, masks):
+    """
+    Start of every position of encoded sequence codes where the motif masks match, overlapping matches included.
+    >>> mask_match_starts(encode_sequence(b'AAGATAGATAA'), motif_masks('GATA'))
+    array([2, 6])
+    """
+    n = len(codes) - len(masks) + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    # the most specific positions rule out the most starts, so test those first
+    order = sorted(range(len(masks)), key=lambda i: bin(masks[i]).count('1'))
+    ok = np.ones(n, dtype=bool)
+    test = np.empty(n, dtype=bool)
+    for i in order[:FULL_PASSES]:
+        if masks[i] in SINGLE_BASE_MASKS:
+            np.equal(codes[i:i+n], masks[i], out=test)
+        else:
+            np.not_equal(codes[i:i+n] & masks[i], 0, out=test)
+        ok &= test
+    del test
+    starts = np.flatnonzero(ok)
+    del ok
+    for i in order[FULL_PASSES:]:
+        starts = starts[(codes[starts + i] & masks[i]) != 0]
+    return starts
+
+def non_overlapping(starts, length):
+    """
+    The starts re.finditer would report: scanning left to right, a match is skipped if it
+    begins inside the previous one kept.
+    >>> non_overlapping(np.array([0, 1, 2, 5, 9]), 3).tolist()
+    [0, 5, 9]
+    """
+    if len(starts) < 2 or np.diff(starts).min() >= length:
+        return starts
+    kept = []
+    following = -1
+    for start in starts.tolist():
+        if start >= following:
+            kept.append(start)
+            following = start + length
+    return np.array(kept, dtype=np.int64)
+
+# hits are ordered by (start, end)
+_position = itemgetter(0, 1)
+
+def _iter_ints(array, blocksize=1 << 16):
+    # the values of a numpy array as Python ints, converting a block at a time
+    for i in range(0, len(array), blocksize):
+        yield from array[i:i + blocksize].tolist()
+
+def _labelled(hits, label):
+    for hit in hits:
+        yield hit + (label,)
+
+def expand_match(m, offset=0):
+    return m.start() + offset, m.end() + offset, m.string[m.start():m.end()]
+
+def read_motifs(filename):
+    """
+    Read a motif file: one motif per line, either the IUPAC motif alone or a label followed by the motif,
+    separated by whitespace. Blank lines and lines starting with '#' are skipped. Returns [(label, motif), ...].
+    """
+    motifs = []
+    with open(filename) as fh:
+        for line in fh:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'): continue
+            if len(fields) == 1:
+                motifs.append((fields[0], fields[0]))
+            elif len(fields) == 2:
+                motifs.append((fields[0], fields[1]))
+            else:
+                raise Exception("%s: expected 'motif' or 'label motif', got: %s" % (filename, line.strip()))
+    if not motifs:
+        raise Exception("no motifs in %s" % filename)
+    labels = [label for label,m in motifs]
+    if len(set(labels)) < len(labels):
+        raise Exception("%s: motif labels must be unique" % filename)
+    return motifs
+
+def chunk_ranges(length, jobs, max_length):
+    """
+    Split range(length) into [(start,end), ...] to be scanned separately, or one chunk if
+    max_length is None because matches are unbounded in length.
+    """
+    if max_length is None or length <= MIN_CHUNK_SIZE:
+        return [(0, length)]
+    size = max(MIN_CHUNK_SIZE, -(-length // jobs))
+    return [(start, min(start + size, length)) for start in range(0, length, size)]
+
+class MotifScanner:
+    """
+    The compiled forward and reverse complement patterns of a motif, for scanning bytes sequences.
+    >>> scanner = MotifScanner('WGATAR')
+    >>> scanner.scan(b'CCAGATAAGGTTATCTCC', offset=100)
+    [(102, 108, b'AGATAA', '+'), (110, 116, b'TTATCT', '-')]
+    """
+    def __init__(self, motif, label=None, engine='regex'):
+        if engine not in ENGINES:
+            raise Exception("engine must be one of %s, not %s" % (", ".join(ENGINES), engine))
+        self.motif = motif
+        self.label = motif if label is None else label
+        self.forward_pattern, self.reverse_pattern = format_motif(motif)
+        self.max_length = motif_max_length(motif)
+        # sequences are bytes
+        self.f_compiled = re.compile(self.forward_pattern.encode())
+        self.r_compiled = re.compile(self.reverse_pattern.encode())
+
+        # the numpy engine only handles fixed-length motifs
+        self.f_masks = motif_masks(motif) if engine == 'numpy' else None
+        if self.f_masks is None:
+            self.engine = 'regex'
+        else:
+            self.engine = 'numpy'
+            self.r_masks = [COMPLEMENT_MASKS[mask] for mask in reversed(self.f_masks)]
+
+    def spans(self, seq, codes=None):
+        """
+        (forward, reverse) lists of the (start,end) of every match of each strand's pattern.
+        codes is the encoded sequence, if the caller already has it, for the numpy engine.
+        """
+        if self.engine == 'regex':
+            return [m.span() for m in self.f_compiled.finditer(seq)], [m.span() for m in self.r_compiled.finditer(seq)]
+        length = len(self.f_masks)
+        return tuple([(start, start + length) for start in starts.tolist()] for starts in self._starts(seq, codes))
+
+    def _starts(self, seq, codes):
+        # numpy engine: arrays of the match starts on each strand
+        if codes is None:
+            codes = encode_sequence(seq)
+        length = len(self.f_masks)
+        return [non_overlapping(mask_match_starts(codes, masks), length) for masks in (self.f_masks, self.r_masks)]
+
+    def starts(self, seq, codes=None):
+        """
+        (forward, reverse) arrays of the start of every match on each strand, the hits scan would give.
+        The numpy engine makes no Python object per match; the regex engine still goes through its match objects.
+        """
+        if self.engine == 'numpy':
+            return tuple(self._starts(seq, codes))
+        return tuple(np.fromiter((m.start() for m in compiled.finditer(seq)), dtype=np.int64)
+                     for compiled in (self.f_compiled, self.r_compiled))
+
+    def count(self, seq, codes=None):
+        if self.engine == 'numpy':
+            return sum(len(starts) for starts in self._starts(seq, codes))
+        return len(self.f_compiled.findall(seq)) + len(self.r_compiled.findall(seq))
+
+    def scan(self, seq, offset=0):
+        """(start, end, matched sequence, strand) of every match, sorted by position, with offset added to positions"""
+        if self.engine == 'numpy':
+            return self.hits(seq, offset, *self.spans(seq))
+        f_result = [ expand_match(m, offset) + ('+',) for m in self.f_compiled.finditer(seq)]
+        r_result = [ expand_match(m, offset) + ('-',) for m in self.r_compiled.finditer(seq)]
+        result = f_result + r_result
+        result.sort(key=lambda a: (a[0],a[1]))
+        return result
+
+    def iter_hits(self, seq, offset=0, codes=None):
+        """
+        What scan gives, generated one hit at a time. The matches of each strand already come in
+        position order, so the two strands are merged lazily rather than collected and sorted.
+        """
+        if self.engine == 'numpy':
+            length = len(self.f_masks)
+            f_starts, r_starts = self._starts(seq, codes)
+            forward = ((s + offset, s + offset + length, seq[s:s + length], '+') for s in _iter_ints(f_starts))
+            reverse = ((s + offset, s + offset + length, seq[s:s + length], '-') for s in _iter_ints(r_starts))
+        else:
+            forward = (expand_match(m, offset) + ('+',) for m in self.f_compiled.finditer(seq))
+            reverse = (expand_match(m, offset) + ('-',) for m in self.r_compiled.finditer(seq))
+        # on ties merge takes from the first iterable first, like the stable sort of scan
+        return heapq.merge(forward, reverse, key=_position)
+
+    def hits(self, seq, offset, f_spans, r_spans):
+        """What scan gives, built from the (start,end) of the matches of each strand's pattern"""
+        result = [(s + offset, e + offset, seq[s:e], '+') for s,e in f_spans] + \
+                 [(s + offset, e + offset, seq[s:e], '-') for s,e in r_spans]
+        result.sort(key=lambda a: (a[0],a[1]))
+        return result
+
+    def chunks(self, length, jobs):
+        return chunk_ranges(length, jobs, self.max_length)
+
+class MultiMotifScanner:
+    """
+    A panel of (label, motif) scanned together. Hits carry the label of their motif as a fifth field,
+    and counts are a list in the order of the motifs. Each sequence is scanned once per motif and
+    strand in memory, not with one combined regex, which is slower (see the module docstring).
+    >>> scanner = MultiMotifScanner([('GATA', 'WGATAR'), ('Ebox', 'CANNTG')])
+    >>> scanner.scan(b'CCAGATAAGCACGTGTTATCTCC')
+    [(2, 8, b'AGATAA', '+', 'GATA'), (9, 15, b'CACGTG', '+', 'Ebox'), (9, 15, b'CACGTG', '-', 'Ebox'), (15, 21, b'TTATCT', '-', 'GATA')]
+    >>> scanner.count(b'CCAGATAAGCACGTGTTATCTCC')
+    [2, 2]
+    """
+    def __init__(self, motifs, engine='regex'):
+        self.scanners = [MotifScanner(motif, label, engine) for label,motif in motifs]
+        self.labels = [scanner.label for scanner in self.scanners]
+        lengths = [scanner.max_length for scanner in self.scanners]
+        self.max_length = None if None in lengths else max(lengths)
+
+    def _codes(self, seq):
+        # the numpy engine's encoding of seq, made once for all motifs
+        if any(scanner.engine == 'numpy' for scanner in self.scanners):
+            return encode_sequence(seq)
+        return None
+
+    def spans(self, seq):
+        codes = self._codes(seq)
+        return [scanner.spans(seq, codes) for scanner in self.scanners]
+
+    def starts(self, seq):
+        """MotifScanner.starts of each motif, in order"""
+        codes = self._codes(seq)
+        return [scanner.starts(seq, codes) for scanner in self.scanners]
+
+    def count(self, seq):
+        codes = self._codes(seq)
+        return [scanner.count(seq, codes) for scanner in self.scanners]
+
+    def scan(self, seq, offset=0):
+        """(start, end, matched sequence, strand, label) of every match of every motif, sorted by position"""
+        return self.hits(seq, offset, self.spans(seq))
+
+    def iter_hits(self, seq, offset=0):
+        """What scan gives, generated one hit at a time by lazily merging the hits of every motif"""
+        codes = self._codes(seq)
+        return heapq.merge(*[_labelled(scanner.iter_hits(seq, offset, codes), scanner.label) for scanner in self.scanners],
+                           key=_position)
+
+    def hits(self, seq, offset, spans):
+        """What scan gives, built from the (forward spans, reverse spans) of each motif"""
+        result = []
+        for scanner, (f_spans, r_spans) in zip(self.scanners, spans):
+            result.extend(hit + (scanner.label,) for hit in scanner.hits(seq, offset, f_spans, r_spans))
+        # stable, so hits at the same position stay in motif order
+        result.sort(key=lambda a: (a[0],a[1]))
+        return result
+
+    def chunks(self, length, jobs):
+        return chunk_ranges(length, jobs, self.max_length)
+
+# worker side of scan_parallel: compiled scanners, by motif, per process
+_worker_scanners = {}
+
+def _scan_chunk(motifs, engine, data, own_length):
+    """
+    For each of motifs, the matches (start,end) of each strand's pattern in data that start before own_length.
+    data extends past own_length by the longest motif's maximum length, so those matches are never cut short.
+    """
+    result = []
+    codes = encode_sequence(data) if engine == 'numpy' else None
+    for motif in motifs:
+        scanner = _worker_scanners.get((motif, engine))
+        if scanner is None:
+            scanner = _worker_scanners[(motif, engine)] = MotifScanner(motif, engine=engine)
+        for spans in scanner.spans(data, codes):
+            result.append([span for span in spans if span[0] < own_length])
+    return result
+
+def _stitch(compiled, seq, chunks, chunk_matches, max_length):
+    """
+    Join the matches of separately scanned chunks into exactly what one finditer over seq gives.
+    A chunk's scan starts fresh at its first position, but the serial scan may arrive there in the
+    middle of a match that started in the previous chunk. From that point the serial scan is
+    replayed with compiled.search until it finds a match the chunk also found; after that the
+    two are in step, and the rest of the chunk's matches are taken as they are.
+    """
+    stitched = []
+    position = 0 # where the serial scan searches next
+    for (start, end), matches in zip(chunks, chunk_matches):
+        if position <= start:
+            # nothing found in the previous chunks reaches into this one
+            taken = matches
+        else:
+            taken = []
+            index = dict((span, i) for i,span in enumerate(matches))
+            endpos = min(len(seq), end + max_length - 1)
+            while True:
+                m = compiled.search(seq, position, endpos)
+                if m is None or m.start() >= end:
+                    break
+                if m.span() in index:
+                    taken.extend(matches[index[m.span()]:])
+                    break
+                taken.append(m.span())
+                position = m.end() if m.end() > m.start() else m.end() + 1
+        stitched.extend(taken)
+        if taken:
+            last_start, last_end = taken[-1]
+            position = last_end if last_end > last_start else last_end + 1
+    return stitched
+
+def scan_parallel(motif, sequences, jobs, count=False, engine='regex'):
+    """
+    Scan (header, seq, offset) records with a pool of jobs processes, generating (header, seq, offset, result)
+    in input order, where result is what MotifScanner.scan(seq, offset) returns, or the number of matches if count.
+    motif may also be a list of (label, motif), and result then is what MultiMotifScanner gives.
+    engine is 'regex' or 'numpy', as for MotifScanner.
+    Up to jobs sequences are scanned at once, and long sequences are split into overlapping chunks.
+    """
+    single = isinstance(motif, str)
+    if single:
+        scanner = MotifScanner(motif, engine=engine)
+        scanners = [scanner]
+    else:
+        scanner = MultiMotifScanner(motif, engine)
+        scanners = scanner.scanners
+    motifs = tuple(s.motif for s in scanners)
+    pending = deque()
+
+    def finish(header, seq, offset, chunks, futures):
+        chunk_results = [f.result() for f in futures]
+        spans = []
+        for i, compiled in enumerate(c for s in scanners for c in (s.f_compiled, s.r_compiled)):
+            # chunk matches are relative to the chunk start
+            chunk_matches = [[(s + start, e + start) for s,e in r[i]] for (start, end), r in zip(chunks, chunk_results)]
+            spans.append(_stitch(compiled, seq, chunks, chunk_matches, scanner.max_length or 0))
+        # (forward, reverse) per motif
+        spans = list(zip(spans[0::2], spans[1::2]))
+        if count:
+            counts = [len(f) + len(r) for f,r in spans]
+            return header, seq, offset, counts[0] if single else counts
+        if single:
+            return header, seq, offset, scanner.hits(seq, offset, *spans[0])
+        return header, seq, offset, scanner.hits(seq, offset, spans)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for header, seq, offset in sequences:
+            chunks = scanner.chunks(len(seq), jobs)
+            overhang = (scanner.max_length or 1) - 1
+            futures = [pool.submit(_scan_chunk, motifs, engine, seq[start:end + overhang], end - start) for start,end in chunks]
+            pending.append((header, seq, offset, chunks, futures))
+            # keep the pool busy with the next sequences while the oldest finishes
+            while len(pending) > jobs:
+                yield finish(*pending.popleft())
+
+        while pending:
+            yield finish(*pending.popleft())
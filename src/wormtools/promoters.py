@@ -0,0 +1,170 @@
+"""
+Promoters, TSSs and TESs of every transcript at once, as columns of NumPy arrays.
+
+transcript_ends finds the 5' end (TSS) and 3' end (TES) of each transcript: the start of its
+first exon on '+' and the end of its last exon on '-' for the TSS, the other way around for the
+TES. Only '+' transcripts are taken as forward, here and in flanks, as in Gene.get_promoters and
+wormtools.annotate, so '.' ones are placed as on '-'. From a GFFTable (or a GTF, through its
+GFFCache) that is a few reductions over the exon rows, without any Gene objects.
+
+flanks turns the ends into Regions around them, upstream and downstream on each transcript's
+own strand, clipped to the chromosome, and with transcripts sharing a region listed together
+on one. fetch_sequences then reads all of their sequences from a fasta, reverse complemented
+on '-', so scanning promoters for motifs starts with
+>>> regions, seqs = promoter_sequences('c_elegans.gtf', 'c_elegans.fa', upstream=1000)  # doctest: +SKIP
+
+Regions are 0-based and half-open, like BED.
+"""
+from collections import namedtuple
+import numpy as np
+from . import GFF
+from .fasta import open_indexed, reverse_complement
+
+# per transcript: TSS and TES are 1-based positions
+TranscriptEnds = namedtuple('TranscriptEnds', ['seqname', 'strand', 'tss', 'tes', 'gene_id', 'transcript_id'])
+
+# per region: name is 'gene_id|transcript_id', comma-separated for every transcript sharing the region
+Regions = namedtuple('Regions', ['seqname', 'start', 'end', 'strand', 'name'])
+
+def transcript_ends(source):
+    """
+    The TranscriptEnds of every transcript of source: a GTF file name, a GFF.GFFTable, or GFF.Gene objects.
+    Transcripts without exons use their own start and end.
+    """
+    if isinstance(source, str):
+        source = GFF.read_table(source)
+    if isinstance(source, GFF.GFFTable):
+        return _table_ends(source)
+    return _gene_ends(source)
+
+def _gene_ends(genes):
+    seqnames, strands, tss, tes, gene_ids, transcript_ids = [], [], [], [], [], []
+    for gene in genes:
+        for transcript in gene.transcripts:
+            exons = transcript.features('exon')
+            # leftmost exon start and rightmost exon end, as _table_ends takes them
+            if exons:
+                left, right = min(exon['start'] for exon in exons), max(exon['end'] for exon in exons)
+            else:
+                left, right = transcript.start, transcript.end
+            five, three = (left, right) if transcript.strand == '+' else (right, left)
+            seqnames.append(gene.seqname)
+            strands.append(transcript.strand)
+            tss.append(five)
+            tes.append(three)
+            gene_ids.append(gene.gene_id)
+            transcript_ids.append(transcript.transcript_id)
+    return TranscriptEnds(np.array(seqnames, dtype=str), np.array(strands, dtype=str), np.array(tss, dtype=np.int64),
+                          np.array(tes, dtype=np.int64), np.array(gene_ids, dtype=str), np.array(transcript_ids, dtype=str))
+
+def _table_ends(table):
+    hierarchy = table.hierarchy()
+    transcript_rows = hierarchy.transcript_rows
+    starts = np.asarray(table.start).astype(np.int64)
+    ends = np.asarray(table.end).astype(np.int64)
+
+    # leftmost exon start and rightmost exon end of each transcript; exon rows come grouped by transcript
+    exon_code = table.name.code('exon')
+    exon_rows = np.flatnonzero((np.asarray(table.name.codes) == exon_code) & (hierarchy.row_transcript >= 0))
+    exon_transcript = hierarchy.row_transcript[exon_rows]
+    left = starts[transcript_rows].copy()
+    right = ends[transcript_rows].copy()
+    if len(exon_rows):
+        first = np.flatnonzero(np.r_[True, exon_transcript[1:] != exon_transcript[:-1]])
+        with_exons = exon_transcript[first]
+        left[with_exons] = np.minimum.reduceat(starts[exon_rows], first)
+        right[with_exons] = np.maximum.reduceat(ends[exon_rows], first)
+
+    strand = np.array(table.strand.levels, dtype=str)[np.asarray(table.strand.codes)[transcript_rows]]
+    forward = strand == '+'
+    # '' for transcripts the hierarchy couldn't place in a gene (-1)
+    gene_ids = np.array([''] + hierarchy.gene_ids.tolist(), dtype=str)[hierarchy.transcript_gene + 1]
+    seqname = np.array(table.seqname.levels, dtype=str)[np.asarray(table.seqname.codes)[transcript_rows]]
+    return TranscriptEnds(seqname, strand, np.where(forward, left, right), np.where(forward, right, left),
+                          gene_ids, hierarchy.transcript_ids)
+
+def flanks(ends, site='tss', upstream=1000, downstream=0, chrom_sizes=None, unique=True):
+    """
+    Regions of the TranscriptEnds ends around each transcript's site ('tss' or 'tes'): upstream bases
+    before it and downstream bases from it on, on the transcript's strand. upstream=0, downstream=1 is
+    the site itself. Regions are clipped to 0 and to chrom_sizes (a dict of lengths, or an open genome)
+    where it has the seqname, and empty ones dropped. With unique, transcripts with the same region are
+    listed in the name of a single one, and regions are sorted by seqname, start, end and strand.
+    >>> ends = TranscriptEnds(np.array(['I', 'I', 'I']), np.array(['+', '+', '-']), np.array([50, 50, 900]),
+    ...                       np.array([400, 300, 600]), np.array(['g1', 'g1', 'g2']), np.array(['t1', 't2', 't3']))
+    >>> regions = flanks(ends, upstream=100, downstream=10, chrom_sizes={'I': 905})
+    >>> for region in zip(*(column.tolist() for column in regions)): print(region)
+    ('I', 0, 59, '+', 'g1|t1,g1|t2')
+    ('I', 890, 905, '-', 'g2|t3')
+    """
+    if site not in ('tss', 'tes'):
+        raise Exception("site must be 'tss' or 'tes', not %s" % site)
+    position = (ends.tss if site == 'tss' else ends.tes) - 1
+    forward = ends.strand == '+'
+    start = np.where(forward, position - upstream, position + 1 - downstream)
+    end = np.where(forward, position + downstream, position + 1 + upstream)
+
+    start = np.maximum(start, 0)
+    if chrom_sizes is not None:
+        if not isinstance(chrom_sizes, dict):
+            # an IndexedFasta or TwoBitFile
+            chrom_sizes = dict((name, chrom_sizes.length(name)) for name in chrom_sizes.names)
+        sizes = np.array([chrom_sizes.get(seqname, -1) for seqname in ends.seqname.tolist()], dtype=np.int64)
+        end = np.where(sizes >= 0, np.minimum(end, sizes), end)
+    keep = start < end
+    names = np.char.add(np.char.add(ends.gene_id, '|'), ends.transcript_id)
+    regions = Regions(ends.seqname[keep], start[keep], end[keep], ends.strand[keep], names[keep])
+    return unique_regions(regions) if unique else regions
+
+def unique_regions(regions):
+    """Regions with the names of identical regions joined by commas, sorted by seqname, start, end and strand"""
+    order = np.lexsort((regions.name, regions.strand, regions.end, regions.start, regions.seqname))
+    seqname, start, end, strand, name = (column[order] for column in regions)
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (seqname[1:] != seqname[:-1]) | (start[1:] != start[:-1]) | (end[1:] != end[:-1]) | (strand[1:] != strand[:-1])
+    bounds = np.append(np.flatnonzero(first), len(order)).tolist()
+    names = name.tolist()
+    joined = np.array([','.join(names[a:b]) for a, b in zip(bounds[:-1], bounds[1:])], dtype=str)
+    return Regions(seqname[first], start[first], end[first], strand[first], joined)
+
+def promoters(source, upstream=1000, downstream=0, chrom_sizes=None, unique=True):
+    """Promoter Regions of the transcripts of source (see transcript_ends): upstream of each TSS, and downstream into it"""
+    return flanks(transcript_ends(source), 'tss', upstream, downstream, chrom_sizes, unique)
+
+def tss(source, chrom_sizes=None, unique=True):
+    """One-base Regions of the TSSs of the transcripts of source"""
+    return flanks(transcript_ends(source), 'tss', 0, 1, chrom_sizes, unique)
+
+def tes(source, chrom_sizes=None, unique=True):
+    """One-base Regions of the TESs of the transcripts of source"""
+    return flanks(transcript_ends(source), 'tes', 0, 1, chrom_sizes, unique)
+
+def fetch_sequences(regions, fasta, prefix=''):
+    """
+    The sequences of Regions as a list of bytes, reverse complemented on '-', from fasta: the name of
+    a plain or bgzip-compressed fasta or of a .2bit file, or an IndexedFasta or TwoBitFile. prefix is put before the seqnames of regions
+    to match the fasta's (such as 'chr'). Regions running past the end of their sequence are cut short.
+    """
+    if isinstance(fasta, str):
+        with open_indexed(fasta) as fa:
+            return fetch_sequences(regions, fa, prefix)
+    missing = set(prefix + seqname for seqname in np.unique(regions.seqname).tolist()) - set(fasta.names)
+    if missing:
+        raise Exception("regions on sequences not in %s: %s" % (fasta.filename, ", ".join(sorted(missing))))
+    seqs = []
+    for seqname, start, end, strand in zip(regions.seqname.tolist(), regions.start.tolist(), regions.end.tolist(), regions.strand.tolist()):
+        seq = fasta.fetch(prefix + seqname, start, end)
+        seqs.append(reverse_complement(seq) if strand == '-' else seq)
+    return seqs
+
+def promoter_sequences(source, fasta, upstream=1000, downstream=0, unique=True, prefix=''):
+    """(Regions, sequences) of the promoters of source, clipped to the chromosomes of fasta and read from it"""
+    with open_indexed(fasta) as fa:
+        sizes = dict((name[len(prefix):], fa.length(name)) for name in fa.names if name.startswith(prefix))
+        regions = promoters(source, upstream, downstream, sizes, unique)
+        return regions, fetch_sequences(regions, fa, prefix)
+
+def bed_lines(regions, prefix='chr'):
+    """BED6 lines of Regions: prefix+seqname, start, end, name, 0, strand"""
+    return ["%s%s\t%d\t%d\t%s\t0\t%s\n" % (prefix, seqname, start, end, name, strand) for seqname, start, end, strand, name
+            in zip(regions.seqname.tolist(), regions.start.tolist(), regions.end.tolist(), regions.strand.tolist(), regions.name.tolist())]
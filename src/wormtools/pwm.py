@@ -0,0 +1,296 @@
+"""
+Position weight matrices: reading JASPAR and MEME motif files, and scoring sequences with them.
+
+A matrix of base counts is turned into log-odds scores, log2 of the probability of each base at
+each position over its background probability. A sequence is encoded once as integers (A=0, C=1,
+G=2, T=3, anything else 4), and every three consecutive codes are combined into one triplet code
+(0 to 124). The matrix is cut into groups of three positions, each summed into a table of 125
+scores, so the score of every window is the sum of one table lookup per group by a shifted view of
+the triplet codes: a third of the lookups of scoring position by position. The reverse strand is
+scored from the same codes with the reverse complement matrix. Windows containing an N (or a
+soft-masked base, if the sequence wasn't upper-cased) score -inf, so they never pass a cutoff.
+
+Windows are scored a block at a time, so memory is the sequence, its codes and a few blocks of
+scores, whatever the length of the chromosome.
+
+A p-value cutoff is turned into a score threshold with the exact distribution of scores of random
+background sequence, computed by dynamic programming over scores rounded to SCORE_RESOLUTION.
+"""
+import re,heapq
+from operator import itemgetter
+import numpy as np
+
+BASES = 'ACGT'
+UNIFORM = (0.25, 0.25, 0.25, 0.25)
+
+# sequence bytes to row indexes of a score matrix; 4 is the -inf column
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for i, base in enumerate(BASES):
+    BASE_CODES[ord(base)] = i
+
+# windows scored at once
+BLOCK_SIZE = 1 << 20
+# score rounding of the p-value computation
+SCORE_RESOLUTION = 0.01
+DEFAULT_PVALUE = 1e-4
+
+def encode_sequence(seq):
+    """
+    A bytes sequence as a uint8 array of triplet codes, 25*a + 5*b + c for the base codes a, b, c
+    (A=0 C=1 G=2 T=3, 4 for anything else) of each position and the two following it.
+    The sequence is padded with two A's, which only ever meet the zero scores past the end of a matrix.
+    >>> encode_sequence(b'ACGTN').tolist()
+    [7, 38, 69, 95, 100]
+    """
+    codes = np.zeros(len(seq) + 2, dtype=np.uint8)
+    codes[:len(seq)] = BASE_CODES[np.frombuffer(seq, dtype=np.uint8)]
+    triplets = codes[:-2] * 25
+    triplets += codes[1:-1] * 5
+    triplets += codes[2:]
+    return triplets
+
+def triplet_tables(scores):
+    """The rows of a score matrix summed in groups of three into tables indexed by triplet code"""
+    rows = list(scores)
+    while len(rows) % 3:
+        rows.append(np.zeros(5))
+    return [(a[:, None, None] + b[None, :, None] + c[None, None, :]).ravel() for a, b, c in zip(rows[0::3], rows[1::3], rows[2::3])]
+
+class PWM:
+    """
+    A motif as a matrix of base counts, rows for positions and columns for A, C, G and T, scored as log-odds.
+    pseudocount is spread over the bases in proportion to the background, and must be positive
+    for every base to have a finite score.
+    >>> pwm = PWM('GATA', [[0, 0, 9, 1], [9, 0, 0, 1], [0, 0, 0, 10], [10, 0, 0, 0]])
+    >>> pwm.length, round(pwm.max_score, 2)
+    (4, 7.3)
+    >>> [(start, end, seq, strand, round(score, 2)) for start, end, seq, strand, score in pwm.scan(b'CCGATACCTATCC', threshold=5)]
+    [(2, 6, b'GATA', '+', 7.3), (8, 12, b'TATC', '-', 7.3)]
+    >>> pwm.pvalue_threshold(0.01), pwm.pvalue_threshold(0.0001) # a 4 bp window can't be rarer than 1/256
+    (4.4, inf)
+    """
+    def __init__(self, name, counts, background=UNIFORM, pseudocount=1.0, motif_id=None):
+        self.name = name
+        self.motif_id = name if motif_id is None else motif_id
+        self.counts = np.asarray(counts, dtype=np.float64)
+        if self.counts.ndim != 2 or self.counts.shape[1] != 4:
+            raise Exception("%s: a matrix needs 4 columns, one per base, not shape %s" % (name, self.counts.shape))
+        self.background = np.asarray(background, dtype=np.float64)
+        self.length = len(self.counts)
+
+        background = self.background / self.background.sum()
+        probabilities = (self.counts + pseudocount * background) / (self.counts.sum(axis=1)[:, None] + pseudocount)
+        with np.errstate(divide='ignore'):
+            log_odds = np.log2(probabilities / background)
+        # the fifth column scores anything that isn't A, C, G or T
+        self.scores = np.hstack([log_odds, np.full((self.length, 1), -np.inf)])
+        # complementing reverses the A,C,G,T columns, and the motif is read backwards
+        self.rc_scores = self.scores[::-1][:, [3, 2, 1, 0, 4]]
+        self.tables = triplet_tables(self.scores)
+        self.rc_tables = triplet_tables(self.rc_scores)
+        self.max_score = float(log_odds.max(axis=1).sum())
+        self.min_score = float(log_odds.min(axis=1).sum())
+
+    def window_scores(self, codes, start, stop, tables=None):
+        """Score of each window of encoded sequence codes starting at start up to stop, from triplet_tables"""
+        if tables is None:
+            tables = self.tables
+        total = np.take(tables[0], codes[start:stop])
+        lookup = np.empty(stop - start)
+        for group, table in enumerate(tables[1:], 1):
+            np.take(table, codes[start + 3*group:stop + 3*group], out=lookup)
+            total += lookup
+        return total
+
+    def scan_spans(self, seq, threshold, codes=None):
+        """
+        [(start, score), ...] of the windows of seq scoring at least threshold, on the forward and on
+        the reverse strand. codes is the encoded sequence, if the caller already has it.
+        """
+        found = [], []
+        for strand, starts, scores in self._passing(seq, threshold, codes):
+            found[strand].extend(zip(starts.tolist(), scores.tolist()))
+        return found
+
+    def scan_starts(self, seq, threshold, codes=None):
+        """(forward, reverse) arrays of the starts of the windows scan_spans gives, without their scores"""
+        found = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for strand, starts, scores in self._passing(seq, threshold, codes):
+            found[strand].append(starts)
+        return np.concatenate(found[0]), np.concatenate(found[1])
+
+    def _passing(self, seq, threshold, codes):
+        # (strand, starts, scores) of the windows scoring at least threshold, a block at a time,
+        # strand 0 for the forward strand and 1 for the reverse
+        if codes is None:
+            codes = encode_sequence(seq)
+        n = len(seq) - self.length + 1
+        for start in range(0, max(n, 0), BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, n)
+            for strand, tables in enumerate((self.tables, self.rc_tables)):
+                block = self.window_scores(codes, start, stop, tables)
+                hits = np.flatnonzero(block >= threshold)
+                yield strand, hits + start, block[hits]
+
+    def scan(self, seq, offset=0, threshold=None, codes=None):
+        """
+        (start, end, sequence, strand, score) of every window of seq scoring at least threshold on either strand,
+        sorted by position. The threshold defaults to the score with a p-value of DEFAULT_PVALUE.
+        """
+        if threshold is None:
+            threshold = self.pvalue_threshold(DEFAULT_PVALUE)
+        return self.hits(seq, offset, *self.scan_spans(seq, threshold, codes))
+
+    def hits(self, seq, offset, forward, reverse):
+        length = self.length
+        result = [(s + offset, s + offset + length, seq[s:s + length], '+', score) for s, score in forward] + \
+                 [(s + offset, s + offset + length, seq[s:s + length], '-', score) for s, score in reverse]
+        result.sort(key=lambda a: (a[0], a[1]))
+        return result
+
+    def score_distribution(self):
+        """
+        (scores, probabilities) of every possible score of a window of random background sequence,
+        scores rounded to SCORE_RESOLUTION, in increasing order.
+        """
+        background = self.background / self.background.sum()
+        steps = np.round(self.scores[:, :4] / SCORE_RESOLUTION).astype(np.int64)
+        probabilities = np.ones(1)
+        lowest = 0
+        for row in steps:
+            low = row.min()
+            spread = np.zeros(len(probabilities) + row.max() - low)
+            for base in range(4):
+                shift = row[base] - low
+                spread[shift:shift + len(probabilities)] += background[base] * probabilities
+            probabilities = spread
+            lowest += low
+        return (lowest + np.arange(len(probabilities))) * SCORE_RESOLUTION, probabilities
+
+    def pvalue_threshold(self, pvalue):
+        """The lowest score a window of random background sequence reaches with probability at most pvalue"""
+        scores, probabilities = self.score_distribution()
+        # probability of scoring at least each score
+        tail = np.cumsum(probabilities[::-1])[::-1]
+        passing = np.flatnonzero(tail <= pvalue)
+        if not len(passing):
+            # even the best score is more likely than pvalue: nothing passes
+            return float('inf')
+        # scores were rounded, so allow for the rounding of each position
+        return float(scores[passing[0]]) - self.length * SCORE_RESOLUTION / 2
+
+class PWMScanner:
+    """
+    A set of PWMs, each with its score threshold, scanned together like motif.MultiMotifScanner.
+    Hits are (start, end, sequence, strand, score, name); counts are a list in the order of the matrices.
+    thresholds are scores, or if pvalue is given instead, derived from it for each matrix.
+    """
+    def __init__(self, pwms, thresholds=None, pvalue=DEFAULT_PVALUE):
+        self.pwms = list(pwms)
+        self.labels = [pwm.name for pwm in self.pwms]
+        if thresholds is None:
+            thresholds = [pwm.pvalue_threshold(pvalue) for pwm in self.pwms]
+        elif np.isscalar(thresholds):
+            thresholds = [thresholds] * len(self.pwms)
+        self.thresholds = list(thresholds)
+
+    def scan(self, seq, offset=0):
+        codes = encode_sequence(seq)
+        result = []
+        for pwm, threshold in zip(self.pwms, self.thresholds):
+            spans = pwm.scan_spans(seq, threshold, codes)
+            result.extend(hit + (pwm.name,) for hit in pwm.hits(seq, offset, *spans))
+        # stable, so hits at the same position stay in matrix order
+        result.sort(key=lambda a: (a[0], a[1]))
+        return result
+
+    def iter_hits(self, seq, offset=0):
+        """What scan gives, merging the (thresholded, so short) hit lists of the matrices lazily"""
+        codes = encode_sequence(seq)
+        hits = []
+        for pwm, threshold in zip(self.pwms, self.thresholds):
+            spans = pwm.scan_spans(seq, threshold, codes)
+            hits.append([hit + (pwm.name,) for hit in pwm.hits(seq, offset, *spans)])
+        return heapq.merge(*hits, key=itemgetter(0, 1))
+
+    def starts(self, seq):
+        """PWM.scan_starts of each matrix at its threshold, in order"""
+        codes = encode_sequence(seq)
+        return [pwm.scan_starts(seq, threshold, codes) for pwm, threshold in zip(self.pwms, self.thresholds)]
+
+    def count(self, seq):
+        codes = encode_sequence(seq)
+        return [sum(len(spans) for spans in pwm.scan_spans(seq, threshold, codes))
+                for pwm, threshold in zip(self.pwms, self.thresholds)]
+
+def read_jaspar(filename, background=UNIFORM, pseudocount=1.0):
+    """
+    Read the matrices of a JASPAR file: a '>ID name' line, then one row of counts per base, like
+    'A  [ 3 0 12 ]', or plain rows of counts in A, C, G, T order. A file without header lines holds one matrix.
+    """
+    matrices = []
+    header, rows = None, []
+    with open(filename) as fh:
+        for line in list(fh) + ['>']:
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            if line.startswith('>'):
+                if rows:
+                    matrices.append((header, rows))
+                header, rows = line[1:].split(), []
+                continue
+            fields = line.replace('[', ' ').replace(']', ' ').split()
+            base = None
+            if fields[0].upper() in BASES:
+                base = fields.pop(0).upper()
+            rows.append((base, [float(x) for x in fields]))
+
+    pwms = []
+    for header, rows in matrices:
+        motif_id = header[0] if header else filename
+        name = header[1] if header and len(header) > 1 else motif_id
+        if len(rows) != 4:
+            raise Exception("%s: matrix %s has %d rows, expected one per base" % (filename, motif_id, len(rows)))
+        by_base = dict((base or BASES[i], counts) for i, (base, counts) in enumerate(rows))
+        counts = np.array([by_base[base] for base in BASES]).T
+        pwms.append(PWM(name, counts, background, pseudocount, motif_id))
+    return pwms
+
+def read_meme(filename, pseudocount=1.0):
+    """
+    Read the matrices of a MEME (minimal) motif file. Letter probabilities are turned back into counts
+    with the matrix's nsites (20 if missing), and the file's background letter frequencies are used if given.
+    """
+    background = UNIFORM
+    found = []
+    motif_id = name = None
+    with open(filename) as fh:
+        lines = iter(fh)
+        for line in lines:
+            if line.startswith('Background letter frequencies'):
+                fields = next(lines).split()
+                frequencies = dict(zip(fields[0::2], map(float, fields[1::2])))
+                background = tuple(frequencies[base] for base in BASES)
+            elif line.startswith('MOTIF'):
+                fields = line.split()
+                motif_id = fields[1]
+                name = fields[2] if len(fields) > 2 else motif_id
+            elif line.startswith('letter-probability matrix'):
+                params = dict(re.findall(r'(\w+)=\s*(\S+)', line))
+                width = int(params['w'])
+                nsites = float(params.get('nsites', 20))
+                rows = []
+                while len(rows) < width:
+                    fields = next(lines).split()
+                    if fields:
+                        rows.append([float(x) for x in fields])
+                found.append((motif_id, name, np.array(rows) * nsites))
+    return [PWM(name, counts, background, pseudocount, motif_id) for motif_id, name, counts in found]
+
+def read_matrices(filename, pseudocount=1.0):
+    """Read a MEME or a JASPAR motif file, telling them apart by the 'MEME version' line MEME files start with"""
+    with open(filename) as fh:
+        is_meme = 'MEME version' in fh.read(4096)
+    if is_meme:
+        return read_meme(filename, pseudocount)
+    return read_jaspar(filename, pseudocount=pseudocount)
@@ -0,0 +1,270 @@
+"""
+Timing and counting the stages of a run, to see where the time goes.
+
+Recording is off unless a Stats is enabled, and costs nothing then: the places that report to it
+(reading fasta blocks, parsing fasta records, loading GFF tables, assembling genes, scanning for
+motifs, converting GFFs to BED, joining hits with annotations, writing hits and annotations)
+check once per block, batch, sequence or file whether one is, and GFFParser.parseLine and
+parseAttr are only swapped for timing wrappers while it is.
+
+Each stage has a number of calls, the seconds spent in it, and counts such as bytes, lines or hits.
+Times are exclusive: a stage running inside another (parseLine inside gene assembly, or reading
+blocks inside parsing records) is taken out of the outer one, so the stages add up to the time
+recorded, and what's left of the wall time is spent elsewhere. Timing every call of a per-line
+function slows it down, so rates for parseLine and parseAttr are lower than without recording.
+Work done in worker processes (--jobs) isn't recorded, only the time spent waiting for it.
+
+>>> recorder = enable()
+>>> with timer('demo.sum'):
+...     total = sum(range(1000))
+>>> count('demo.sum', numbers=1000)
+>>> recorder.stages['demo.sum'].counts
+{'numbers': 1000}
+>>> disable() is recorder, current is None
+(True, True)
+
+Commands (search_seq_motif.py, wormtools-annotate, wormtools-gff2bed, wormtools-annotate-hits) take
+--stats to print the breakdown when they finish, --profile FILE to write it as JSON, and
+--progress SECONDS to report counts so far on long runs (see add_arguments):
+$ wormtools-annotate --stats -o genome.annotation.bed.gz c_elegans.PRJNA13758.WS261.canonical_geneset.gtf
+"""
+import sys,time,json
+from contextlib import contextmanager, nullcontext
+
+# the Stats being recorded to, if any
+current = None
+
+class Stage:
+    """The calls, exclusive seconds and counts of one stage"""
+    __slots__ = ('name', 'calls', 'seconds', 'counts')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.counts = {}
+
+    def add(self, counts):
+        for unit, n in counts.items():
+            self.counts[unit] = self.counts.get(unit, 0) + n
+
+    def rates(self):
+        """Counts per second of the stage's own time"""
+        if not self.seconds:
+            return {}
+        return dict((unit, n / self.seconds) for unit, n in self.counts.items())
+
+    def as_dict(self):
+        return {'calls': self.calls, 'seconds': self.seconds, 'counts': dict(self.counts), 'per_second': self.rates()}
+
+class Stats:
+    """
+    Stages by name, in the order they were first seen. With progress (seconds), the counts so far
+    are written to out (standard error by default) that often, as stages finish.
+    """
+    def __init__(self, progress=None, out=None):
+        self.stages = {}
+        self.progress = progress
+        self.out = out
+        self.started = time.perf_counter()
+        self.finished = None
+        self._next_report = self.started + progress if progress else float('inf')
+        # [stage, started, seconds of stages inside it] of the stages running, innermost last
+        self._running = []
+
+    def stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name)
+        return stage
+
+    def count(self, name, **counts):
+        self.stage(name).add(counts)
+
+    def _start(self, stage):
+        self._running.append([stage, time.perf_counter(), 0.0])
+
+    def _stop(self):
+        now = time.perf_counter()
+        stage, started, inner = self._running.pop()
+        elapsed = now - started
+        stage.calls += 1
+        stage.seconds += elapsed - inner
+        if self._running:
+            self._running[-1][2] += elapsed
+        if now >= self._next_report:
+            self._next_report = now + self.progress
+            self.report_progress(now)
+
+    @contextmanager
+    def timer(self, name):
+        self._start(self.stage(name))
+        try:
+            yield
+        finally:
+            self._stop()
+
+    def timed(self, name, iterable, unit='records', size=None, size_unit='bytes'):
+        """
+        Generate the items of iterable, timing each step of it as the stage name and counting
+        the items as unit, and size(item) of each as size_unit if size is given
+        """
+        stage = self.stage(name)
+        items = iter(iterable)
+        while True:
+            self._start(stage)
+            try:
+                item = next(items, StopIteration)
+            finally:
+                self._stop()
+            if item is StopIteration:
+                return
+            stage.counts[unit] = stage.counts.get(unit, 0) + 1
+            if size is not None:
+                stage.counts[size_unit] = stage.counts.get(size_unit, 0) + size(item)
+            yield item
+
+    def wrap(self, name, function, unit='calls', size=None, size_unit='bytes'):
+        """function timed as the stage name on every call, counting calls as unit and size(result) as size_unit"""
+        stage = self.stage(name)
+        def wrapper(*args, **kwargs):
+            self._start(stage)
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                self._stop()
+            stage.counts[unit] = stage.counts.get(unit, 0) + 1
+            if size is not None:
+                stage.counts[size_unit] = stage.counts.get(size_unit, 0) + size(result)
+            return result
+        wrapper.__wrapped__ = function
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def used(self):
+        """The stages that ran or counted anything, leaving out per-line functions that weren't called"""
+        return [stage for stage in self.stages.values() if stage.calls or stage.counts]
+
+    def elapsed(self):
+        """Seconds from starting to record until now, or until recording stopped"""
+        return (self.finished or time.perf_counter()) - self.started
+
+    def as_dict(self):
+        """The stages and wall time as plain values, for JSON"""
+        wall = self.elapsed()
+        recorded = sum(stage.seconds for stage in self.stages.values())
+        return {'wall_seconds': wall, 'unrecorded_seconds': max(0.0, wall - recorded),
+                'stages': dict((stage.name, stage.as_dict()) for stage in self.used())}
+
+    def write_json(self, filename):
+        with open(filename, 'w') as fh:
+            json.dump(self.as_dict(), fh, indent=1)
+            fh.write('\n')
+
+    def report(self, out=None):
+        """Write a table of the stages, their share of the wall time and their counts and rates to out"""
+        out = out or self.out or sys.stderr
+        wall = self.elapsed()
+        recorded = 0.0
+        print("%-22s %9s %10s %6s  %s" % ('stage', 'calls', 'seconds', '%', 'counts'), file=out)
+        for stage in self.used():
+            recorded += stage.seconds
+            rates = stage.rates()
+            counts = ", ".join("%s (%s/s)" % (_amount(n, unit), _amount(rates[unit], unit)) if unit in rates
+                               else _amount(n, unit) for unit, n in stage.counts.items())
+            print("%-22s %9d %10.3f %6.1f  %s" % (stage.name, stage.calls, stage.seconds, _percent(stage.seconds, wall), counts), file=out)
+        other = max(0.0, wall - recorded)
+        print("%-22s %9s %10.3f %6.1f" % ('(elsewhere)', '', other, _percent(other, wall)), file=out)
+        print("%-22s %9s %10.3f" % ('wall', '', wall), file=out)
+
+    def report_progress(self, now=None):
+        """One line of the first count of each stage so far"""
+        now = now or time.perf_counter()
+        counts = ["%s %s" % (stage.name, _amount(n, unit)) for stage in self.used()
+                  for unit, n in list(stage.counts.items())[:1]]
+        print("[%.1f s] %s" % (now - self.started, ", ".join(counts)), file=self.out or sys.stderr, flush=True)
+
+def _amount(n, unit):
+    """
+    n of unit, bytes and bases in MB and Mb
+    >>> _amount(3500000, 'bytes'), _amount(1234, 'lines'), _amount(2.5e6, 'bases'), _amount(17.25, 'hits')
+    ('3.5 MB', '1234 lines', '2.5 Mb', '17 hits')
+    """
+    if unit == 'bytes':
+        return "%.1f MB" % (n / 1e6)
+    if unit == 'bases':
+        return "%.1f Mb" % (n / 1e6)
+    return "%d %s" % (n, unit)
+
+def _percent(seconds, wall):
+    return 100.0 * seconds / wall if wall else 0.0
+
+def timer(name):
+    """A context timing its block as the stage name while recording, doing nothing otherwise"""
+    if current is None:
+        return nullcontext()
+    return current.timer(name)
+
+def timed(name, iterable, unit='records', size=None, size_unit='bytes'):
+    """iterable, timed and counted by Stats.timed while recording"""
+    if current is None:
+        return iterable
+    return current.timed(name, iterable, unit, size, size_unit)
+
+def count(name, **counts):
+    """Add counts to the stage name while recording"""
+    if current is not None:
+        current.count(name, **counts)
+
+# per-line functions that get timing wrappers while recording: (module, name, unit, size, size_unit)
+def _instrumented():
+    from .GFF import GFFParser
+    return [(GFFParser, 'parseLine', 'lines', None, None),
+            (GFFParser, 'parseAttr', 'lines', len, 'attributes')]
+
+def enable(progress=None, out=None):
+    """Start recording to a new Stats, returning it"""
+    global current
+    if current is not None:
+        disable()
+    current = Stats(progress, out)
+    for module, name, unit, size, size_unit in _instrumented():
+        function = getattr(module, name)
+        setattr(module, name, current.wrap('gff.' + name, function, unit, size, size_unit))
+    return current
+
+def disable():
+    """Stop recording, putting the per-line functions back, and return the Stats recorded"""
+    global current
+    recorder, current = current, None
+    if recorder is not None:
+        recorder.finished = time.perf_counter()
+        for module, name, unit, size, size_unit in _instrumented():
+            setattr(module, name, getattr(module, name).__wrapped__)
+    return recorder
+
+def add_arguments(parser):
+    """Add the --stats, --profile and --progress options to an argparse parser"""
+    group = parser.add_argument_group("profiling")
+    group.add_argument('--stats', action='store_true', help="When done, print the time spent in each stage (reading, parsing, scanning, writing) with its counts and rates to standard error.")
+    group.add_argument('--profile', metavar='JSON', help="When done, write the stage times, counts and rates to the file JSON.")
+    group.add_argument('--progress', type=float, metavar='SECONDS', help="Report the counts so far to standard error every SECONDS.")
+
+@contextmanager
+def recording(args):
+    """
+    Record while the block runs if args (parsed with add_arguments' options) asks for it,
+    then print and write what was recorded
+    """
+    if not (args.stats or args.profile or args.progress):
+        yield None
+        return
+    recorder = enable(args.progress)
+    try:
+        yield recorder
+    finally:
+        disable()
+    if args.stats:
+        recorder.report()
+    if args.profile:
+        recorder.write_json(args.profile)
@@ -0,0 +1,257 @@
+"""
+UCSC .2bit genomes: four bases to a byte, converted from a fasta once and memory-mapped after.
+
+A .2bit file (see https://genome.ucsc.edu/FAQ/FAQformat.html#format7) holds each sequence as
+- its length
+- N blocks: the starts and sizes of runs of anything that isn't A, C, G or T, read back as N
+- mask blocks: the starts and sizes of runs of soft-masked (lower case) sequence
+- the bases packed two bits each, T=0 C=1 A=2 G=3, the first base in the high bits of a byte
+after an index of sequence names and file offsets. A C. elegans genome is 25 MB this way,
+against 100 MB of fasta text, and files are read by the UCSC tools (twoBitToFa) and others.
+
+TwoBitFile maps the file into memory: opening one reads the index only, packed() is a NumPy view
+of a sequence's bytes in the file, and fetch() unpacks just the bytes a slice needs, through a
+256-entry table of four bases per byte, then applies the N and mask blocks it overlaps. It has
+IndexedFasta's methods, so wormtools.fasta.open_indexed and readGZfa take either.
+
+fasta_to_twobit is also the wormtools-fa2twobit command:
+$ wormtools-fa2twobit c_elegans.PRJNA13758.WS261.genomic.fa.gz c_elegans.2bit
+"""
+import os,sys,mmap,struct,tempfile,shutil,argparse
+from collections import namedtuple
+import numpy as np
+from .fasta import readGZfa, parse_region
+
+SIGNATURE = 0x1A412743
+BASES = b'TCAG'
+# 2-bit code of each byte: A, C, G, T in either case, and 0 (T) for N and anything else
+CODES = np.zeros(256, dtype=np.uint8)
+for code, base in enumerate(BASES):
+    CODES[base] = CODES[base + 32] = code
+# the four bases of each packed byte
+UNPACK = np.array([[BASES[(byte >> shift) & 3] for shift in (6, 4, 2, 0)] for byte in range(256)], dtype=np.uint8)
+# which bytes are A, C, G or T in either case
+ACGT = np.zeros(256, dtype=bool)
+ACGT[list(b'ACGTacgt')] = True
+
+def is_twobit(filename):
+    """True if filename starts with the .2bit signature, in either byte order"""
+    with open(filename, 'rb') as fh:
+        signature = fh.read(4)
+    return signature in (struct.pack('<I', SIGNATURE), struct.pack('>I', SIGNATURE))
+
+def _runs(mask):
+    # starts and sizes of the runs of True in a boolean array
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return edges[0::2], edges[1::2] - edges[0::2]
+
+def pack(seq):
+    """
+    The .2bit record of a bytes sequence: its length, N blocks, mask blocks, a reserved word and the packed bases.
+    >>> record = pack(b'ACGTnnacgT')
+    >>> struct.unpack('<8I', record[:32]), record[32:].hex()
+    ((10, 1, 4, 2, 1, 4, 5, 0), '9c09c0')
+    """
+    seq = np.frombuffer(seq, dtype=np.uint8)
+    n_starts, n_sizes = _runs(~ACGT[seq])
+    mask_starts, mask_sizes = _runs(seq >= ord('a'))
+    codes = np.zeros(-(-len(seq) // 4) * 4, dtype=np.uint8)
+    codes[:len(seq)] = CODES[seq]
+    codes = codes.reshape(-1, 4)
+    packed = (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+    parts = [struct.pack('<II', len(seq), len(n_starts)), n_starts.astype('<u4').tobytes(), n_sizes.astype('<u4').tobytes(),
+             struct.pack('<I', len(mask_starts)), mask_starts.astype('<u4').tobytes(), mask_sizes.astype('<u4').tobytes(),
+             struct.pack('<I', 0), packed.tobytes()]
+    return b''.join(parts)
+
+def write_twobit(records, filename):
+    """
+    Write the (name, sequence) records (sequences as bytes, soft-masking kept) to the .2bit file
+    filename. Names are cut at the first whitespace, as fasta headers are. Records are packed
+    one at a time into a temporary file, so only the current one is ever in memory. Files of
+    4 GB or more are written as version 1, with 64-bit offsets.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    names, sizes = [], []
+    with tempfile.TemporaryFile(dir=directory) as body:
+        for name, seq in records:
+            name = name.split(None, 1)[0] if name.strip() else name
+            if len(name.encode()) > 255:
+                raise Exception("sequence name %s... is longer than the 255 bytes .2bit allows" % name[:20])
+            record = pack(seq)
+            body.write(record)
+            names.append(name.encode())
+            sizes.append(len(record))
+        index_size = sum(1 + len(name) + 4 for name in names)
+        version = 0 if 16 + index_size + sum(sizes) < 1 << 32 else 1
+        if version:
+            index_size += 4 * len(names)
+        with open(filename, 'wb') as fh:
+            fh.write(struct.pack('<IIII', SIGNATURE, version, len(names), 0))
+            offset = 16 + index_size
+            for name, size in zip(names, sizes):
+                fh.write(bytes([len(name)]) + name + struct.pack('<Q' if version else '<I', offset))
+                offset += size
+            body.seek(0)
+            shutil.copyfileobj(body, fh, 1 << 22)
+
+def fasta_to_twobit(fasta, filename):
+    """Convert the fasta (plain, gzip or bgzip) to the .2bit file filename, returning the number of sequences"""
+    n = 0
+    def records():
+        nonlocal n
+        for header, seq in readGZfa(fasta, upper=False):
+            n += 1
+            yield header, seq
+    write_twobit(records(), filename)
+    return n
+
+# a record's length, N and mask blocks (NumPy views of the file) and where its packed bases start
+Record = namedtuple('Record', ['length', 'n_starts', 'n_sizes', 'mask_starts', 'mask_sizes', 'offset'])
+
+class TwoBitFile:
+    """
+    Random access to the sequences of a .2bit file, with the methods of fasta.IndexedFasta.
+    The file is memory-mapped, so only the bytes of the requested slices are ever read.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._fh = open(filename, 'rb')
+        self._data = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        signature = self._data[:4]
+        if signature == struct.pack('<I', SIGNATURE):
+            self._order = '<'
+        elif signature == struct.pack('>I', SIGNATURE):
+            self._order = '>'
+        else:
+            self.close()
+            raise Exception("%s is not a .2bit file" % filename)
+        version, count = struct.unpack(self._order + 'II', self._data[4:12])
+        if version not in (0, 1):
+            self.close()
+            raise Exception("%s is a .2bit file of unknown version %d" % (filename, version))
+        offset_format = self._order + ('Q' if version else 'I')
+        offset_size = struct.calcsize(offset_format)
+        self.names = []
+        self._offsets = {}
+        pos = 16
+        for i in range(count):
+            size = self._data[pos]
+            name = self._data[pos + 1:pos + 1 + size].decode()
+            pos += 1 + size
+            self._offsets[name] = struct.unpack(offset_format, self._data[pos:pos + offset_size])[0]
+            pos += offset_size
+            self.names.append(name)
+        self._records = {}
+
+    def _read(self, dtype, count, offset):
+        # count values of dtype at offset, as a view of the file
+        return np.frombuffer(self._data, dtype=self._order + dtype, count=count, offset=offset)
+
+    def record(self, seqname):
+        """The Record of seqname, read from the file on first use"""
+        record = self._records.get(seqname)
+        if record is None:
+            pos = self._offsets[seqname]
+            length, n_count = self._read('u4', 2, pos).tolist()
+            n_starts, n_sizes = self._read('u4', n_count, pos + 8), self._read('u4', n_count, pos + 8 + 4 * n_count)
+            pos += 8 + 8 * n_count
+            mask_count = int(self._read('u4', 1, pos)[0])
+            mask_starts, mask_sizes = self._read('u4', mask_count, pos + 4), self._read('u4', mask_count, pos + 4 + 4 * mask_count)
+            record = self._records[seqname] = Record(length, n_starts, n_sizes, mask_starts, mask_sizes, pos + 8 + 8 * mask_count)
+        return record
+
+    def length(self, seqname):
+        return self.record(seqname).length
+
+    def packed(self, seqname):
+        """The packed bases of seqname, four to a byte, as a read-only NumPy view of the file"""
+        record = self.record(seqname)
+        return np.frombuffer(self._data, dtype=np.uint8, count=-(-record.length // 4), offset=record.offset)
+
+    def array(self, seqname, start=0, end=None, upper=True):
+        """The sequence of seqname from start to end, as in fetch, as a NumPy array of ASCII codes"""
+        record = self.record(seqname)
+        if end is None or end > record.length: end = record.length
+        start = max(0, start)
+        if start >= end:
+            return np.zeros(0, dtype=np.uint8)
+        packed = self.packed(seqname)[start // 4:-(-end // 4)]
+        seq = UNPACK[packed].reshape(-1)[start % 4:start % 4 + end - start]
+        _apply_blocks(seq, record.n_starts, record.n_sizes, start, end, lambda run: run.fill(ord('N')))
+        if not upper:
+            _apply_blocks(seq, record.mask_starts, record.mask_sizes, start, end, lambda run: np.bitwise_or(run, 0x20, out=run))
+        return seq
+
+    def fetch(self, seqname, start=0, end=None, upper=True):
+        """
+        The sequence of seqname from 0-based start up to, not including, end, as bytes.
+        The range is clipped to the sequence, and upper-cased unless upper is False.
+        """
+        return self.array(seqname, start, end, upper).tobytes()
+
+    def fetch_region(self, region, upper=True):
+        """Fetch a samtools-style region such as 'chrIV:1,200,000-1,210,000'"""
+        seqname, start, end = parse_region(region)
+        return self.fetch(seqname, start, end, upper)
+
+    def records(self, upper=True):
+        """Generate (name, sequence) for every sequence, in file order, as readGZfa does"""
+        for name in self.names:
+            yield name, self.fetch(name, upper=upper)
+
+    def __contains__(self, seqname):
+        return seqname in self._offsets
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        # views of the file handed out keep the map open until they are gone
+        self._records = {}
+        try:
+            self._data.close()
+        except BufferError:
+            pass
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# above this many blocks in a slice, they are applied through a mask of the whole slice
+MANY_BLOCKS = 32
+
+def _apply_blocks(seq, starts, sizes, start, end, apply):
+    # apply(run) to each run of seq, the slice start to end of a sequence, in one of the blocks
+    first = max(0, int(np.searchsorted(starts, start, 'right')) - 1)
+    last = int(np.searchsorted(starts, end, 'left'))
+    if last - first <= MANY_BLOCKS:
+        for block_start, size in zip(starts[first:last].tolist(), sizes[first:last].tolist()):
+            block_start, block_end = max(block_start, start), min(block_start + size, end)
+            if block_start < block_end:
+                apply(seq[block_start - start:block_end - start])
+        return
+    block_starts = starts[first:last].astype(np.int64)
+    block_ends = np.clip(block_starts + sizes[first:last], start, end) - start
+    block_starts = np.clip(block_starts, start, end) - start
+    edges = np.zeros(len(seq) + 1, dtype=np.int32)
+    np.add.at(edges, block_starts, 1)
+    np.add.at(edges, block_ends, -1)
+    inside = np.cumsum(edges[:-1]) > 0
+    run = seq[inside]
+    apply(run)
+    seq[inside] = run
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="wormtools-fa2twobit",
+        description="Convert a fasta (plain, gzip or bgzip) to a UCSC .2bit file, keeping N runs and soft-masking.")
+    parser.add_argument('fasta', help="Fasta file.")
+    parser.add_argument('twobit', help=".2bit file to write.")
+    args = parser.parse_args(argv)
+    n = fasta_to_twobit(args.fasta, args.twobit)
+    print("wrote", n, "sequences to", args.twobit, file=sys.stderr)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,244 @@
+"""
+Motif density along the genome: the number of hits in fixed-size windows.
+
+Windows of size bases start every step bases from 0, the last ones cut short at the end of the
+sequence; on the command line that is 'SIZE[:STEP]', step defaulting to size for adjacent windows.
+A hit is counted in every window its start falls in.
+
+Hits come from the scanners' starts methods (MotifScanner.starts and friends) as arrays of start
+positions, so no Python object is made per hit: WindowCounter bins the starts with np.bincount
+at the greatest common divisor of size and step, and the count of a window is the difference of
+the cumulative sum of the bins at its two ends. When that divisor is much smaller than the step
+(co-prime windows like 1000:999 would need a bin per base), it keeps the starts instead and
+counts them with np.searchsorted against the window ends once they're all in. Counts are kept per
+track, a track being a motif (or matrix) on both strands, or on each strand separately.
+
+window_writer writes the tracks as bedGraph, or as a .npz of one (tracks, windows) array per
+sequence for plotting and statistics:
+$ search_seq_motif.py --windows 1000:500 -m panel.txt c_elegans.2bit -o density.bedGraph
+"""
+import sys,math,zipfile
+import numpy as np
+from .hits import open_output, BATCH_SIZE
+
+FORMATS = ('bedgraph', 'npz')
+
+def parse_windows(arg):
+    """
+    (size, step) of 'SIZE[:STEP]', step defaulting to size
+    >>> parse_windows('1000'), parse_windows('1000:250')
+    ((1000, 1000), (1000, 250))
+    """
+    try:
+        fields = [int(field) for field in arg.split(':')]
+    except ValueError:
+        fields = []
+    if len(fields) not in (1, 2) or min(fields) <= 0:
+        raise Exception("windows must be SIZE or SIZE:STEP in bases, not %s" % arg)
+    return fields[0], fields[-1]
+
+def window_ranges(length, size, step):
+    """
+    (starts, ends) arrays of the windows of a sequence of length bases
+    >>> [a.tolist() for a in window_ranges(10, 4, 3)]
+    [[0, 3, 6, 9], [4, 7, 10, 10]]
+    """
+    starts = np.arange(0, length, step, dtype=np.int64)
+    return starts, np.minimum(starts + size, length)
+
+def track_names(labels, split=False):
+    """
+    The names of the tracks of motifs labels: the labels, or each label on each strand with split
+    >>> track_names(['GATA', 'Ebox'], split=True)
+    ['GATA +', 'GATA -', 'Ebox +', 'Ebox -']
+    """
+    if not split:
+        return list(labels)
+    return ["%s %s" % (label, strand) for label in labels for strand in '+-']
+
+class WindowCounter:
+    """
+    Hit counts of a number of tracks in the windows of one sequence of length bases.
+    >>> counter = WindowCounter(10, 4, 2)
+    >>> counter.add(0, np.array([0, 3, 5, 9]))
+    >>> counter.counts().tolist()
+    [[2, 2, 1, 1, 1]]
+    >>> counter = WindowCounter(10, 2, 5)
+    >>> counter.add(0, np.array([0, 3, 5, 9]))
+    >>> counter.bins is None, counter.counts().tolist()
+    (True, [[1, 1]])
+    """
+    # bins per window past which starts are kept and searched instead of binned
+    MAX_BINS_PER_WINDOW = 4
+
+    def __init__(self, length, size, step, tracks=1):
+        self.length = length
+        self.size = size
+        self.step = step
+        # every window starts and ends on a multiple of grain (or the end of the sequence)
+        self.grain = math.gcd(size, step)
+        if self.grain * self.MAX_BINS_PER_WINDOW < step:
+            self.bins = None
+            self.starts = [[] for track in range(tracks)]
+        else:
+            self.bins = np.zeros((tracks, -(-length // self.grain)), dtype=np.int64)
+
+    def add(self, track, starts):
+        """Count hits starting at starts, an array of positions on the sequence, in track"""
+        if not len(starts):
+            return
+        if self.bins is None:
+            self.starts[track].append(np.asarray(starts, dtype=np.int64))
+            return
+        bins = starts // self.grain
+        first = int(bins.min())
+        # only the span of bins the hits fall in, so slices of a long sequence stay cheap
+        counts = np.bincount(bins - first)
+        self.bins[track, first:first + len(counts)] += counts
+
+    def counts(self):
+        """The (tracks, windows) uint32 array of the count of each track in each window"""
+        if self.bins is None:
+            return self._searched_counts()
+        cumulative = np.zeros((len(self.bins), self.bins.shape[1] + 1), dtype=np.int64)
+        np.cumsum(self.bins, axis=1, out=cumulative[:, 1:])
+        first = np.arange(0, self.length, self.step, dtype=np.int64) // self.grain
+        last = np.minimum(first + self.size // self.grain, self.bins.shape[1])
+        return (cumulative[:, last] - cumulative[:, first]).astype(np.uint32)
+
+    def _searched_counts(self):
+        # hits before each window's end less those before its start, in the sorted starts
+        window_starts, window_ends = window_ranges(self.length, self.size, self.step)
+        counts = np.zeros((len(self.starts), len(window_starts)), dtype=np.uint32)
+        for track, pieces in enumerate(self.starts):
+            if pieces:
+                starts = np.sort(np.concatenate(pieces))
+                counts[track] = np.searchsorted(starts, window_ends) - np.searchsorted(starts, window_starts)
+        return counts
+
+def window_tracks(scanner, sequences, size, step, split=False, lengths=None):
+    """
+    Generate (seqname, length, counts) for the sequences, the (seqname, seq, offset) tuples of
+    search_seq_motif.py, counting the hits of scanner (a MotifScanner, MultiMotifScanner or
+    PWMScanner) in windows of size bases every step. counts is the (tracks, windows) array of
+    WindowCounter, tracks in the order of track_names. Consecutive slices of one sequence (regions)
+    are counted together, over its whole length from the dict lengths; without it, sequences are
+    taken to be whole.
+    """
+    multi = hasattr(scanner, 'labels')
+    tracks = (len(scanner.labels) if multi else 1) * (2 if split else 1)
+    counter, current = None, None
+    for seqname, seq, offset in sequences:
+        if counter is None or seqname != current:
+            if counter is not None:
+                yield current, counter.length, counter.counts()
+            length = lengths[seqname] if lengths is not None else offset + len(seq)
+            counter, current = WindowCounter(length, size, step, tracks), seqname
+        starts = scanner.starts(seq) if multi else [scanner.starts(seq)]
+        for i, (forward, reverse) in enumerate(starts):
+            if split:
+                counter.add(2 * i, forward + offset)
+                counter.add(2 * i + 1, reverse + offset)
+            else:
+                counter.add(i, forward + offset)
+                counter.add(i, reverse + offset)
+    if counter is not None:
+        yield current, counter.length, counter.counts()
+
+class BedGraphWriter:
+    """
+    Window counts as bedGraph lines: seqname, start, end, count. A single track is written as
+    plain bedGraph, as bedGraphToBigWig wants it. Several tracks each get a 'track' line before
+    their lines, so their counts are kept until close; they are one small array per sequence.
+    Windows with a step smaller than their size overlap, which bedGraph readers may not accept.
+    """
+    def __init__(self, filename, size, step, tracks):
+        self.out = open_output(filename)
+        self.size = size
+        self.step = step
+        self.tracks = list(tracks)
+        self._held = []
+
+    def write(self, seqname, length, counts):
+        """Write the (tracks, windows) counts of a sequence of length, returning the number of windows"""
+        seqname = seqname.split(None, 1)[0]
+        if len(self.tracks) == 1:
+            self._write_lines(seqname, length, counts[0])
+        else:
+            self._held.append((seqname, length, counts))
+        return counts.shape[1]
+
+    def _write_lines(self, seqname, length, counts):
+        starts, ends = window_ranges(length, self.size, self.step)
+        for i in range(0, len(counts), BATCH_SIZE):
+            lines = ["%s\t%d\t%d\t%d\n" % (seqname, start, end, n) for start, end, n in
+                     zip(starts[i:i + BATCH_SIZE].tolist(), ends[i:i + BATCH_SIZE].tolist(), counts[i:i + BATCH_SIZE].tolist())]
+            self.out.write(''.join(lines).encode())
+
+    def close(self):
+        if len(self.tracks) > 1:
+            for track, name in enumerate(self.tracks):
+                self.out.write(('track type=bedGraph name="%s"\n' % name).encode())
+                for seqname, length, counts in self._held:
+                    self._write_lines(seqname, length, counts[track])
+        if self.out is sys.stdout.buffer:
+            self.out.flush()
+        else:
+            self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class WindowArrayWriter:
+    """
+    A .npz with one uint32 array of shape (tracks, windows) per sequence, under the sequence's name,
+    and the arrays tracks (the track names), seqnames, lengths and window (size, step). Each
+    sequence's array is written to the file as it comes. Load it with numpy.load.
+    """
+    RESERVED = ('tracks', 'seqnames', 'lengths', 'window')
+
+    def __init__(self, filename, size, step, tracks):
+        if filename is None or filename == '-':
+            raise Exception("the npz format has to be written to a file")
+        self.size = size
+        self.step = step
+        self.tracks = list(tracks)
+        self.seqnames = []
+        self.lengths = []
+        self._npz = zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def write(self, seqname, length, counts):
+        """Write the (tracks, windows) counts of a sequence of length, returning the number of windows"""
+        seqname = seqname.split(None, 1)[0]
+        if seqname in self.RESERVED or seqname in self.seqnames:
+            raise Exception("can't store the windows of a second or reserved sequence named %s in a .npz" % seqname)
+        self.seqnames.append(seqname)
+        self.lengths.append(length)
+        with self._npz.open(seqname + '.npy', 'w', force_zip64=True) as member:
+            np.lib.format.write_array(member, counts)
+        return counts.shape[1]
+
+    def close(self):
+        arrays = {'tracks': np.array(self.tracks, dtype=str), 'seqnames': np.array(self.seqnames, dtype=str),
+                  'lengths': np.array(self.lengths, dtype=np.int64), 'window': np.array([self.size, self.step], dtype=np.int64)}
+        for name, values in arrays.items():
+            with self._npz.open(name + '.npy', 'w') as member:
+                np.lib.format.write_array(member, values)
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def window_writer(format, filename, size, step, tracks):
+    """The writer of format ('bedgraph' or 'npz') to filename (standard output by default for bedgraph) of the named tracks"""
+    if format == 'bedgraph':
+        return BedGraphWriter(filename, size, step, tracks)
+    if format == 'npz':
+        return WindowArrayWriter(filename, size, step, tracks)
+    raise Exception("format must be one of %s, not %s" % (", ".join(FORMATS), format))
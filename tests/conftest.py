@@ -0,0 +1,10 @@
+import pytest
+from wormtools.GFF import GFFCache
+
+@pytest.fixture(autouse=True, scope='session')
+def gff_cache_dir(tmp_path_factory):
+    # GFF caches made by the tests go in a temporary directory, not ~/.cache/wormtools
+    default = GFFCache.DEFAULT_CACHE_DIR
+    GFFCache.DEFAULT_CACHE_DIR = str(tmp_path_factory.mktemp('wtcache'))
+    yield GFFCache.DEFAULT_CACHE_DIR
+    GFFCache.DEFAULT_CACHE_DIR = default
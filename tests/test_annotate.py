@@ -0,0 +1,145 @@
+import os, io, gzip, random
+from itertools import groupby
+from wormtools import GFF, annotate
+
+SAMPLE_GTF = os.path.join(os.path.dirname(__file__), 'data', 'sample.gtf')
+
+def reference_bed(gene, upstream_promoter_flank=2000, promoter_inset_flank=1000, downstream_flank=1000):
+    """annotate_transcripts.process_gene_model as it was, with bytearrays standing in for the bx BitSets"""
+    if gene.isforward():
+        if (gene.start - upstream_promoter_flank) < 1:
+            upstream_promoter_flank = gene.start - 1
+        gene_start,gene_end = gene.start - upstream_promoter_flank - 1, gene.end + downstream_flank
+    else:
+        if (gene.start - downstream_flank) < 1:
+            downstream_flank = gene.start - 1
+        gene_start,gene_end = gene.start - downstream_flank - 1, gene.end + upstream_promoter_flank
+
+    base = gene_start
+    size = gene_end - gene_start
+    exon_mask, promoter_mask = bytearray(size), bytearray(size)
+    def set_range(mask, pos, length):
+        # BitSet.set_range raises rather than clipping
+        if pos < 0 or pos + length > size: raise IndexError(pos)
+        mask[pos:pos+length] = b'\1' * length
+
+    for t in gene.transcripts:
+        exons = list(t.exons())
+        for ex in exons:
+            set_range(exon_mask, ex['start'] - 1 - base, ex['end'] - ex['start'] + 1)
+        p_len = min(size, upstream_promoter_flank + promoter_inset_flank)
+        if gene.isforward():
+            set_range(promoter_mask, exons[0]['start'] - 1 - base - upstream_promoter_flank, p_len)
+        else:
+            set_range(promoter_mask, max(0, exons[-1]['end'] - base - promoter_inset_flank), p_len)
+
+    # three_states_two_masks: promoter over exonic over intronic, as runs
+    things = []
+    for i in range(size):
+        state = 'promoter' if promoter_mask[i] else 'exonic' if exon_mask[i] else 'intronic'
+        if things and things[-1][2] == state:
+            things[-1] = (things[-1][0], i + 1, state)
+        else:
+            things.append((i, i + 1, state))
+
+    threeprime_i = -1 if gene.isforward() else 0
+    s,e,state = things[threeprime_i]
+    if state == 'intronic':
+        things[threeprime_i] = (s,e,'downstream_flank')
+    return ["chr%s\t%d\t%d\t%s.%s\t0\t%s\n" % (gene.seqname, s + base, e + base, gene.gene_id, state, gene.strand)
+            for s,e,state in things]
+
+def random_gtf(rng, n_genes, seqnames=('I', 'II'), strands='+-'):
+    lines = []
+    for seqname in seqnames:
+        position = rng.randint(1, 3000)
+        for g in range(n_genes):
+            strand = rng.choice(strands)
+            gene_id = 'WBGene%s%05d' % (seqname, g)
+            transcripts = []
+            for t in range(rng.randint(1, 3)):
+                exons = []
+                start = position + rng.randint(0, 400)
+                for e in range(rng.randint(1, 5)):
+                    end = start + rng.randint(20, 600)
+                    exons.append((start, end))
+                    start = end + rng.randint(30, 800)
+                transcripts.append(exons)
+            gene_start = min(exons[0][0] for exons in transcripts)
+            gene_end = max(exons[-1][1] for exons in transcripts)
+            attr = 'gene_id "%s";' % gene_id
+            lines.append('\t'.join([seqname, 'WormBase', 'gene', str(gene_start), str(gene_end), '.', strand, '.', attr]))
+            for t, exons in enumerate(transcripts):
+                tattr = attr + ' transcript_id "%s.%d";' % (gene_id, t)
+                lines.append('\t'.join([seqname, 'WormBase', 'transcript', str(exons[0][0]), str(exons[-1][1]), '.', strand, '.', tattr]))
+                # minus strand transcripts list their exons 3' to 5', like WormBase
+                for start, end in (exons[::-1] if strand == '-' else exons):
+                    lines.append('\t'.join([seqname, 'WormBase', 'exon', str(start), str(end), '.', strand, '.', tattr]))
+            # genes overlap their neighbours now and then
+            position = gene_start + rng.randint(-500, 3000) if rng.random() < 0.2 else gene_end + rng.randint(100, 5000)
+            position = max(1, position)
+    return lines
+
+def check_against_reference(genes, **flanks):
+    expected = []
+    kept = []
+    for gene in genes:
+        try:
+            expected.extend(reference_bed(gene, **flanks))
+        except IndexError:
+            # the old code failed on promoters running out of the gene window; annotate clips them
+            continue
+        kept.append(gene)
+    lines = [line for segments in annotate.annotate_genes(kept, **flanks) for line in annotate.bed_lines(segments)]
+    assert lines == expected
+    return len(kept)
+
+def test_sample_matches_per_gene_masks():
+    genes = list(GFF.iter_genes(SAMPLE_GTF, features=['exon']))
+    assert check_against_reference(genes) == len(genes)
+
+def test_random_genes_match_per_gene_masks():
+    rng = random.Random(14)
+    genes = list(GFF.iter_genes(random_gtf(rng, 150), features=['exon']))
+    assert check_against_reference(genes) > 250
+    assert check_against_reference(genes, upstream_promoter_flank=300, promoter_inset_flank=50, downstream_flank=700) > 250
+
+def test_unstranded_genes_match_per_gene_masks():
+    # '.' genes are laid out as reverse, as Gene.isforward has them
+    genes = list(GFF.iter_genes(random_gtf(random.Random(114), 60, strands='+-.'), features=['exon']))
+    assert sum(gene.strand == '.' for gene in genes) > 20
+    assert check_against_reference(genes) > 100
+
+def write_gtf(path, lines):
+    with open(path, 'w') as fh:
+        fh.write(''.join(line + '\n' for line in lines))
+    return str(path)
+
+def test_annotate_file_parallel_matches_serial(tmp_path):
+    gtf = write_gtf(tmp_path / 'genes.gtf', random_gtf(random.Random(15), 120, ('I', 'MtDNA', 'II')))
+    outputs = []
+    for jobs in (1, 3):
+        out = io.BytesIO()
+        n = annotate.annotate_file(gtf, out, jobs=jobs, exclude={'MtDNA'})
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1]
+    lines = outputs[0].decode().splitlines()
+    assert len(lines) == n > 250
+    assert not any(line.startswith('chrMtDNA') for line in lines)
+    # grouped by seqname and sorted by start within each
+    fields = [line.split('\t') for line in lines]
+    seqnames = [chrom for chrom, group in groupby(f[0] for f in fields)]
+    assert len(seqnames) == len(set(seqnames))
+    assert all(a[0] != b[0] or int(a[1]) <= int(b[1]) for a, b in zip(fields, fields[1:]))
+
+def test_annotate_main_writes_bgzip(tmp_path):
+    gtf = write_gtf(tmp_path / 'genes.gtf', random_gtf(random.Random(16), 40))
+    bedgz = str(tmp_path / 'genes.bed.gz')
+    annotate.main(['-j', '2', '-u', '500', '-i', '100', '-d', '300', '-o', bedgz, gtf])
+    with open(bedgz, 'rb') as fh:
+        assert fh.read(4) == b'\x1f\x8b\x08\x04' # bgzip blocks carry the BC extra field
+    with gzip.open(bedgz, 'rt') as fh:
+        lines = fh.read().splitlines(True)
+    genes = GFF.iter_genes(gtf, features=['exon'])
+    segments = annotate.annotate_genes(genes, upstream_promoter_flank=500, promoter_inset_flank=100, downstream_flank=300)
+    assert sorted(lines) == sorted(line for s in segments for line in annotate.bed_lines(s))
@@ -0,0 +1,71 @@
+import os,gzip,shutil
+from wormtools.fasta import readGZfa
+
+SAMPLE_FA = os.path.join(os.path.dirname(__file__), 'data', 'sample.fa')
+
+def naive_records(filename):
+    records = []
+    for line in open(filename):
+        if line.startswith('>'):
+            records.append([line[1:].strip(), ''])
+        else:
+            records[-1][1] += line.strip()
+    return [(header, seq.encode()) for header,seq in records]
+
+def test_readGZfa_plain_and_gzipped(tmp_path):
+    expected = naive_records(SAMPLE_FA)
+    assert [h for h,s in expected] == ['chrI', 'chrII desc text', 'chrIII']
+
+    gzipped = str(tmp_path / 'sample.fa.gz')
+    with open(SAMPLE_FA, 'rb') as src, gzip.open(gzipped, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+    for filename in (SAMPLE_FA, gzipped):
+        # tiny blocks put record and header boundaries everywhere inside blocks
+        for blocksize in (1, 7, 64, 1 << 20):
+            assert list(readGZfa(filename, upper=False, blocksize=blocksize)) == expected
+            # every record is upper-cased, not only the last one
+            assert list(readGZfa(filename, blocksize=blocksize)) == [(h, s.upper()) for h,s in expected]
+
+def test_indexed_fasta_plain_and_bgzip(tmp_path):
+    import random
+    import pytest
+    from wormtools import bgzf
+    from wormtools.fasta import IndexedFasta, read_fai
+
+    plain = str(tmp_path / 'sample.fa')
+    shutil.copy(SAMPLE_FA, plain)
+    compressed = str(tmp_path / 'sample.fa.gz')
+    with open(SAMPLE_FA, 'rb') as src:
+        data = src.read()
+    with open(compressed, 'wb') as fh:
+        # small blocks, so slices cross block boundaries
+        for i in range(0, len(data), 100):
+            fh.write(bgzf.compress_block(data[i:i+100]))
+        fh.write(bgzf.EOF_BLOCK)
+
+    records = dict((header.split()[0], seq) for header,seq in naive_records(SAMPLE_FA))
+    rng = random.Random(8)
+    for filename in (plain, compressed):
+        with IndexedFasta(filename) as fa:
+            assert fa.names == ['chrI', 'chrII', 'chrIII']
+            for name, seq in records.items():
+                assert fa.length(name) == len(seq)
+                assert fa.fetch(name, upper=False) == seq
+                for i in range(50):
+                    start = rng.randint(-10, len(seq))
+                    end = max(0, start) + rng.randint(0, 300)
+                    assert fa.fetch(name, start, end, upper=False) == seq[max(0, start):end]
+            assert fa.fetch_region('chrI:101-110') == records['chrI'][100:110].upper()
+        # the index was written, and is read back the next time
+        assert read_fai(filename + '.fai')[1].name == 'chrII'
+        with IndexedFasta(filename) as fa:
+            assert fa.fetch('chrIII') == records['chrIII']
+
+    plain_gzip = str(tmp_path / 'plain.fa.gz')
+    with gzip.open(plain_gzip, 'wb') as fh:
+        fh.write(data)
+    with pytest.raises(Exception):
+        IndexedFasta(plain_gzip)
+    # rejected before anything is written next to it
+    assert not os.path.exists(plain_gzip + '.fai') and not os.path.exists(plain_gzip + '.gzi')
@@ -0,0 +1,288 @@
+import os
+import pytest
+from wormtools import GFF
+from wormtools.GFF import GFFParser, GFFCache
+
+SAMPLE_GTF = os.path.join(os.path.dirname(__file__), 'data', 'sample.gtf')
+
+def sample_lines():
+    return [line for line in open(SAMPLE_GTF) if not line.startswith('#')]
+
+def test_table_rows_match_parseLine():
+    table = GFF.read_table(SAMPLE_GTF)
+    lines = sample_lines()
+    assert len(table) == len(lines)
+    for i,line in enumerate(lines):
+        assert table[i] == GFFParser.parseLine(line)
+    assert table.row(3, parse_attributes=True) == GFFParser.parseLine(lines[3], parse_attributes=True)
+
+def test_table_extend_lines_matches_append_line():
+    lines = sample_lines()
+    # a trailing tab, and a tenth field, take the line-by-line path
+    odd = lines[:3] + [lines[3].rstrip('\n') + '\t\n', lines[4].rstrip('\n') + '\textra\n'] + lines[5:]
+    for batch in (lines, odd):
+        expected, table = GFF.GFFTable(), GFF.GFFTable()
+        for line in batch:
+            expected.append_line(line, exclude_features=['CDS'])
+        table.extend_lines(batch[:10], exclude_features=['CDS'])
+        table.extend_lines(batch[10:], exclude_features=['CDS'])
+        assert list(table.rows()) == list(expected.rows())
+        assert table.name.levels == expected.name.levels
+    with pytest.raises(Exception):
+        table.extend_lines(lines[:2] + ['I\tWB\tgene\n'])
+    assert len(table) == len(expected) # nothing of a bad batch is added
+
+def test_table_categories_and_filters():
+    table = GFF.read_table(SAMPLE_GTF, exclude_features=['CDS', 'start_codon', 'stop_codon', 'five_prime_utr', 'three_prime_utr'])
+    assert sorted(table.name.levels) == ['exon', 'gene', 'transcript']
+    assert table.seqname.levels == ['I', 'II', 'MtDNA']
+    genes = list(table.rows(features=['gene']))
+    assert [GFF.gene_id(g) for g in genes] == ['WBGene%08d' % i for i in range(1, 6)]
+    assert GFF.GFF_as_BED6(genes[0]) == ['I', 999, 3000, 'gene', 0, '+']
+
+def test_iter_genes_assembles_every_gene(tmp_path):
+    import gzip,shutil
+    gzipped = str(tmp_path / 'sample.gtf.gz')
+    with open(SAMPLE_GTF, 'rb') as src, gzip.open(gzipped, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+    for infile in (SAMPLE_GTF, gzipped):
+        genes = list(GFF.iter_genes(infile))
+        assert [g.gene_id for g in genes] == ['WBGene%08d' % i for i in range(1, 6)]
+        assert [list(g.get_transcript_ids()) for g in genes] == [['ZK1.1a', 'ZK1.1b'], ['ZK2.2'], ['Y3.3'], ['Y4.4'], ['MTCE.5']]
+        assert len(genes[0].transcripts[0].gffdata) == 10
+
+def test_iter_genes_feature_filters():
+    genes = list(GFF.iter_genes(SAMPLE_GTF, features=['exon']))
+    assert set(gff['name'] for gff in genes[0].transcripts[0].gffdata) == {'exon'}
+    assert len(genes) == 5 # gene and transcript lines can't be filtered away
+
+    genes = list(GFF.iter_genes(SAMPLE_GTF, exclude_features=['exon', 'gene']))
+    assert len(genes) == 5
+    assert 'exon' not in set(gff['name'] for gff in genes[0].transcripts[0].gffdata)
+
+def test_transcript_sorted_store_and_exon_ends():
+    genes = list(GFF.iter_genes(SAMPLE_GTF))
+    forward = genes[0].transcripts[0]
+    starts = [gff['start'] for gff in forward.gffdata]
+    assert starts == sorted(starts)
+    assert [e['start'] for e in forward.exons()] == [1000, 1500, 2500]
+    assert [c['start'] for c in forward.cds()] == [1100, 1500, 2500]
+    assert [u['start'] for u in forward.features('three_prime_utr')] == [2904]
+    assert forward.get_5prime_exon()['start'] == 1000
+    assert forward.get_3prime_exon()['end'] == 3000
+
+    # exons of '-' strand transcripts are listed 5' to 3' in the file
+    reverse = genes[3].transcripts[0]
+    assert [e['start'] for e in reverse.exons()] == [20000, 21000, 23500]
+    assert reverse.get_5prime_exon()['end'] == 24000
+    assert reverse.get_3prime_exon()['start'] == 20000
+
+    # appending after a read re-sorts on the next read
+    extra = dict(reverse.get_3prime_exon(), start=10000, end=10100)
+    reverse.append(extra)
+    assert reverse.get_3prime_exon() is extra
+    assert reverse.gffdata[0] is extra
+
+def test_gff_records_behave_like_dicts():
+    line = sample_lines()[2]
+    record = GFFParser.parseLine(line, as_record=True)
+    assert record == GFFParser.parseLine(line)
+    assert GFF.GFF_as_BED6(record) == GFF.GFF_as_BED6(GFFParser.parseLine(line))
+    assert 'attr' not in record
+    assert GFF.get_scalar_attr(record, 'exon_id') == 'ZK1.1a.e1'
+    # only the attribute asked for is scanned; 'attr' is left unparsed
+    assert GFF.get_attr(record, 'exon_number') == ['1'] and 'attr' not in record
+    record['attr'] = GFFParser.parseAttr(record['attr_str'])
+    assert GFF.get_attr(record, 'exon_number') is record['attr']['exon_number']
+    assert not hasattr(record, '__dict__')
+
+    genes = list(GFF.iter_genes(SAMPLE_GTF, as_record=True))
+    assert isinstance(genes[0].transcripts[0].get_5prime_exon(), GFF.GFFRecord)
+    assert [g.gene_id for g in genes] == [g.gene_id for g in GFF.iter_genes(SAMPLE_GTF)]
+
+def test_attribute_scanning_matches_parseAttr():
+    for line in sample_lines():
+        attr_str = GFFParser.parseLine(line)['attr_str']
+        parsed = GFFParser.parseAttr(attr_str)
+        for key in parsed:
+            assert GFFParser.scanAttr(attr_str, key) == parsed[key]
+        assert GFFParser.parseAttr(attr_str, keys=list(parsed) + ['no_such_key']) == parsed
+
+    # quoted values can have spaces, and both paths keep them whole
+    attr_str = 'gene_id "g1"; note "two words; not a field"; note bare; exon_number 2;'
+    assert GFFParser.scanAttr(attr_str, 'note') == ['two words; not a field', 'bare']
+    assert GFFParser.scanAttr(attr_str, 'exon_number') == ['2']
+    assert GFFParser.parseAttr('gene_id "g1"; note "two words"; exon_number 2;') == {'gene_id': ['g1'], 'note': ['two words'], 'exon_number': ['2']}
+
+    # keys inside another attribute's quoted value aren't fields
+    for attr_str in ['gene_id "A"; note "old transcript_id X1"; transcript_id "T1";',
+                     'gene_id "A"; note "see transcript_id "; transcript_id "T1";',
+                     'gene_id "A"; note x_transcript_id; transcript_id T1;']:
+        assert GFFParser.scanAttr(attr_str, 'transcript_id') == ['T1']
+        assert GFFParser.parseAttr(attr_str, keys=['transcript_id']) == {'transcript_id': ['T1']}
+    assert GFFParser.parseAttr('gene_id "A"; note "old transcript_id X1"; transcript_id "T1";')['transcript_id'] == ['T1']
+
+    # repeated low-cardinality values are one shared object, whichever path parsed them
+    a,b = [GFFParser.parseLine(line) for line in sample_lines()[:2]]
+    assert GFFParser.parseAttr(a['attr_str'])['gene_biotype'][0] is GFFParser.scanAttr(b['attr_str'], 'gene_biotype')[0]
+
+    with pytest.raises(KeyError):
+        GFF.get_attr(a, 'transcript_id') # a gene line
+
+def test_interval_index_matches_brute_force():
+    import random
+    rng = random.Random(6)
+    intervals = []
+    for i in range(300):
+        start = rng.randint(1, 50000)
+        intervals.append((rng.choice(['I', 'II']), start, start + rng.choice([10, 500, 20000]), rng.choice('+-'), i))
+    index = GFF.IntervalIndex(intervals)
+
+    seqnames, starts, ends, strands = [], [], [], []
+    for q in range(200):
+        start = rng.randint(1, 60000)
+        seqnames.append(rng.choice(['I', 'II', 'III']))
+        starts.append(start)
+        ends.append(start + rng.randint(0, 3000))
+        strands.append(rng.choice('+-'))
+    queries, items = index.overlap_batch(seqnames, starts, ends, strands)
+    found = sorted(zip(queries.tolist(), items.tolist()))
+    expected = sorted((q, i) for q in range(200) for i,(seq, s, e, strand, item) in enumerate(intervals)
+                      if seq == seqnames[q] and s <= ends[q] and e >= starts[q] and strand == strands[q])
+    assert found == expected
+
+    for q in range(200):
+        item, distance = index.nearest_tss(seqnames[q], starts[q], direction='upstream')
+        tsses = [(e if strand == '-' else s) for seq, s, e, strand, i in intervals
+                 if seq == seqnames[q] and ((strand == '+' and s >= starts[q]) or (strand == '-' and e <= starts[q]))]
+        assert distance == (min(abs(t - starts[q]) for t in tsses) if tsses else -1)
+
+def test_interval_index_from_genes():
+    genes = list(GFF.iter_genes(SAMPLE_GTF))
+    by_gene = GFF.IntervalIndex.from_genes(genes)
+    assert [g.gene_id for g in by_gene.overlap('I', 2900, 5100)] == ['WBGene00000001', 'WBGene00000002']
+    exons = GFF.IntervalIndex.from_genes(genes, feature='exon')
+    assert [GFF.get_scalar_attr(e, 'exon_id') for e in exons.overlap('I', 1150, 1600)] == ['ZK1.1a.e1', 'ZK1.1b.e1', 'ZK1.1a.e2']
+    transcript, distance = GFF.IntervalIndex.from_genes(genes, feature='transcript').nearest_tss('II', 24100, direction='upstream')
+    assert transcript.transcript_id == 'Y4.4' and distance == 100
+
+def genes_summary(genes):
+    return [(g.gene_id, g.seqname, g.start, g.end, g.strand,
+             [(t.transcript_id, t.gffdata) for t in g.transcripts]) for g in genes]
+
+def test_gff_cache_round_trip(tmp_path):
+    import shutil
+    gtf = str(tmp_path / 'sample.gtf')
+    shutil.copy(SAMPLE_GTF, gtf)
+    cache_dir = str(tmp_path / 'cache')
+    parsed = GFF.read_table(gtf, cache=False)
+
+    cold = GFF.read_table(gtf, cache_dir=cache_dir)
+    assert os.path.exists(GFFCache.cache_path(gtf, cache_dir))
+    warm = GFF.read_table(gtf, cache_dir=cache_dir)
+    assert not warm.start.flags.writeable # mapped from the cache file
+    for table in (cold, warm):
+        assert list(table.rows()) == list(parsed.rows())
+        assert table.row(7, parse_attributes=True) == parsed.row(7, parse_attributes=True)
+        assert table.seqname.levels == parsed.seqname.levels
+
+    hierarchy = warm.hierarchy()
+    assert hierarchy.gene_ids.tolist() == ['WBGene%08d' % i for i in range(1, 6)]
+    assert hierarchy.transcript_ids.tolist() == ['ZK1.1a', 'ZK1.1b', 'ZK2.2', 'Y3.3', 'Y4.4', 'MTCE.5']
+    assert hierarchy.transcript_gene.tolist() == [0, 0, 1, 2, 3, 4]
+    assert (hierarchy.row_transcript[hierarchy.transcript_rows] == range(6)).all()
+
+    for kwargs in ({}, {'features': ['exon']}, {'exclude_features': ['CDS'], 'as_record': True}):
+        assert genes_summary(GFF.iter_genes(gtf, cache=True, cache_dir=cache_dir, **kwargs)) == genes_summary(GFF.iter_genes(gtf, **kwargs))
+
+def test_iter_genes_streams_without_caching(tmp_path):
+    import io, shutil
+    from wormtools import annotate
+    gtf = str(tmp_path / 'sample.gtf')
+    shutil.copy(SAMPLE_GTF, gtf)
+    # the default cache directory is a temporary one while testing (see conftest.py)
+    assert len(list(GFF.iter_genes(gtf))) == 5
+    annotate.annotate_file(gtf, io.BytesIO())
+    assert not os.path.exists(GFFCache.cache_path(gtf))
+    list(GFF.iter_genes(gtf, cache=True))
+    assert os.path.exists(GFFCache.cache_path(gtf))
+
+def test_gff_cache_invalidation(tmp_path, monkeypatch):
+    import shutil
+    gtf = str(tmp_path / 'sample.gtf')
+    shutil.copy(SAMPLE_GTF, gtf)
+    cache_dir = str(tmp_path / 'cache')
+    GFF.read_table(gtf, cache_dir=cache_dir)
+    stat = os.stat(gtf)
+
+    parses = []
+    parse = GFFCache._parse
+    monkeypatch.setattr(GFFCache, '_parse', lambda filename: parses.append(filename) or parse(filename))
+
+    # a new mtime with the same content keeps the cache, and records the mtime
+    os.utime(gtf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    GFF.read_table(gtf, cache_dir=cache_dir)
+    assert parses == []
+    assert GFFCache.read_header(GFFCache.cache_path(gtf, cache_dir))['source']['mtime_ns'] == stat.st_mtime_ns + 10**9
+
+    # a new mtime with different content of the same size
+    content = open(gtf).read()
+    with open(gtf, 'w') as fh:
+        fh.write(content.replace('ZK2.2', 'ZK2.9'))
+    os.utime(gtf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert 'ZK2.9' in GFF.read_table(gtf, cache_dir=cache_dir).hierarchy().transcript_ids.tolist()
+    assert len(parses) == 1
+
+    # a different size
+    with open(gtf, 'a') as fh:
+        fh.write(sample_lines()[-1])
+    assert len(GFF.read_table(gtf, cache_dir=cache_dir)) == len(sample_lines()) + 1
+    assert len(parses) == 2
+    assert len(GFF.read_table(gtf, cache_dir=cache_dir)) == len(sample_lines()) + 1
+    assert len(parses) == 2
+
+def test_gene_index_lookups():
+    index = GFF.GeneIndex()
+    genes = list(index.track(GFF.iter_genes(SAMPLE_GTF)))
+    assert len(index) == len(genes) == 5
+    assert index.genes == genes
+    assert index.find('WBGene00000004') == 3
+    assert index.find('ZK1.1b', 'transcript_id') == 0
+    assert index.transcript_ids(0) == ['ZK1.1a', 'ZK1.1b']
+    with pytest.raises(KeyError):
+        index.find('WBGene00000009')
+    with pytest.raises(KeyError):
+        index.find('', 'gene_name') # the sample has no names
+    assert index.with_biotype('protein_coding').tolist() == [0, 1, 3]
+    assert index.with_biotype('ncRNA').tolist() == [2]
+    assert index.with_biotype('lincRNA').tolist() == []
+    assert index.with_source('WormBase').tolist() == [0, 1, 2, 3, 4]
+    assert index.find_all(['Y4.4', 'MTCE.5', 'nope', 'Y3.3'], 'transcript_id').tolist() == [3, 4, -1, 2]
+
+    # the same index comes out of a table's hierarchy, and out of the cache
+    table = GFF.read_table(SAMPLE_GTF, cache=False)
+    for other in (GFF.GeneIndex.from_table(table), GFF.read_table(SAMPLE_GTF).gene_index()):
+        for name, values in index.arrays().items():
+            assert other.arrays()[name].tolist() == values.tolist()
+        assert other.source.levels == index.source.levels and other.biotype.levels == index.biotype.levels
+        assert other.with_biotype('rRNA').tolist() == [4]
+
+def test_gene_index_batch_lookup_matches_dicts():
+    import random
+    rng = random.Random(17)
+    index = GFF.GeneIndex()
+    names = {}
+    for i in range(2000):
+        gene_id = 'WBGene%08d' % rng.randint(0, 10**6)
+        name = rng.choice(['', 'abc-%d' % rng.randint(0, 500)]) # missing and shared names too
+        index._add(gene_id, name, rng.choice(['protein_coding', 'ncRNA']), 'WormBase', ['%s.%d' % (gene_id, t) for t in range(rng.randint(0, 2))])
+        names.setdefault(name, i)
+    ids = index.arrays()['gene_id'].tolist()
+    queries = [rng.choice(ids) if rng.random() < 0.7 else 'missing%d' % i for i in range(5000)]
+    expected = [ids.index(q) if q in ids else -1 for q in queries]
+    assert index.find_all(queries).tolist() == expected
+    assert [index.find(q) for q in queries if q in ids] == [e for e in expected if e >= 0]
+
+    name_queries = list(names) + ['abc-9999']
+    assert index.find_all(name_queries, 'gene_name').tolist() == [-1 if not n else names[n] for n in list(names)] + [-1]
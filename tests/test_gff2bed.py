@@ -0,0 +1,73 @@
+import os, io, gzip, random
+from wormtools import GFF, gff2bed
+from .test_annotate import random_gtf
+
+SAMPLE_GTF = os.path.join(os.path.dirname(__file__), 'data', 'sample.gtf')
+
+def reference_bed6(filename, features=None):
+    # GFF_as_BED6 and a '\t'.join per row, as scripts did it
+    return ''.join('\t'.join(map(str, GFF.GFF_as_BED6(gff))) + '\n' for gff in GFF.read_table(filename, cache=False)
+                   if features is None or gff['name'] in features)
+
+def reference_bed12(filename):
+    lines = []
+    for gene in GFF.iter_genes(filename, cache=False):
+        for t in gene.transcripts:
+            blocks = sorted((e['start'] - 1, e['end']) for e in t.features('exon')) or [(t.start - 1, t.end)]
+            chrom_start, chrom_end = blocks[0][0], max(end for start, end in blocks)
+            coding = [(f['start'] - 1, f['end']) for name in gff2bed.CODING_FEATURES for f in t.features(name)]
+            thick = (min(s for s, e in coding), max(e for s, e in coding)) if coding else (chrom_start, chrom_start)
+            lines.append('\t'.join(map(str, [gene.seqname, chrom_start, chrom_end, t.transcript_id, 0, t.strand, thick[0], thick[1], 0,
+                len(blocks), ''.join('%d,' % (e - s) for s, e in blocks), ''.join('%d,' % (s - chrom_start) for s, e in blocks)])) + '\n')
+    return ''.join(lines)
+
+def convert(source, **kwargs):
+    out = io.BytesIO()
+    n = gff2bed.convert(source, out, prefix='', **kwargs)
+    text = out.getvalue().decode()
+    assert n == text.count('\n')
+    return text
+
+def test_bed6_matches_GFF_as_BED6():
+    expected = reference_bed6(SAMPLE_GTF)
+    for chunk_rows in (1, 4, gff2bed.CHUNK_ROWS):
+        assert convert(SAMPLE_GTF, chunk_rows=chunk_rows) == expected
+        assert convert(GFF.read_table(SAMPLE_GTF), chunk_rows=chunk_rows) == expected
+    assert convert(SAMPLE_GTF, features=['exon', 'CDS']) == reference_bed6(SAMPLE_GTF, ['exon', 'CDS'])
+    assert convert(SAMPLE_GTF, features=['gene'], name='gene_id').split('\t')[3] == "WBGene00000001"
+
+def test_bed12_matches_transcripts(tmp_path):
+    gtf = str(tmp_path / 'genes.gtf')
+    with open(gtf, 'w') as fh:
+        fh.write(''.join(line + '\n' for line in random_gtf(random.Random(19), 150)))
+    for filename in (SAMPLE_GTF, gtf):
+        expected = reference_bed12(filename)
+        for chunk_rows in (1, 50, gff2bed.CHUNK_ROWS):
+            assert convert(filename, format='bed12', chunk_rows=chunk_rows) == expected
+        assert convert(filename, format='bed12', cache=True, chunk_rows=50) == expected
+
+def test_bed12_without_gene_lines(tmp_path):
+    # as StringTie writes them: transcripts and their exons, no genes
+    lines = [line for line in random_gtf(random.Random(119), 80) if line.split('\t')[2] != 'gene']
+    genes = str(tmp_path / 'genes.gtf')
+    with open(genes, 'w') as fh:
+        fh.write(''.join(line + '\n' for line in random_gtf(random.Random(119), 80)))
+    transcripts = str(tmp_path / 'transcripts.gtf')
+    with open(transcripts, 'w') as fh:
+        fh.write(''.join(line + '\n' for line in lines))
+    expected = reference_bed12(genes)
+    for chunk_rows in (1, 50, gff2bed.CHUNK_ROWS):
+        assert convert(transcripts, format='bed12', chunk_rows=chunk_rows) == expected
+        assert convert(GFF.read_table(transcripts, cache=False), format='bed12', chunk_rows=chunk_rows) == expected
+
+    line = 'I\tStringTie\t%s\t%d\t%d\t.\t+\t.\tgene_id "g"; transcript_id "t";'
+    with open(transcripts, 'w') as fh:
+        fh.write(''.join(line % fields + '\n' for fields in [('transcript', 100, 900), ('exon', 100, 200), ('exon', 800, 900)]))
+    assert convert(transcripts, format='bed12').split('\t')[9:] == ['2', '101,101,', '0,700,\n']
+
+def test_gff2bed_main_writes_gzip(tmp_path):
+    output = str(tmp_path / 'transcripts.bed.gz')
+    gff2bed.main(['--format', 'bed12', '-o', output, SAMPLE_GTF])
+    with gzip.open(output, 'rt') as fh:
+        lines = fh.readlines()
+    assert len(lines) == 6 and all(line.startswith('chr') and len(line.split('\t')) == 12 for line in lines)
@@ -0,0 +1,36 @@
+import gzip
+import numpy as np
+from wormtools.hits import hit_writer
+from wormtools.motif import MultiMotifScanner
+from wormtools.pwm import PWM, PWMScanner
+
+SEQ = b'CCAGATAAGCACGTGTTATCTCCGATAGATAAGG'
+PANEL = [('GATA', 'WGATAR'), ('Ebox', 'CANNTG')]
+
+def test_text_output_gzipped(tmp_path):
+    scanner = MultiMotifScanner(PANEL)
+    with hit_writer('text', str(tmp_path / 'hits.txt.gz'), label=True) as writer:
+        assert writer.write('chrI', scanner.iter_hits(SEQ)) == len(scanner.scan(SEQ))
+        writer.write('chrII', scanner.iter_hits(SEQ, 100))
+    lines = gzip.open(str(tmp_path / 'hits.txt.gz'), 'rt').read().splitlines()
+    assert lines[0] == 'chrI 2 8 + AGATAA GATA'
+    expected = ['%s %d %d %s %s %s' % ((seqname,) + hit[:2] + (hit[3], hit[2].decode(), hit[4]))
+                for seqname, offset in (('chrI', 0), ('chrII', 100)) for hit in scanner.scan(SEQ, offset)]
+    assert lines == expected
+
+def test_columnar_output(tmp_path):
+    pwm = PWM('GATA', [[0, 0, 9, 1], [9, 0, 0, 1], [0, 0, 0, 10], [10, 0, 0, 0]])
+    scanner = PWMScanner([pwm], thresholds=5)
+    path = str(tmp_path / 'hits.npz')
+    with hit_writer('npz', path, score=True, label=True, labels=scanner.labels) as writer:
+        writer.write('chrI', scanner.iter_hits(SEQ))
+        writer.write('chrII', iter([]))
+        writer.write('chrIII', scanner.iter_hits(SEQ, 10))
+    columns = np.load(path)
+    hits = scanner.scan(SEQ)
+    assert columns['seqnames'].tolist() == ['chrI', 'chrII', 'chrIII']
+    assert columns['labels'].tolist() == ['GATA']
+    assert columns['seqname'].tolist() == [0] * len(hits) + [2] * len(hits)
+    assert columns['start'].tolist() == [h[0] for h in hits] + [h[0] + 10 for h in hits]
+    assert columns['strand'].tolist() == [1 if h[3] == '+' else -1 for h in hits] * 2
+    assert columns['score'].tolist() == [h[4] for h in hits] * 2
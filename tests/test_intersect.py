@@ -0,0 +1,64 @@
+import io, gzip, random
+import pytest
+from wormtools import annotate, intersect
+from wormtools.bgzf import BgzfWriter
+from .test_annotate import random_gtf, write_gtf
+
+def random_hits(rng, seqnames, n, length=120000):
+    # BED hits of varying length, sorted by start within each seqname
+    lines = []
+    for seqname in seqnames:
+        starts = sorted(rng.randrange(length) for i in range(n))
+        lines.extend('%s\t%d\t%d\thit\t0\t+\n' % (seqname, start, start + rng.randint(1, 300)) for start in starts)
+    return lines
+
+def expected_columns(hit, regions):
+    seqname, start, end = hit.split('\t')[:3]
+    names = [name for chrom, a, b, name in regions if chrom == seqname and int(a) < int(end) and int(b) > int(start)]
+    return intersect.label_columns(names)
+
+def test_annotate_hits_matches_brute_force(tmp_path, monkeypatch, capsys):
+    rng = random.Random(23)
+    gtf = write_gtf(tmp_path / 'genes.gtf', random_gtf(rng, 60, ('I', 'II', 'III')))
+    bed = str(tmp_path / 'annotation.bed.gz')
+    with BgzfWriter(open(bed, 'wb')) as out:
+        annotate.annotate_file(gtf, out)
+    regions = [line.split('\t')[:4] for line in gzip.open(bed, 'rt').read().splitlines()]
+
+    # seqnames as in the fasta, without the annotation's chr, in another order than the annotation's,
+    # and some of them not annotated at all
+    hits = random_hits(rng, ('III', 'X', 'I', 'MtDNA', 'II', 'V'), 400)
+    path = tmp_path / 'hits.bed'
+    path.write_text(''.join(hits))
+    reopened = []
+    reopen = intersect.BedStream._reopen
+    monkeypatch.setattr(intersect.BedStream, '_reopen', lambda bed: reopened.append(1) or reopen(bed))
+    out = io.BytesIO()
+    n, overlapping = intersect.annotate_hits(str(path), bed, out)
+    lines = out.getvalue().decode().splitlines()
+    assert n == len(lines) == len(hits)
+    assert 0 < overlapping < n
+    for hit, line in zip(hits, lines):
+        fields = line.split('\t')
+        assert fields[:6] == hit.rstrip('\n').split('\t')
+        assert tuple(fields[6:]) == expected_columns('chr' + hit, regions)
+    # opened for III, and again for I, but not for each seqname it hasn't got
+    assert len(reopened) == 2
+    assert 'has no chrX, chrMtDNA, chrV' in capsys.readouterr().err
+
+def test_text_hits_and_sort_checks(tmp_path):
+    bed = tmp_path / 'annotation.bed'
+    bed.write_text('chrI\t0\t100\tg1.promoter\t0\t+\nchrI\t50\t300\tg2.exonic\t0\t-\nchrI\t400\t500\tg2.intronic\t0\t-\n')
+    hits = tmp_path / 'hits.txt'
+    hits.write_text('chrI 40 60 + AGATAA\nchrI 90 96 - TTATCT\nchrI 310 316 + AGATAG\n')
+    out = io.BytesIO()
+    assert intersect.annotate_hits(str(hits), str(bed), out, prefix='') == (3, 2)
+    assert out.getvalue().decode().splitlines() == ['chrI 40 60 + AGATAA promoter,exonic g1,g2',
+                                                    'chrI 90 96 - TTATCT promoter,exonic g1,g2',
+                                                    'chrI 310 316 + AGATAG . .']
+    hits.write_text('chrI 90 96 - TTATCT\nchrI 40 60 + AGATAA\n')
+    with pytest.raises(Exception, match='not sorted'):
+        intersect.annotate_hits(str(hits), str(bed), io.BytesIO(), prefix='')
+    hits.write_text('chrI 40 60 + AGATAA\nchrII 1 7 + AGATAA\nchrI 90 96 - TTATCT\n')
+    with pytest.raises(Exception, match='come together'):
+        intersect.annotate_hits(str(hits), str(bed), io.BytesIO(), prefix='')
@@ -0,0 +1,68 @@
+import os, gzip, random
+import pytest
+from wormtools import io, bgzf, GFF
+from wormtools.fasta import readGZfa
+
+SAMPLE_GTF = os.path.join(os.path.dirname(__file__), 'data', 'sample.gtf')
+
+def fasta_text(rng, n_records=3, length=150000):
+    records = []
+    for i in range(n_records):
+        seq = ''.join(rng.choice('ACGTacgtN') for j in range(length))
+        records.append('>chr%d desc\n' % i + ''.join(seq[j:j+60] + '\n' for j in range(0, length, 60)))
+    return ''.join(records).encode()
+
+def write_compressed(tmp_path, data):
+    # every kind of input, under names that don't give it away
+    paths = {'plain': str(tmp_path / 'plain.gz'), 'gzip': str(tmp_path / 'gzipped.txt'), 'bgzip': str(tmp_path / 'bgzipped.fa')}
+    with open(paths['plain'], 'wb') as fh:
+        fh.write(data)
+    with open(paths['gzip'], 'wb') as fh:
+        # two members, as cat a.gz b.gz makes
+        fh.write(gzip.compress(data[:100000]) + gzip.compress(data[100000:]))
+    with bgzf.BgzfWriter(open(paths['bgzip'], 'wb')) as fh:
+        fh.write(data)
+    return paths
+
+def test_read_blocks_detects_compression(tmp_path):
+    data = fasta_text(random.Random(20))
+    paths = write_compressed(tmp_path, data)
+    for kind, path in paths.items():
+        assert io.detect(path) == kind
+        for blocksize in (1000, 1 << 16, io.BLOCKSIZE):
+            for threads in (1, 3):
+                blocks = list(io.read_blocks(path, blocksize, threads))
+                assert b''.join(blocks) == data
+                assert all(0 < len(block) <= blocksize for block in blocks)
+        with io.open_text(path, threads=3) as fh:
+            assert fh.read() == data.decode()
+        with io.open_binary(path) as fh:
+            assert fh.readline() == b'>chr0 desc\n'
+
+def test_truncated_input_raises(tmp_path):
+    data = fasta_text(random.Random(20), 1)
+    paths = write_compressed(tmp_path, data)
+    for kind in ('gzip', 'bgzip'):
+        with open(paths[kind], 'rb') as fh:
+            compressed = fh.read()
+        truncated = str(tmp_path / ('truncated.' + kind))
+        with open(truncated, 'wb') as fh:
+            fh.write(compressed[:len(compressed) // 2])
+        with pytest.raises(Exception):
+            list(io.read_blocks(truncated))
+
+def test_readers_use_the_shared_opener(tmp_path):
+    data = fasta_text(random.Random(20))
+    paths = write_compressed(tmp_path, data)
+    expected = list(readGZfa(paths['plain'], upper=False))
+    assert [h for h, s in expected] == ['chr0 desc', 'chr1 desc', 'chr2 desc']
+    for path in paths.values():
+        assert list(readGZfa(path, upper=False, blocksize=5000, threads=3)) == expected
+
+    with open(SAMPLE_GTF, 'rb') as fh:
+        gtf = fh.read()
+    gzipped_gtf = str(tmp_path / 'sample.gtf')
+    with open(gzipped_gtf, 'wb') as fh:
+        fh.write(gzip.compress(gtf))
+    assert list(GFF.read_table(gzipped_gtf, cache=False).rows()) == list(GFF.read_table(SAMPLE_GTF, cache=False).rows())
+    assert [g.gene_id for g in GFF.iter_genes(gzipped_gtf, cache=False)] == ['WBGene%08d' % i for i in range(1, 6)]
@@ -0,0 +1,85 @@
+import random
+import pytest
+from wormtools import motif
+from wormtools.motif import MotifScanner, scan_parallel
+
+def random_sequence(rng, length):
+    # runs of a single base make overlapping matches, which chunk boundaries must not change
+    seq = []
+    while len(seq) < length:
+        if rng.random() < 0.05:
+            seq.extend(rng.choice('AT') * rng.randint(5, 60))
+        else:
+            seq.append(rng.choice('ACGT'))
+    return ''.join(seq[:length]).encode()
+
+@pytest.mark.parametrize('iupac', ['WGATAR', 'AAAAA', 'ATATAT', 'GAT{1,3}A', 'AW{2,6}T', 'GATC', 'TA{2,}'])
+def test_parallel_scan_matches_serial(monkeypatch, iupac):
+    monkeypatch.setattr(motif, 'MIN_CHUNK_SIZE', 97)
+    rng = random.Random(9)
+    sequences = [('seq%d' % i, random_sequence(rng, length), 0) for i,length in enumerate([50, 3000, 1200, 10])]
+    scanner = MotifScanner(iupac)
+    serial = [(header, scanner.scan(seq, offset)) for header,seq,offset in sequences]
+    parallel = [(header, result) for header,seq,offset,result in scan_parallel(iupac, sequences, jobs=8)]
+    assert parallel == serial
+    counts = [result for header,seq,offset,result in scan_parallel(iupac, sequences, jobs=3, count=True)]
+    assert counts == [scanner.count(seq) for header,seq,offset in sequences]
+
+PANEL = [('GATA', 'WGATAR'), ('polyA', 'AAAAA'), ('AT', 'ATATAT'), ('gap', 'GAT{1,3}A'), ('Ebox', 'CANNTG')]
+
+def test_multi_motif_scan_matches_single_motif_scans(monkeypatch):
+    monkeypatch.setattr(motif, 'MIN_CHUNK_SIZE', 97)
+    rng = random.Random(10)
+    sequences = [('seq%d' % i, random_sequence(rng, length), 0) for i,length in enumerate([3000, 10, 1200])]
+    scanner = motif.MultiMotifScanner(PANEL)
+    for header,seq,offset in sequences:
+        hits = scanner.scan(seq, offset)
+        for label,iupac in PANEL:
+            assert [h[:4] for h in hits if h[4] == label] == MotifScanner(iupac).scan(seq, offset)
+        assert scanner.count(seq) == [MotifScanner(iupac).count(seq) for label,iupac in PANEL]
+    parallel = [result for header,seq,offset,result in scan_parallel(PANEL, sequences, jobs=4)]
+    assert parallel == [scanner.scan(seq, offset) for header,seq,offset in sequences]
+    counts = [result for header,seq,offset,result in scan_parallel(PANEL, sequences, jobs=4, count=True)]
+    assert counts == [scanner.count(seq) for header,seq,offset in sequences]
+
+def test_read_motifs(tmp_path):
+    path = tmp_path / 'panel.txt'
+    path.write_text("# a panel\nGATA WGATAR\n\nCANNTG\n")
+    assert motif.read_motifs(str(path)) == [('GATA', 'WGATAR'), ('CANNTG', 'CANNTG')]
+    path.write_text("GATA WGATAR\nGATA CANNTG\n")
+    with pytest.raises(Exception):
+        motif.read_motifs(str(path))
+
+@pytest.mark.parametrize('iupac', ['WGATAR', 'AAAAA', 'ATATAT', 'CANNTG', 'GATC', 'A', 'NNNN', 'GAN{3}TC', 'BDHVKMSY'])
+def test_numpy_engine_matches_regex(iupac):
+    rng = random.Random(11)
+    seq = bytearray(random_sequence(rng, 5000))
+    # masked and unknown bases never match
+    for i in rng.sample(range(len(seq)), 200):
+        seq[i] = ord(rng.choice('Nnacgt'))
+    seq = bytes(seq)
+    regex, vectorized = MotifScanner(iupac), MotifScanner(iupac, engine='numpy')
+    assert vectorized.engine == 'numpy'
+    assert vectorized.scan(seq, 7) == regex.scan(seq, 7)
+    assert vectorized.count(seq) == regex.count(seq)
+    assert vectorized.scan(b'ACG') == regex.scan(b'ACG')
+
+def test_numpy_engine_falls_back_for_ranges(monkeypatch):
+    monkeypatch.setattr(motif, 'MIN_CHUNK_SIZE', 97)
+    assert MotifScanner('GAT{1,3}A', engine='numpy').engine == 'regex'
+    rng = random.Random(12)
+    sequences = [('seq%d' % i, random_sequence(rng, length), 0) for i,length in enumerate([3000, 10, 1200])]
+    expected = list(scan_parallel(PANEL, sequences, jobs=3))
+    assert list(scan_parallel(PANEL, sequences, jobs=3, engine='numpy')) == expected
+    scanner = motif.MultiMotifScanner(PANEL, engine='numpy')
+    assert [scanner.scan(seq) for header,seq,offset in sequences] == [result for header,seq,offset,result in expected]
+
+@pytest.mark.parametrize('engine', motif.ENGINES)
+def test_iter_hits_matches_scan(engine):
+    rng = random.Random(13)
+    seq = random_sequence(rng, 4000)
+    for iupac in ['WGATAR', 'AAAAA', 'CANNTG', 'GAT{1,3}A']:
+        scanner = MotifScanner(iupac, engine=engine)
+        assert list(scanner.iter_hits(seq, 5)) == scanner.scan(seq, 5)
+    scanner = motif.MultiMotifScanner(PANEL, engine)
+    assert list(scanner.iter_hits(seq, 5)) == scanner.scan(seq, 5)
@@ -0,0 +1,94 @@
+import os, random
+import numpy as np
+from wormtools import GFF, promoters
+from wormtools.fasta import reverse_complement
+from .test_annotate import random_gtf
+
+SAMPLE_GTF = os.path.join(os.path.dirname(__file__), 'data', 'sample.gtf')
+
+def naive_ends(genes):
+    # per transcript, from the 5' and 3' exons of GFF.Transcript
+    ends = []
+    for gene in genes:
+        for t in gene.transcripts:
+            five, three = t.get_5prime_exon(), t.get_3prime_exon()
+            if t.strand == '+':
+                ends.append((gene.seqname, t.strand, five['start'], three['end'], gene.gene_id, t.transcript_id))
+            else:
+                ends.append((gene.seqname, t.strand, five['end'], three['start'], gene.gene_id, t.transcript_id))
+    return ends
+
+def as_rows(columns):
+    return list(zip(*(column.tolist() for column in columns)))
+
+def test_transcript_ends_from_table_and_genes(tmp_path):
+    gtf = str(tmp_path / 'genes.gtf')
+    with open(gtf, 'w') as fh:
+        fh.write(''.join(line + '\n' for line in random_gtf(random.Random(18), 200)))
+    genes = list(GFF.iter_genes(gtf, cache=False))
+    expected = naive_ends(genes)
+    assert as_rows(promoters.transcript_ends(genes)) == expected
+    assert as_rows(promoters.transcript_ends(GFF.read_table(gtf, cache=False))) == expected
+    assert as_rows(promoters.transcript_ends(gtf)) == expected # through the cache
+
+def test_unstranded_transcripts_are_placed_as_gene_promoters(tmp_path):
+    gtf = str(tmp_path / 'unstranded.gtf')
+    lines = ['I\tWB\tgene\t100\t900\t.\t.\t.\tgene_id "g";',
+             'I\tWB\ttranscript\t100\t900\t.\t.\t.\tgene_id "g"; transcript_id "t";',
+             'I\tWB\texon\t100\t200\t.\t.\t.\tgene_id "g"; transcript_id "t";',
+             'I\tWB\texon\t800\t900\t.\t.\t.\tgene_id "g"; transcript_id "t";']
+    with open(gtf, 'w') as fh:
+        fh.write(''.join(line + '\n' for line in lines))
+    # only '+' is forward, so the TSS is at the right end, from genes and tables alike
+    expected = [('I', '.', 900, 100, 'g', 't')]
+    assert as_rows(promoters.transcript_ends(GFF.iter_genes(gtf))) == expected
+    assert as_rows(promoters.transcript_ends(GFF.read_table(gtf, cache=False))) == expected
+    # and the promoter is where Gene.get_promoters puts it
+    (seqname, start, end, kind, name), = next(GFF.iter_genes(gtf)).get_promoters(50)
+    regions = promoters.flanks(promoters.transcript_ends(GFF.read_table(gtf, cache=False)), upstream=50)
+    assert (regions.start.tolist(), regions.end.tolist()) == ([start], [end])
+
+def test_promoter_regions_are_clipped_and_unique():
+    genes = list(GFF.iter_genes(SAMPLE_GTF))
+    sizes = {'I': 7000, 'II': 24500}
+    regions = promoters.promoters(SAMPLE_GTF, upstream=1500, downstream=100, chrom_sizes=sizes)
+    assert (regions.start >= 0).all()
+    for seqname, size in sizes.items():
+        assert (regions.end[regions.seqname == seqname] <= size).all()
+
+    expected = {}
+    for seqname, strand, tss, tes, gene_id, transcript_id in naive_ends(genes):
+        if strand == '+':
+            start, end = tss - 1 - 1500, tss - 1 + 100
+        else:
+            start, end = tss - 100, tss + 1500
+        start, end = max(0, start), min(end, sizes.get(seqname, end))
+        expected.setdefault((seqname, start, end, strand), []).append(gene_id + '|' + transcript_id)
+    assert as_rows(regions) == [key + (','.join(sorted(names)),) for key, names in sorted(expected.items())]
+
+    # a TSS is one base; both sample transcripts of the first gene start at the gene's first exon or not
+    sites = promoters.tss(SAMPLE_GTF)
+    assert ((sites.end - sites.start) == 1).all()
+    assert len(promoters.tss(SAMPLE_GTF, unique=False).name) == 6
+
+def test_promoter_sequences_are_strand_corrected(tmp_path):
+    rng = random.Random(18)
+    chroms = {'I': bytes(rng.choice(b'ACGT') for i in range(8000)), 'II': bytes(rng.choice(b'ACGT') for i in range(26000))}
+    fasta = str(tmp_path / 'genome.fa')
+    with open(fasta, 'w') as fh:
+        for name, seq in chroms.items():
+            fh.write('>chr%s\n' % name)
+            for i in range(0, len(seq), 60):
+                fh.write(seq[i:i+60].decode() + '\n')
+
+    # MtDNA isn't in the fasta, so only the chromosomes' genes are asked for
+    genes = [gene for gene in GFF.iter_genes(SAMPLE_GTF) if gene.seqname != 'MtDNA']
+    regions, seqs = promoters.promoter_sequences(genes, fasta, upstream=300, downstream=50, prefix='chr')
+    assert len(seqs) == len(regions.name) > 0
+    for seqname, start, end, strand, name, seq in zip(*(c.tolist() for c in regions), seqs):
+        expected = chroms[seqname][start:end]
+        assert seq == (reverse_complement(expected) if strand == '-' else expected)
+
+def test_gene_get_promoters_stops_at_chromosome_start():
+    gene = next(GFF.iter_genes(SAMPLE_GTF))
+    assert [p[:3] for p in gene.get_promoters(5000)] == [('I', 1, 1000), ('I', 1, 1100)]
@@ -0,0 +1,99 @@
+import itertools, math, random
+import pytest
+from wormtools import pwm
+from wormtools.pwm import PWM, PWMScanner
+
+JASPAR = """>MA0035.4\tGATA1
+A  [    41     20    187      0    191      0      1     34 ]
+C  [    48     12      0      0      0      0     20     37 ]
+G  [    30    157      0    191      0      0    158     69 ]
+T  [    72      2      4      0      0    191      12     51 ]
+"""
+
+MEME = """MEME version 4
+
+ALPHABET= ACGT
+
+strands: + -
+
+Background letter frequencies
+A 0.3 C 0.2 G 0.2 T 0.3
+
+MOTIF MA0035.4 GATA1
+letter-probability matrix: alength= 4 w= 3 nsites= 10 E= 0
+ 0.1 0.0 0.9 0.0
+ 0.8 0.1 0.0 0.1
+
+ 0.0 0.0 0.0 1.0
+URL http://jaspar.genereg.net/matrix/MA0035.4
+"""
+
+def brute_force_scores(matrix, scores, seq):
+    codes = [pwm.BASE_CODES[b] for b in seq]
+    return [sum(scores[i][codes[start + i]] for i in range(matrix.length)) for start in range(len(seq) - matrix.length + 1)]
+
+def random_matrix(rng, length, name='random'):
+    return PWM(name, [[rng.randint(0, 20) for base in range(4)] for i in range(length)],
+               background=(0.3, 0.2, 0.2, 0.3))
+
+def test_scan_matches_brute_force(monkeypatch):
+    # blocks smaller than the sequence, so windows straddle block boundaries
+    monkeypatch.setattr(pwm, 'BLOCK_SIZE', 37)
+    rng = random.Random(12)
+    seq = bytes(rng.choice(b'ACGTACGTACGTN') for i in range(500))
+    matrix = random_matrix(rng, 8)
+    threshold = matrix.min_score + 0.7 * (matrix.max_score - matrix.min_score)
+    expected = []
+    for strand, scores in (('+', matrix.scores), ('-', matrix.rc_scores)):
+        for start, score in enumerate(brute_force_scores(matrix, scores, seq)):
+            if score >= threshold:
+                expected.append((start + 10, start + 10 + matrix.length, seq[start:start + matrix.length], strand, score))
+    expected.sort(key=lambda a: (a[0], a[1]))
+    hits = matrix.scan(seq, offset=10, threshold=threshold)
+    assert [h[:4] for h in hits] == [e[:4] for e in expected]
+    assert [h[4] for h in hits] == pytest.approx([e[4] for e in expected])
+    assert expected and all(b'N' not in h[2] for h in hits)
+
+def test_reverse_strand_scores_reverse_complement():
+    rng = random.Random(13)
+    matrix = random_matrix(rng, 6)
+    seq = b'ACGGTAGCTTAGCA'
+    rc = seq[::-1].translate(bytes.maketrans(b'ACGT', b'TGCA'))
+    assert brute_force_scores(matrix, matrix.rc_scores, seq) == pytest.approx(brute_force_scores(matrix, matrix.scores, rc)[::-1])
+
+def test_pvalue_threshold_matches_enumeration():
+    rng = random.Random(14)
+    matrix = random_matrix(rng, 5)
+    background = dict(zip(b'ACGT', (0.3, 0.2, 0.2, 0.3)))
+    windows = [bytes(w) for w in itertools.product(b'ACGT', repeat=5)]
+    scores = brute_force_scores(matrix, matrix.scores, b''.join(windows))[::5]
+    probability = [math.prod(background[b] for b in w) for w in windows]
+    for pvalue in (0.05, 0.01, 0.001):
+        threshold = matrix.pvalue_threshold(pvalue)
+        passing = sum(p for s,p in zip(scores, probability) if s >= threshold)
+        # up to the rounding of scores, the threshold is where the tail probability crosses pvalue
+        assert passing <= pvalue * 1.5
+        slack = sum(p for s,p in zip(scores, probability) if s >= threshold - 5 * pwm.SCORE_RESOLUTION * matrix.length)
+        assert slack > pvalue * 0.5
+
+def test_read_jaspar_and_meme(tmp_path):
+    jaspar, meme = tmp_path / 'gata.jaspar', tmp_path / 'gata.meme'
+    jaspar.write_text(JASPAR)
+    meme.write_text(MEME)
+    matrices = pwm.read_matrices(str(jaspar))
+    assert [(m.motif_id, m.name, m.length) for m in matrices] == [('MA0035.4', 'GATA1', 8)]
+    assert matrices[0].counts[1].tolist() == [20, 12, 157, 2]
+    matrices = pwm.read_matrices(str(meme))
+    assert [(m.motif_id, m.name, m.length) for m in matrices] == [('MA0035.4', 'GATA1', 3)]
+    assert matrices[0].counts[0].tolist() == pytest.approx([1, 0, 9, 0])
+    assert matrices[0].background.tolist() == [0.3, 0.2, 0.2, 0.3]
+
+def test_pwm_scanner_counts_match_hits():
+    rng = random.Random(15)
+    seq = bytes(rng.choice(b'ACGT') for i in range(2000))
+    matrices = [random_matrix(rng, 6, 'six'), random_matrix(rng, 9, 'nine')]
+    scanner = PWMScanner(matrices, pvalue=0.01)
+    hits = scanner.scan(seq)
+    assert [h[0] for h in hits] == sorted(h[0] for h in hits)
+    assert scanner.count(seq) == [sum(1 for h in hits if h[5] == label) for label in scanner.labels]
+    assert list(scanner.iter_hits(seq, 3)) == scanner.scan(seq, 3)
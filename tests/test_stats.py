@@ -0,0 +1,70 @@
+import gzip, json, random
+from wormtools import GFF, annotate, gff2bed, intersect, stats
+from wormtools.GFF import GFFParser
+from wormtools.fasta import readGZfa
+from .test_annotate import random_gtf, write_gtf
+from .test_fasta import SAMPLE_FA
+
+def test_stages_count_what_they_read(tmp_path):
+    gzipped = str(tmp_path / 'sample.fa.gz')
+    with open(SAMPLE_FA, 'rb') as fh:
+        data = fh.read()
+    with gzip.open(gzipped, 'wb') as fh:
+        fh.write(data)
+    gtf = write_gtf(tmp_path / 'genes.gtf', random_gtf(random.Random(25), 30))
+    parseLine = GFFParser.parseLine
+    # nothing is wrapped or counted unless recording
+    blocks = iter([b'>chrI\nACGT\n'])
+    assert stats.timed('fasta.read_blocks', blocks) is blocks
+
+    recorder = stats.enable()
+    try:
+        records = list(readGZfa(gzipped, blocksize=64))
+        genes = list(GFF.iter_genes(gtf, cache=False))
+        attrs = [GFF.get_attr(GFFParser.parseLine(line, parse_attributes=True), 'gene_id') for line in open(gtf)]
+    finally:
+        assert stats.disable() is recorder
+    assert GFFParser.parseLine is parseLine and stats.current is None
+
+    stages = recorder.as_dict()['stages']
+    assert stages['fasta.read_blocks']['counts']['bytes'] == len(data)
+    assert stages['fasta.records']['counts'] == {'records': len(records), 'bases': sum(len(seq) for header, seq in records)}
+    n_lines = len(open(gtf).readlines())
+    assert stages['gff.parseLine']['counts'] == {'lines': 2 * n_lines}
+    assert stages['gff.parseAttr']['counts']['lines'] == len(attrs) == n_lines
+    assert stages['gff.iter_genes']['counts'] == {'genes': len(genes)}
+    # times are exclusive, so the stages add up to no more than the time recorded
+    assert sum(stage['seconds'] for stage in stages.values()) <= recorder.elapsed()
+
+def test_annotate_main_stats_and_profile(tmp_path, capsys):
+    gtf = write_gtf(tmp_path / 'genes.gtf', random_gtf(random.Random(26), 40, ('I', 'II')))
+    bed, profile = str(tmp_path / 'genes.bed'), str(tmp_path / 'profile.json')
+    annotate.main(['--stats', '--profile', profile, '-o', bed, gtf])
+    assert stats.current is None
+    stages = json.load(open(profile))['stages']
+    assert stages['annotate.write']['counts']['regions'] == len(open(bed).readlines())
+    assert stages['annotate.seqnames']['counts'] == {'seqnames': 2}
+    assert stages['gff.iter_genes']['counts']['genes'] == 80
+    report = capsys.readouterr().err
+    assert 'annotate.write' in report and 'wall' in report
+
+def test_gff2bed_and_annotate_hits_main_stats(tmp_path, capsys):
+    gtf = write_gtf(tmp_path / 'genes.gtf', random_gtf(random.Random(27), 40, ('I', 'II')))
+    bed, annotation, profile = str(tmp_path / 'genes.bed'), str(tmp_path / 'annotation.bed'), str(tmp_path / 'profile.json')
+    gff2bed.main(['--format', 'bed12', '--profile', profile, '-o', bed, gtf])
+    stages = json.load(open(profile))['stages']
+    assert stages['gff2bed.write']['counts']['lines'] == len(open(bed).readlines())
+    assert stages['gff2bed.convert']['counts']['rows'] == len(open(gtf).readlines())
+
+    annotate.main(['-o', annotation, gtf])
+    hits = str(tmp_path / 'hits.bed')
+    with open(hits, 'w') as fh:
+        fh.write(''.join('I\t%d\t%d\thit\t0\t+\n' % (start, start + 6) for start in range(0, 50000, 500)))
+    capsys.readouterr()
+    intersect.main(['--stats', '--profile', profile, '-o', str(tmp_path / 'annotated.bed'), hits, annotation])
+    assert stats.current is None
+    stages = json.load(open(profile))['stages']
+    assert stages['intersect.join']['counts'] == {'hits': 100}
+    assert stages['intersect.write']['counts']['lines'] == 100
+    report = capsys.readouterr().err
+    assert 'intersect.join' in report and 'wall' in report
@@ -0,0 +1,89 @@
+import os, random, struct
+import numpy as np
+import pytest
+from wormtools import twobit
+from wormtools.fasta import readGZfa, open_indexed, IndexedFasta
+
+def random_genome(rng):
+    records = []
+    for i, length in enumerate((5000, 777, 12001)):
+        seq = bytearray(rng.choice(b'ACGT') for j in range(length))
+        for k in range(5):
+            # N runs, soft-masked runs, and the odd IUPAC code, which .2bit keeps as N
+            start, size = rng.randrange(length), rng.randint(1, 300)
+            seq[start:start + size] = b'N' * len(seq[start:start + size])
+            start = rng.randrange(length)
+            seq[start:start + 400] = seq[start:start + 400].lower()
+            seq[rng.randrange(length)] = ord(rng.choice('RYn'))
+        records.append(('chr%d description' % i, bytes(seq)))
+    records.append(('empty', b''))
+    return records
+
+def as_twobit(seq):
+    # what a .2bit file gives back for seq
+    return bytes(b if b in b'ACGTacgt' else (ord('n') if b >= ord('a') else ord('N')) for b in seq)
+
+def write_fasta(records, filename):
+    with open(filename, 'w') as fh:
+        for header, seq in records:
+            fh.write('>%s\n' % header + ''.join(seq[i:i+60].decode() + '\n' for i in range(0, len(seq), 60)))
+
+@pytest.fixture
+def genome(tmp_path):
+    records = random_genome(random.Random(21))
+    fasta, path = str(tmp_path / 'genome.fa'), str(tmp_path / 'genome.2bit')
+    write_fasta(records, fasta)
+    assert twobit.fasta_to_twobit(fasta, path) == len(records)
+    return records, fasta, path
+
+@pytest.mark.parametrize('many_blocks', [0, twobit.MANY_BLOCKS])
+def test_twobit_round_trip(genome, monkeypatch, many_blocks):
+    # blocks are applied one by one, or through a mask of the slice
+    monkeypatch.setattr(twobit, 'MANY_BLOCKS', many_blocks)
+    records, fasta, path = genome
+    expected = [(header.split()[0], as_twobit(seq)) for header, seq in records]
+    assert twobit.is_twobit(path) and not twobit.is_twobit(fasta)
+    assert list(readGZfa(path, upper=False)) == expected
+    assert list(readGZfa(path)) == [(name, seq.upper()) for name, seq in expected]
+
+    rng = random.Random(21)
+    with open_indexed(path) as genome_2bit:
+        assert isinstance(genome_2bit, twobit.TwoBitFile)
+        assert genome_2bit.names == [name for name, seq in expected] and 'chr1' in genome_2bit
+        for name, seq in expected:
+            assert genome_2bit.length(name) == len(seq)
+            for i in range(100):
+                start = rng.randint(-5, len(seq))
+                end = max(0, start) + rng.randint(0, 500)
+                assert genome_2bit.fetch(name, start, end, upper=False) == seq[max(0, start):end]
+                assert genome_2bit.array(name, start, end).tobytes() == seq[max(0, start):end].upper()
+        assert genome_2bit.fetch_region('chr2:101-110') == expected[2][1][100:110].upper()
+        packed = genome_2bit.packed('chr0')
+        # a view of the file, not a copy
+        assert len(packed) == 1250 and not packed.flags.owndata and not packed.flags.writeable
+
+def test_twobit_big_endian(tmp_path):
+    seq = b'ACGTnnacgTT'
+    record = twobit.pack(seq)
+    length, n_count, n_start, n_size, m_count, m_start, m_size, reserved = struct.unpack('<8I', record[:32])
+    header = struct.pack('>IIII', twobit.SIGNATURE, 0, 1, 0) + b'\x01s' + struct.pack('>I', 16 + 6)
+    path = str(tmp_path / 'be.2bit')
+    with open(path, 'wb') as fh:
+        fh.write(header + struct.pack('>8I', length, n_count, n_start, n_size, m_count, m_start, m_size, reserved) + record[32:])
+    with twobit.TwoBitFile(path) as genome:
+        assert genome.fetch('s', upper=False) == b'ACGTnnacgTT'
+
+def test_twobit_matches_ucsc_reader(genome):
+    bx_twobit = pytest.importorskip('bx.seq.twobit')
+    records, fasta, path = genome
+    with open(path, 'rb') as fh:
+        reference = bx_twobit.TwoBitFile(fh)
+        for header, seq in records:
+            name = header.split()[0]
+            assert reference[name][0:len(seq)].encode() == as_twobit(seq)
+
+def test_twobit_and_fasta_fetch_the_same(genome):
+    records, fasta, path = genome
+    with IndexedFasta(fasta) as fa, open_indexed(path) as genome_2bit:
+        for name in genome_2bit.names[:-1]:
+            assert genome_2bit.fetch(name) == as_twobit(fa.fetch(name)).upper()
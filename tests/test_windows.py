@@ -0,0 +1,90 @@
+import random
+import numpy as np
+import pytest
+from wormtools.motif import MotifScanner, MultiMotifScanner
+from wormtools.pwm import PWM, PWMScanner
+from wormtools.windows import WindowCounter, window_tracks, window_writer, window_ranges
+from .test_motif import random_sequence, PANEL
+
+@pytest.mark.parametrize('size,step', [(100, 100), (100, 30), (7, 10), (1, 1), (1000, 1000), (1000, 999)])
+def test_window_counts_match_brute_force(size, step):
+    rng = np.random.default_rng(22)
+    length = 2345
+    starts = np.sort(rng.integers(0, length, 500))
+    counter = WindowCounter(length, size, step, tracks=2)
+    # added in pieces, as region slices are
+    counter.add(0, starts[:200])
+    counter.add(0, starts[200:])
+    counts = counter.counts()
+    window_starts, window_ends = window_ranges(length, size, step)
+    expected = [((starts >= s) & (starts < e)).sum() for s, e in zip(window_starts.tolist(), window_ends.tolist())]
+    assert counts[0].tolist() == expected
+    assert counts[1].tolist() == [0] * len(expected)
+
+def test_coprime_windows_are_not_binned_per_base():
+    # 1000:999 has a gcd of 1, which would be a bin per base of each track
+    length = 10 ** 7
+    counter = WindowCounter(length, 1000, 999, tracks=4)
+    assert counter.bins is None
+    starts = np.array([0, 998, 999, 1000, 1998, length - 1], dtype=np.int64)
+    counter.add(3, starts[3:])
+    counter.add(3, starts[:3])
+    counts = counter.counts()
+    assert counts.shape == (4, len(window_ranges(length, 1000, 999)[0]))
+    assert counts[3, :3].tolist() == [3, 3, 1] and counts[3, -1] == 1 and counts.sum() == 8
+
+@pytest.mark.parametrize('engine', ['regex', 'numpy'])
+def test_window_tracks_match_hits(engine):
+    rng = random.Random(22)
+    seq = random_sequence(rng, 5000)
+    panel = [(label, iupac) for label, iupac in PANEL if label != 'gap']
+    scanner = MultiMotifScanner(panel, engine)
+    hits = scanner.scan(seq)
+    # two region slices of one sequence, and the whole sequence again under another name
+    sequences = [('chrI', seq[:3000], 0), ('chrI', seq[3000:], 3000), ('chrII', seq, 0)]
+    tracks = list(window_tracks(scanner, sequences, 500, 250, split=True, lengths={'chrI': 5000, 'chrII': 5000}))
+    assert [(seqname, length) for seqname, length, counts in tracks] == [('chrI', 5000), ('chrII', 5000)]
+    window_starts, window_ends = window_ranges(5000, 500, 250)
+    for (seqname, length, counts) in tracks:
+        for track, (label, strand) in enumerate((label, strand) for label, iupac in panel for strand in '+-'):
+            positions = np.array([h[0] for h in hits if h[4] == label and h[3] == strand])
+            expected = [int(((positions >= s) & (positions < e)).sum()) for s, e in zip(window_starts.tolist(), window_ends.tolist())]
+            assert counts[track].tolist() == expected
+
+    single = MotifScanner('WGATAR', engine=engine)
+    (seqname, length, counts), = window_tracks(single, [('chrI', seq, 0)], 1000, 1000)
+    assert counts.sum() == single.count(seq)
+
+def test_pwm_starts_match_scan():
+    rng = random.Random(23)
+    seq = random_sequence(rng, 3000)
+    pwm = PWM('GATA', [[0, 0, 9, 1], [9, 0, 0, 1], [0, 0, 0, 10], [10, 0, 0, 0]])
+    scanner = PWMScanner([pwm], thresholds=5)
+    (forward, reverse), = scanner.starts(seq)
+    hits = scanner.scan(seq)
+    assert forward.tolist() == [h[0] for h in hits if h[3] == '+']
+    assert reverse.tolist() == [h[0] for h in hits if h[3] == '-']
+
+def test_window_writers(tmp_path):
+    counts = {'chrI': np.array([[1, 0, 2], [0, 3, 0]], dtype=np.uint32), 'chrII': np.array([[4], [5]], dtype=np.uint32)}
+    path = str(tmp_path / 'density.bedGraph')
+    with window_writer('bedgraph', path, 10, 10, ['GATA +', 'GATA -']) as writer:
+        assert writer.write('chrI desc', 25, counts['chrI']) == 3
+        writer.write('chrII', 7, counts['chrII'])
+    lines = open(path).read().splitlines()
+    assert lines[:5] == ['track type=bedGraph name="GATA +"', 'chrI\t0\t10\t1', 'chrI\t10\t20\t0', 'chrI\t20\t25\t2', 'chrII\t0\t7\t4']
+    assert lines[5:] == ['track type=bedGraph name="GATA -"', 'chrI\t0\t10\t0', 'chrI\t10\t20\t3', 'chrI\t20\t25\t0', 'chrII\t0\t7\t5']
+
+    path = str(tmp_path / 'density.npz')
+    with window_writer('npz', path, 10, 10, ['GATA +', 'GATA -']) as writer:
+        writer.write('chrI', 25, counts['chrI'])
+        writer.write('chrII', 7, counts['chrII'])
+        with pytest.raises(Exception):
+            writer.write('chrI', 25, counts['chrI'])
+    arrays = np.load(path)
+    assert arrays['tracks'].tolist() == ['GATA +', 'GATA -']
+    assert arrays['seqnames'].tolist() == ['chrI', 'chrII']
+    assert arrays['lengths'].tolist() == [25, 7]
+    assert arrays['window'].tolist() == [10, 10]
+    assert arrays['chrI'].tolist() == counts['chrI'].tolist()
+    assert arrays['chrII'].dtype == np.uint32